@@ -0,0 +1,382 @@
+import os
+import json
+import logging
+import numpy as np
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+def _scores(matrix, query, metric):
+    """Similaridade em que "maior" significa "mais próximo" para todas as métricas."""
+    if metric == "l2":
+        return -np.sum((matrix - query) ** 2, axis=1)
+    return matrix @ query
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class FlatIndex:
+    """Busca exata (força bruta) sobre todos os vetores; é a linha de base de recall."""
+
+    kind = "flat"
+
+    def __init__(self, dim, metric="cosine"):
+        self.dim = dim
+        self.metric = metric
+        self.ntotal = 0
+
+    def add(self, vectors):
+        self.ntotal += len(vectors)
+
+    def search(self, query, k, vectors):
+        scores = _scores(vectors[:self.ntotal], query, self.metric)
+        top = _top_k(scores, k)
+        return top, scores[top]
+
+    def save(self, path):
+        pass
+
+    @classmethod
+    def load(cls, path, dim, metric):
+        return cls(dim, metric)
+
+
+class IVFIndex:
+    """Índice IVF (inverted file) em NumPy puro.
+
+    Os vetores são agrupados por k-means em `nlist` listas; a busca compara a
+    consulta com os centróides e varre apenas as `nprobe` listas mais próximas.
+    O índice guarda só os centróides e a lista de cada vetor: os vetores em si
+    continuam na matriz do armazenamento e são passados em `search`.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, dim, metric="cosine", nlist=1024, nprobe=16, niter=10, train_sample=40, seed=0):
+        self.dim = dim
+        self.metric = metric
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.niter = niter
+        self.train_sample = train_sample  # pontos de treino por lista
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self._order = None
+        self._offsets = None
+
+    @property
+    def ntotal(self):
+        return len(self.assignments)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _assign(self, vectors, batch_size=65536):
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            batch = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+            if self.metric == "l2":
+                # ||x - c||² = ||x||² - 2 x·c + ||c||²; ||x||² não altera o argmin
+                dist = -2 * batch @ self.centroids.T + np.sum(self.centroids ** 2, axis=1)
+                labels[start:start + batch_size] = np.argmin(dist, axis=1)
+            else:
+                labels[start:start + batch_size] = np.argmax(batch @ self.centroids.T, axis=1)
+        return labels
+
+    def train(self, vectors):
+        """Treina os centróides com k-means sobre uma amostra dos vetores."""
+        rng = np.random.default_rng(self.seed)
+        n = len(vectors)
+        # Pelo menos ~39 pontos por lista, senão os centróides ficam mal estimados
+        nlist = max(1, min(self.nlist, n // 39))
+        sample_size = min(n, nlist * self.train_sample)
+        sample_ids = np.sort(rng.choice(n, size=sample_size, replace=False))
+        sample = np.asarray(vectors[sample_ids], dtype=np.float32)
+        self.centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(self.niter):
+            labels = self._assign(sample)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums = np.zeros_like(self.centroids)
+            sums[counts > 0] = np.add.reduceat(sample[order], starts[counts > 0], axis=0)
+            empty = counts == 0
+            # Listas vazias recebem pontos aleatórios para não desperdiçar centróides
+            sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            counts[empty] = 1
+            self.centroids = sums / counts[:, None]
+            if self.metric != "l2":
+                self.centroids /= np.maximum(np.linalg.norm(self.centroids, axis=1, keepdims=True), 1e-12)
+        self.nlist = nlist
+        logger.debug(f"IVF treinado com {nlist} listas sobre {sample_size} vetores")
+
+    def add(self, vectors):
+        if not self.is_trained:
+            self.train(vectors)
+        self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+        self._order = None
+
+    def _build_lists(self):
+        # Ordenação por contagem: ids agrupados por lista, com offsets estilo CSR
+        self._order = np.argsort(self.assignments, kind="stable")
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assignments, minlength=self.nlist))])
+
+    def search(self, query, k, vectors):
+        if self.ntotal == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self._order is None:
+            self._build_lists()
+        probes = _top_k(_scores(self.centroids, query, self.metric), self.nprobe)
+        candidates = np.concatenate([self._order[self._offsets[p]:self._offsets[p + 1]] for p in probes])
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        candidates.sort()  # acesso sequencial à matriz mapeada
+        scores = _scores(vectors[candidates], query, self.metric)
+        top = _top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "centroids.npy"), self.centroids)
+        np.save(os.path.join(path, "assignments.npy"), self.assignments)
+        with open(os.path.join(path, "params.json"), "w", encoding="utf-8") as f:
+            json.dump({"nlist": self.nlist, "nprobe": self.nprobe, "niter": self.niter,
+                       "train_sample": self.train_sample, "seed": self.seed}, f)
+
+    @classmethod
+    def load(cls, path, dim, metric):
+        with open(os.path.join(path, "params.json"), "r", encoding="utf-8") as f:
+            params = json.load(f)
+        index = cls(dim, metric, **params)
+        index.centroids = np.load(os.path.join(path, "centroids.npy"))
+        index.assignments = np.load(os.path.join(path, "assignments.npy"))
+        return index
+
+
+class HNSWIndex:
+    """Índice de grafo HNSW via hnswlib (dependência opcional).
+
+    Diferente do IVF, o hnswlib mantém sua própria cópia dos vetores.
+    """
+
+    kind = "hnsw"
+
+    def __init__(self, dim, metric="cosine", M=16, ef_construction=200, ef_search=64, initial_capacity=10000):
+        try:
+            import hnswlib
+        except ImportError:
+            raise RuntimeError("Índice HNSW requer o pacote hnswlib (pip install hnswlib)")
+        self.dim = dim
+        self.metric = metric
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        space = {"cosine": "ip", "dot": "ip", "l2": "l2"}[metric]
+        self._index = hnswlib.Index(space=space, dim=dim)
+        self._index.init_index(max_elements=initial_capacity, ef_construction=ef_construction, M=M)
+        self._index.set_ef(ef_search)
+
+    @property
+    def ntotal(self):
+        return self._index.get_current_count()
+
+    def add(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        start = self.ntotal
+        needed = start + len(vectors)
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+        self._index.add_items(vectors, np.arange(start, needed))
+
+    def search(self, query, k, vectors=None):
+        k = min(k, self.ntotal)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        self._index.set_ef(max(self.ef_search, k))
+        labels, distances = self._index.knn_query(np.asarray(query, dtype=np.float32), k=k)
+        # hnswlib devolve 1 - produto interno ("ip") ou distância L2 ao quadrado ("l2")
+        scores = -distances[0] if self.metric == "l2" else 1 - distances[0]
+        return labels[0].astype(np.int64), scores
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        self._index.save_index(os.path.join(path, "hnsw.bin"))
+        with open(os.path.join(path, "params.json"), "w", encoding="utf-8") as f:
+            json.dump({"M": self.M, "ef_construction": self.ef_construction, "ef_search": self.ef_search}, f)
+
+    @classmethod
+    def load(cls, path, dim, metric):
+        with open(os.path.join(path, "params.json"), "r", encoding="utf-8") as f:
+            params = json.load(f)
+        index = cls(dim, metric, **params)
+        index._index.load_index(os.path.join(path, "hnsw.bin"))
+        index._index.set_ef(index.ef_search)
+        return index
+
+
+# Número de bits 1 em cada byte, para a distância de Hamming dos códigos binários
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _hamming(bits, query_bits):
+    """Distância de Hamming entre cada linha de `bits` e `query_bits` (bytes de np.packbits)."""
+    xor = np.bitwise_xor(bits, query_bits)
+    if hasattr(np, "bitwise_count"):
+        # NumPy >= 2.0: popcount vetorizado, ~4x mais rápido que a tabela
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[xor].sum(axis=1, dtype=np.int32)
+
+
+class QuantizedIndex:
+    """Índice com cópia compacta dos vetores (int8) e rescoring exato.
+
+    Cada dimensão tem uma escala própria (máximo absoluto / 127), estimada no
+    primeiro `add`. A busca pontua todos os códigos compactos e recalcula em
+    float32, na matriz do armazenamento, os `rescore * k` melhores candidatos,
+    o que recupera quase todo o recall com um quarto da memória residente.
+    Não há modo float16: o NumPy converte float16 sem SIMD e a primeira
+    passada ficava ~7x mais lenta que a busca exata.
+
+    Com `binary=True` há ainda uma primeira passada por distância de Hamming
+    sobre o sinal de cada dimensão (1 bit por dimensão), que seleciona
+    `binary_candidates * k` vetores antes da pontuação com os códigos.
+    """
+
+    kind = "sq"
+
+    def __init__(self, dim, metric="cosine", dtype="int8", rescore=4, binary=False, binary_candidates=40):
+        if dtype != "int8":
+            raise ValueError(f"Tipo de quantização não suportado: {dtype} (use int8)")
+        self.dim = dim
+        self.metric = metric
+        self.dtype = dtype
+        self.rescore = rescore
+        self.binary = binary
+        self.binary_candidates = binary_candidates
+        self.scales = None
+        self.codes = np.empty((0, dim), dtype=np.int8)
+        self.bits = np.empty((0, (dim + 7) // 8), dtype=np.uint8)
+        self.sq_norms = np.empty(0, dtype=np.float32)  # ||x||² aproximado, só usado com a métrica l2
+
+    @property
+    def ntotal(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        """Memória ocupada pelos códigos (a matriz float32 só é lida no rescoring)."""
+        total = self.codes.nbytes + self.sq_norms.nbytes + (self.bits.nbytes if self.binary else 0)
+        return total + (self.scales.nbytes if self.scales is not None else 0)
+
+    def train(self, vectors, batch_size=65536):
+        """Estima a escala int8 de cada dimensão a partir dos vetores."""
+        max_abs = np.zeros(self.dim, dtype=np.float32)
+        for start in range(0, len(vectors), batch_size):
+            batch = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+            max_abs = np.maximum(max_abs, np.max(np.abs(batch), axis=0))
+        self.scales = np.maximum(max_abs, 1e-12) / 127
+
+    def _encode(self, vectors):
+        return np.clip(np.rint(vectors / self.scales), -127, 127).astype(np.int8)
+
+    def _decode(self, codes):
+        return codes.astype(np.float32) * self.scales
+
+    def add(self, vectors, batch_size=65536):
+        if self.scales is None:
+            self.train(vectors)
+        codes, bits, sq_norms = [self.codes], [self.bits], [self.sq_norms]
+        for start in range(0, len(vectors), batch_size):
+            batch = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+            codes.append(self._encode(batch))
+            if self.binary:
+                bits.append(np.packbits(batch > 0, axis=1))
+            if self.metric == "l2":
+                sq_norms.append(np.sum(self._decode(codes[-1]) ** 2, axis=1))
+        self.codes = np.concatenate(codes)
+        self.bits = np.concatenate(bits)
+        self.sq_norms = np.concatenate(sq_norms)
+
+    def _approx_scores(self, ids, query, batch_size=8192):
+        codes = self.codes if ids is None else self.codes[ids]
+        # (c * s) · q = c · (s * q): não precisa reconstruir os vetores
+        weights = self.scales * query
+        dots = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), batch_size):
+            # Conversão em blocos pequenos, que cabem no cache da CPU
+            dots[start:start + batch_size] = codes[start:start + batch_size].astype(np.float32) @ weights
+        if self.metric == "l2":
+            norms = self.sq_norms if ids is None else self.sq_norms[ids]
+            return 2 * dots - norms  # -||x - q||² a menos da constante ||q||²
+        return dots
+
+    def search(self, query, k, vectors=None):
+        if self.ntotal == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        candidates = None
+        if self.binary:
+            query_bits = np.packbits(query > 0)
+            candidates = _top_k(-_hamming(self.bits, query_bits), self.binary_candidates * k)
+            candidates.sort()
+        scores = self._approx_scores(candidates, query)
+        if vectors is None or self.rescore <= 0:
+            top = _top_k(scores, k)
+            ids = top if candidates is None else candidates[top]
+            if self.metric == "l2":
+                return ids, scores[top] - np.dot(query, query)
+            return ids, scores[top]
+        shortlist = _top_k(scores, self.rescore * k)
+        shortlist = np.sort(shortlist if candidates is None else candidates[shortlist])
+        exact = _scores(np.asarray(vectors[shortlist], dtype=np.float32), query, self.metric)
+        top = _top_k(exact, k)
+        return shortlist[top], exact[top]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "codes.npy"), self.codes)
+        np.save(os.path.join(path, "sq_norms.npy"), self.sq_norms)
+        if self.scales is not None:
+            np.save(os.path.join(path, "scales.npy"), self.scales)
+        if self.binary:
+            np.save(os.path.join(path, "bits.npy"), self.bits)
+        with open(os.path.join(path, "params.json"), "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "rescore": self.rescore, "binary": self.binary,
+                       "binary_candidates": self.binary_candidates}, f)
+
+    @classmethod
+    def load(cls, path, dim, metric):
+        with open(os.path.join(path, "params.json"), "r", encoding="utf-8") as f:
+            params = json.load(f)
+        index = cls(dim, metric, **params)
+        index.codes = np.load(os.path.join(path, "codes.npy"))
+        index.sq_norms = np.load(os.path.join(path, "sq_norms.npy"))
+        if os.path.exists(os.path.join(path, "scales.npy")):
+            index.scales = np.load(os.path.join(path, "scales.npy"))
+        if index.binary:
+            index.bits = np.load(os.path.join(path, "bits.npy"))
+        return index
+
+
+INDEX_TYPES = {"flat": FlatIndex, "ivf": IVFIndex, "hnsw": HNSWIndex, "sq": QuantizedIndex}
+
+
+def create_index(kind, dim, metric="cosine", **params):
+    """Cria um índice vazio do tipo pedido (flat, ivf, hnsw ou sq)."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice desconhecido: {kind}")
+    return INDEX_TYPES[kind](dim, metric, **params)
+
+
+def load_index(kind, path, dim, metric="cosine"):
+    """Carrega do disco um índice salvo com `save`."""
+    return INDEX_TYPES[kind].load(path, dim, metric)
@@ -0,0 +1,131 @@
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import numpy as np
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+def chunk_key(results, instructions=""):
+    """Identifica o conjunto de chunks recuperados, independente da ordem, e as instruções do prompt."""
+    ids = sorted(str(row.get("id") or hashlib.sha1(row["content"].encode("utf-8")).hexdigest()) for row in results)
+    if instructions:
+        # Instruções diferentes mudam a resposta mesmo com o mesmo contexto
+        ids.append("instructions:" + hashlib.sha1(instructions.encode("utf-8")).hexdigest())
+    return hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()
+
+
+class SemanticAnswerCache:
+    """Cache de respostas do Gemini por similaridade semântica da pergunta.
+
+    Uma resposta guardada é reaproveitada quando a nova pergunta tem
+    similaridade de cosseno >= `threshold` com a pergunta original e a busca
+    recuperou exatamente os mesmos chunks (então o contexto do prompt é o
+    mesmo). As entradas ficam num SQLite local e sobrevivem a reinícios; o
+    total de bytes é limitado a `max_bytes`, descartando as menos usadas.
+    """
+
+    def __init__(self, path, threshold=0.95, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chunk_key TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access)")
+        self._db.commit()
+
+        # Embeddings em memória, agrupados pelo conjunto de chunks: chunk_key -> {id: vetor}
+        self._groups = {}
+        self._total_bytes = 0
+        for entry_id, key, embedding, size in self._db.execute("SELECT id, chunk_key, embedding, size FROM answers"):
+            self._groups.setdefault(key, {})[entry_id] = np.frombuffer(embedding, dtype=np.float32)
+            self._total_bytes += size
+        logger.debug(f"Cache de respostas carregado de {path}: {self._total_bytes} bytes")
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+
+    def lookup(self, query_embedding, results, instructions=""):
+        """Retorna a resposta guardada para uma pergunta equivalente, ou None."""
+        with self._lock:
+            group = self._groups.get(chunk_key(results, instructions))
+            if group:
+                ids = list(group)
+                similarities = np.stack([group[i] for i in ids]) @ self._normalize(query_embedding)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    row = self._db.execute("SELECT answer FROM answers WHERE id = ?", (ids[best],)).fetchone()
+                    if row is not None:
+                        self._db.execute("UPDATE answers SET last_access = ? WHERE id = ?", (time.time(), ids[best]))
+                        self._db.commit()
+                        self.hits += 1
+                        return row[0]
+            self.misses += 1
+            return None
+
+    def store(self, query, query_embedding, results, answer, instructions=""):
+        embedding = self._normalize(query_embedding)
+        key = chunk_key(results, instructions)
+        size = len(answer.encode("utf-8")) + len(query.encode("utf-8")) + embedding.nbytes
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO answers (chunk_key, query, embedding, answer, size, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, query, embedding.tobytes(), answer, size, time.time())
+            )
+            self._groups.setdefault(key, {})[cursor.lastrowid] = embedding
+            self._total_bytes += size
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes:
+            row = self._db.execute("SELECT id, chunk_key, size FROM answers ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            entry_id, key, size = row
+            self._db.execute("DELETE FROM answers WHERE id = ?", (entry_id,))
+            group = self._groups.get(key, {})
+            group.pop(entry_id, None)
+            if not group:
+                self._groups.pop(key, None)
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": sum(len(group) for group in self._groups.values()),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -72,6 +72,14 @@ def check_backend_connection():
         logger.error(f"Erro ao verificar conexão com backend: {str(e)}")
         return False
 
+# O backend só aceita ocr=true com pdf2image e poppler instalados
+def backend_supports_ocr():
+    try:
+        return requests.get(f"{BACKEND_URL}/health", timeout=5).json().get("ocr", False)
+    except Exception as e:
+        logger.warning(f"Erro ao consultar suporte a OCR do backend: {str(e)}")
+        return False
+
 # Verificar conexão com backend no início
 if not check_backend_connection():
     st.error("⚠️ Backend não está acessível. Por favor, verifique se o servidor está rodando.")
@@ -114,30 +122,74 @@ else:
         st.session_state.pdfs_processed = []
 
     # Função para upload de PDF
-    def upload_pdf(pdf_path):
+    def upload_pdf(pdf_path, filename, document_id=None, ocr=False):
         if not check_backend_connection():
             st.error("⚠️ Backend não está acessível. Não é possível fazer upload no momento.")
             return None
         try:
             with open(pdf_path, "rb") as pdf_file:
-                files = {"file": (pdf_path.name, pdf_file, "application/pdf")}
+                # O nome real do arquivo (não o do arquivo temporário) identifica o PDF no backend
+                files = {"file": (filename, pdf_file, "application/pdf")}
+                data = {"ocr": str(ocr).lower()}
+                if document_id:
+                    data["document_id"] = document_id  # substitui a versão anterior desse documento
                 url = f"{BACKEND_URL}/upload_pdf"
-                response = requests.post(url, files=files)
+                response = requests.post(url, files=files, data=data)
                 response.raise_for_status()
-                pdf_info = {
-                    "filename": pdf_path.name,
-                    "uploaded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "summary": "Resumo não disponível (faça uma consulta para gerar)"
-                }
-                st.session_state.pdfs_processed.append(pdf_info)
-                return response.json()
+                upload = response.json()
+                if upload.get("duplicate") and "job_id" not in upload:
+                    # Arquivo idêntico já ingerido: o backend não reprocessa
+                    st.info(f"ℹ️ Este PDF já foi processado antes (como {upload.get('original_filename')}).")
+                    return upload
+                job_id = upload["job_id"]
+
+            # O backend processa o PDF em segundo plano; acompanhar o job até terminar
+            progress_bar = st.progress(0.0)
+            status_text = st.empty()
+            while True:
+                job_response = requests.get(f"{BACKEND_URL}/jobs/{job_id}", timeout=10)
+                job_response.raise_for_status()
+                job = job_response.json()
+                progress = job["progress"]
+                pages_total = progress.get("pages_total") or 0
+                chunks_total = progress.get("chunks_total") or 0
+                # Metade da barra para a extração e metade para embeddings + gravação
+                fraction = 0.0
+                if pages_total:
+                    fraction += 0.5 * progress.get("pages_parsed", 0) / pages_total
+                if chunks_total:
+                    fraction += 0.25 * progress.get("chunks_embedded", 0) / chunks_total
+                    fraction += 0.25 * progress.get("rows_written", 0) / chunks_total
+                progress_bar.progress(min(fraction, 1.0))
+                status_text.text(
+                    f"Páginas: {progress.get('pages_parsed', 0)}/{pages_total} | "
+                    f"Chunks com embedding: {progress.get('chunks_embedded', 0)}/{chunks_total} | "
+                    f"Gravados: {progress.get('rows_written', 0)}"
+                )
+                if job["status"] in ("done", "failed"):
+                    break
+                time.sleep(1)
+
+            if job["status"] == "failed":
+                logger.error(f"Job {job_id} falhou: {job['error']}")
+                st.error(f"⚠️ Erro ao processar o PDF: {job['error']}")
+                return None
+            progress_bar.progress(1.0)
+            pdf_info = {
+                "filename": filename,
+                "uploaded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "summary": "Resumo não disponível (faça uma consulta para gerar)"
+            }
+            st.session_state.pdfs_processed.append(pdf_info)
+            return job["result"]
         except requests.exceptions.RequestException as e:
             logger.error(f"Erro ao fazer upload do PDF: {str(e)}")
             st.error("⚠️ Erro ao fazer upload do PDF. Verifique a conexão com o backend.")
             return None
 
     # Função para consulta RAG
-    def query_rag(user_query):
+    def query_rag(user_query, label="Resposta:"):
+        """Consulta o backend em streaming, mostrando a resposta conforme chega."""
         if not check_backend_connection():
             st.error("⚠️ Backend não está acessível. Não é possível fazer consultas no momento.")
             return None
@@ -152,12 +204,53 @@ else:
                 "ou a artéria culpada e dando uma breve razão para cada síndrome/local."
                 "Sempre responda em português brasileiro."
             )
-            full_query = f"{system_prompt}\n\nPergunta: {user_query}"
-            headers = {"Content-Type": "application/json"}
-            url = f"{BACKEND_URL}/query?user_query={full_query}"
-            response = requests.get(url, headers=headers)
+            # A pergunta vai separada das instruções: só ela entra no embedding, na busca e nos caches
+            params = {"user_query": user_query, "instructions": system_prompt}
+            headers = {"Accept": "text/event-stream"}
+            url = f"{BACKEND_URL}/query_stream"
+            start = time.perf_counter()
+            response = requests.get(url, params=params, headers=headers, stream=True)
             response.raise_for_status()
-            return response.json()
+            response.encoding = "utf-8"
+
+            # Server-Sent Events: metadata -> token* -> done (ou error)
+            st.write(label)
+            placeholder = st.empty()
+            answer = ""
+            client_ttft_ms = None
+            done = {}
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if event == "token":
+                        if client_ttft_ms is None:
+                            client_ttft_ms = (time.perf_counter() - start) * 1000
+                        answer += data["text"]
+                        placeholder.markdown(answer + "▌")
+                    elif event == "metadata":
+                        logger.debug(f"{len(data['chunks'])} chunks recuperados em {data['retrieval_ms']} ms")
+                    elif event == "done":
+                        done = data
+                    elif event == "error":
+                        logger.error(f"Erro na consulta RAG (backend): {data['detail']}")
+                        st.error("⚠️ Erro ao fazer consulta no backend.")
+                        return None
+            placeholder.markdown(answer)
+            total_ms = (time.perf_counter() - start) * 1000
+            st.caption(
+                f"Primeiro trecho em {client_ttft_ms or total_ms:.0f} ms · total {total_ms:.0f} ms"
+                + (" · resposta do cache" if done.get("cached") else "")
+            )
+            return {
+                "response": answer,
+                "ttft_ms": client_ttft_ms,
+                "total_ms": total_ms,
+                "server_ttft_ms": done.get("ttft_ms"),
+                "server_total_ms": done.get("total_ms")
+            }
         except requests.exceptions.RequestException as e:
             logger.error(f"Erro ao fazer consulta RAG: {str(e)} - Resposta: {response.text if 'response' in locals() else 'sem resposta'}")
             st.error("⚠️ Erro ao fazer consulta. Verifique a conexão com o backend.")
@@ -167,14 +260,38 @@ else:
     if st.session_state.authenticated:
         st.subheader("Upload de PDF")
         uploaded_file = st.file_uploader("Carregue um PDF", type="pdf")
+        # OCR do Gemini nas páginas escaneadas (as de texto legível continuam sem OCR)
+        if backend_supports_ocr():
+            use_ocr = st.checkbox("Usar OCR (PDFs escaneados)")
+        else:
+            use_ocr = False
+        document_id = st.text_input(
+            "Identificador do documento (opcional)",
+            help="Preencha só para enviar uma nova edição de um documento já carregado com o mesmo identificador."
+        )
         if uploaded_file is not None:
             pdf_path = Path("temp.pdf")
             with open(pdf_path, "wb") as f:
                 f.write(uploaded_file.getbuffer())
             if st.button("Processar PDF"):
-                result = upload_pdf(pdf_path)
+                result = upload_pdf(pdf_path, uploaded_file.name, document_id=document_id.strip() or None, ocr=use_ocr)
                 if result:
                     st.success(result["message"])
+                    if result.get("pages_reused"):
+                        # Nova edição de um PDF já ingerido: só as páginas alteradas foram reprocessadas
+                        st.caption(
+                            f"Páginas reaproveitadas: {result['pages_reused']} | "
+                            f"recalculadas: {result['pages_recomputed']} | "
+                            f"chunks reaproveitados: {result['chunks_reused']} | "
+                            f"novos: {result['chunks_recomputed']} | removidos: {result['chunks_deleted']}"
+                        )
+                    if result.get("pages_low_text") or result.get("pages_ocr") or result.get("pages_failed"):
+                        # Páginas escaneadas ou com extração ruim: só essas vão (ou iriam) para o OCR
+                        st.caption(
+                            f"Páginas sem texto legível: {result.get('pages_low_text', 0)} | "
+                            f"extraídas por OCR: {result.get('pages_ocr', 0)} | "
+                            f"com falha no OCR: {result.get('pages_failed', 0)}"
+                        )
                 else:
                     st.error("Falha ao processar o PDF.")
             if pdf_path.exists():
@@ -184,10 +301,8 @@ else:
     st.subheader("Faça uma Consulta (Sem Login Necessário)")
     query = st.text_area("Digite sua pergunta sobre os PDFs processados (e.g., 'Quais medicamentos tratam canalopatias musculares?')")
     if query and st.button("Consultar"):
-        result = query_rag(query)
-        if result:
-            st.write("Resposta:", result["response"])
-        else:
+        result = query_rag(query)  # A resposta é exibida conforme chega
+        if not result:
             st.error("Falha ao realizar a consulta.")
 
     # Resumo dos arquivos processados
@@ -199,11 +314,10 @@ else:
             st.write(f"**Resumo:** {pdf['summary']}")
             if st.button(f"Gerar Resumo Detalhado para {pdf['filename']}"):
                 summary_query = f"Resuma o conteúdo do PDF {pdf['filename']} em 2-3 frases."
-                summary_result = query_rag(summary_query)
+                summary_result = query_rag(summary_query, label="Resumo Detalhado:")
                 if summary_result:
                     pdf['summary'] = summary_result["response"]
                     st.session_state.pdfs_processed = [p for p in st.session_state.pdfs_processed if p['filename'] != pdf['filename']] + [pdf]
-                    st.write("Resumo Detalhado:", summary_result["response"])
     else:
         st.write("Nenhum PDF processado ainda.")
 
@@ -0,0 +1,115 @@
+import os
+import time
+import argparse
+import tempfile
+import logging
+import numpy as np
+from ann_index import create_index
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIM = 768
+
+
+def make_dataset(path, n, n_clusters=1000, seed=0, batch_size=50000):
+    """Gera vetores sintéticos agrupados (como embeddings reais) num arquivo memory-mapped."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, DIM)).astype(np.float32)
+    vectors = np.memmap(path, dtype=np.float32, mode="w+", shape=(n, DIM))
+    for start in range(0, n, batch_size):
+        size = min(batch_size, n - start)
+        batch = centers[rng.integers(0, n_clusters, size)] + 0.6 * rng.normal(size=(size, DIM)).astype(np.float32)
+        vectors[start:start + size] = batch / np.linalg.norm(batch, axis=1, keepdims=True)
+    vectors.flush()
+    return vectors
+
+
+def make_queries(vectors, n_queries, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), n_queries, replace=False)] + 0.05 * rng.normal(size=(n_queries, DIM)).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def index_memory(index, n):
+    """Bytes que a busca mantém residentes: a matriz float32 inteira, exceto no sq."""
+    if index.kind == "sq":
+        return index.nbytes
+    memory = n * DIM * 4
+    if index.kind == "ivf":
+        memory += index.centroids.nbytes + index.assignments.nbytes
+    elif index.kind == "hnsw":
+        memory += n * index.M * 2 * 4  # arestas da camada 0 (estimativa)
+    return memory
+
+
+def run_index(kind, vectors, queries, ground_truth, k, params):
+    index = create_index(kind, DIM, "cosine", **params)
+    start = time.perf_counter()
+    if kind == "ivf" or params.get("dtype") == "int8":
+        # Treinar sobre o conjunto inteiro (amostra no IVF), não só sobre o primeiro lote
+        index.train(vectors)
+    for offset in range(0, len(vectors), 100000):
+        index.add(vectors[offset:offset + 100000])
+    build_s = time.perf_counter() - start
+
+    latencies, hits = [], 0
+    for query, truth in zip(queries, ground_truth):
+        start = time.perf_counter()
+        ids, _ = index.search(query, k, vectors)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(ids.tolist()) & truth)
+    return {
+        "build_s": build_s,
+        "recall": hits / (k * len(queries)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mb_per_million": index_memory(index, len(vectors)) / len(vectors) * 1e6 / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k e latência dos índices ANN contra a busca exata")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Números de chunks separados por vírgula")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=0, help="Listas do IVF (0 = sqrt(n))")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--rescore", type=int, default=4, help="Candidatos recalculados em float32 por resultado (sq)")
+    parser.add_argument("--workdir", default=None, help="Diretório para os vetores sintéticos (padrão: temporário)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_ann_")
+    print(f"{'n':>9} {'índice':>10} {'build (s)':>10} {'recall@' + str(args.k):>9} {'Δrecall':>8} "
+          f"{'p50 (ms)':>9} {'p99 (ms)':>9} {'MB/1M':>8}")
+    for n in [int(size) for size in args.sizes.split(",")]:
+        vectors = make_dataset(os.path.join(workdir, f"vectors_{n}.f32"), n)
+        queries = make_queries(vectors, args.queries)
+        flat = create_index("flat", DIM, "cosine")
+        flat.add(vectors)
+        ground_truth = [set(flat.search(query, args.k, vectors)[0].tolist()) for query in queries]
+
+        nlist = args.nlist or int(np.sqrt(n))
+        configs = [
+            ("flat", "flat", {}),
+            ("ivf", "ivf", {"nlist": nlist, "nprobe": args.nprobe}),
+            ("hnsw", "hnsw", {"ef_search": args.ef_search, "initial_capacity": n}),
+            ("sq-int8", "sq", {"dtype": "int8", "rescore": args.rescore}),
+            ("sq-int8-0", "sq", {"dtype": "int8", "rescore": 0}),
+            ("sq-bin", "sq", {"dtype": "int8", "rescore": args.rescore, "binary": True}),
+        ]
+        for label, kind, params in configs:
+            try:
+                result = run_index(kind, vectors, queries, ground_truth, args.k, params)
+            except RuntimeError as e:
+                logger.warning(f"Pulando {label}: {e}")
+                continue
+            # A busca exata tem recall 1.0, então o delta é a perda em relação a ela
+            print(f"{n:>9} {label:>10} {result['build_s']:>10.2f} {result['recall']:>9.3f} {result['recall'] - 1:>8.3f} "
+                  f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['mb_per_million']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import time
+import resource
+import argparse
+import logging
+import numpy as np
+from multiprocessing import get_context
+from embedding_backends import load_embedding_model
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_SENTENCES = [
+    "Qual é o tratamento de primeira linha para hipertensão arterial sistêmica?",
+    "A insuficiência cardíaca com fração de ejeção reduzida responde a betabloqueadores.",
+    "Pacientes com fibrilação atrial devem ser avaliados quanto ao risco de AVC pelo escore CHA2DS2-VASc.",
+    "O diagnóstico de diabetes mellitus pode ser feito pela hemoglobina glicada acima de 6,5%.",
+    "Quais são os critérios de internação na pneumonia adquirida na comunidade?",
+    "A dose de amoxicilina em crianças é ajustada pelo peso corporal.",
+    "Sintomas de hipotireoidismo incluem fadiga, ganho de peso e intolerância ao frio.",
+    "O exame de imagem inicial para suspeita de apendicite em adultos é a tomografia de abdome.",
+]
+
+
+def _rss_mb():
+    # ru_maxrss vem em KiB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(backend, model_name, threads, sentences, batch_size, repeats):
+    """Roda num processo próprio para que a memória de um backend não conte no outro."""
+    model = load_embedding_model(backend, model_name, threads=threads)
+    model.encode(sentences[:batch_size], batch_size=batch_size, show_progress_bar=False)  # aquecimento
+    embeddings = None
+    start = time.perf_counter()
+    for _ in range(repeats):
+        embeddings = model.encode(sentences, batch_size=batch_size, show_progress_bar=False)
+    elapsed = time.perf_counter() - start
+    return {
+        "sentences_per_s": len(sentences) * repeats / elapsed,
+        "rss_mb": _rss_mb(),
+        "embeddings": np.asarray(embeddings, dtype=np.float32),
+    }
+
+
+def cosine_parity(reference, candidate):
+    """Similaridade de cosseno linha a linha entre os vetores de dois backends."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return np.sum(reference * candidate, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridade e throughput do embedding em PyTorch vs ONNX int8")
+    parser.add_argument("--model", default="all-mpnet-base-v2")
+    parser.add_argument("--backends", default="torch,onnx")
+    parser.add_argument("--threads", type=int, default=0, help="Threads de inferência (0 = automático)")
+    parser.add_argument("--sentences", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Falha se a paridade ficar abaixo disso")
+    args = parser.parse_args()
+
+    sentences = [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] + f" ({i})" for i in range(args.sentences)]
+    backends = args.backends.split(",")
+    results = {}
+    ctx = get_context("spawn")
+    for backend in backends:
+        with ctx.Pool(1) as pool:
+            results[backend] = pool.apply(_measure, (
+                backend, args.model, args.threads or None, sentences, args.batch_size, args.repeats
+            ))
+
+    print(f"{'backend':>8} {'sentenças/s':>12} {'RSS (MB)':>9}")
+    for backend in backends:
+        print(f"{backend:>8} {results[backend]['sentences_per_s']:>12.1f} {results[backend]['rss_mb']:>9.0f}")
+
+    reference = backends[0]
+    failed = False
+    for backend in backends[1:]:
+        cosines = cosine_parity(results[reference]["embeddings"], results[backend]["embeddings"])
+        print(f"paridade {backend} vs {reference}: cosseno médio {cosines.mean():.4f}, mínimo {cosines.min():.4f}")
+        failed = failed or cosines.min() < args.min_cosine
+    if failed:
+        raise SystemExit(f"Paridade abaixo de {args.min_cosine}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import time
+import asyncio
+import argparse
+import logging
+import numpy as np
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from embedding_service import BatchingEmbedder
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class StubEmbedModel:
+    """Custo fixo por chamada + custo por sentença, como o encode em CPU."""
+
+    def __init__(self, call_ms, item_ms):
+        self.call_s = call_ms / 1000
+        self.item_s = item_ms / 1000
+
+    def encode(self, texts, show_progress_bar=False):
+        single = isinstance(texts, str)
+        n = 1 if single else len(texts)
+        time.sleep(self.call_s + self.item_s * n)
+        return np.ones(768, dtype=np.float32) if single else np.ones((n, 768), dtype=np.float32)
+
+
+async def run(encode, clients, requests_per_client):
+    latencies = []
+
+    async def worker(i):
+        for j in range(requests_per_client):
+            start = time.perf_counter()
+            await encode(f"pergunta {i} {j}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(clients)])
+    elapsed = time.perf_counter() - start
+    return clients * requests_per_client / elapsed, float(np.percentile(latencies, 50) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas/s do encode com e sem micro-batching")
+    parser.add_argument("--clients", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=20, help="Requisições por cliente")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--real-model", action="store_true", help="Usar o all-mpnet-base-v2 em vez do stub")
+    args = parser.parse_args()
+
+    if args.real_model:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer("all-mpnet-base-v2")
+    else:
+        model = StubEmbedModel(call_ms=15, item_ms=2)
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+
+    async def unbatched(text):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(model.encode, text, show_progress_bar=False))
+
+    print(f"{'clientes':>8} {'modo':>10} {'consultas/s':>12} {'p50 (ms)':>9}")
+    for clients in [int(c) for c in args.clients.split(",")]:
+        embedder = BatchingEmbedder(model, executor, max_batch_size=args.max_batch,
+                                    max_wait_ms=args.max_wait_ms, max_in_flight=args.workers)
+        for mode, encode in (("individual", unbatched), ("lote", embedder.encode)):
+            qps, p50 = asyncio.run(run(encode, clients, args.requests))
+            print(f"{clients:>8} {mode:>10} {qps:>12.1f} {p50:>9.1f}")
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import time
+import random
+import tempfile
+import argparse
+import logging
+import concurrent.futures
+from PIL import Image, ImageDraw
+from rate_limiter import AdaptiveLimiter
+from ocr_cache import OCRCache
+from processar_pdfs import process_pdf_pages, CHUNKING_PROMPT, BATCH_CHUNKING_PROMPT
+
+# Configurar logging
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+WORDS = ("paciente", "tratamento", "diagnóstico", "dose", "exame", "sintomas", "risco", "pressão",
+         "insuficiência", "cardíaca", "fibrilação", "atrial", "terapia", "clínico", "avaliação")
+
+
+def approx_tokens(text):
+    # ~4 caracteres por token, como o tokenizador do Gemini em média
+    return max(1, len(text) // 4)
+
+
+class StubGeminiModel:
+    """Imita o `generate_content` do Gemini: latência fixa por requisição + latência por página.
+
+    Devolve os chunks no formato pedido pelo prompt (com <page number="N"> quando
+    há várias páginas) e contabiliza requisições e tokens de entrada e saída.
+    """
+
+    model_name = "stub"
+
+    def __init__(self, request_ms, page_ms, image_tokens, words_per_page):
+        self.request_ms = request_ms
+        self.page_ms = page_ms
+        self.image_tokens = image_tokens
+        self.words_per_page = words_per_page
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._rng = random.Random(0)
+
+    def _page_text(self, page_num):
+        words = " ".join(self._rng.choice(WORDS) for _ in range(self.words_per_page))
+        return f"<chunk>## Página {page_num}\n{words}</chunk>"
+
+    def generate_content(self, payload):
+        texts = [part["text"] for part in payload if "text" in part]
+        images = sum(1 for part in payload if "inline_data" in part)
+        page_nums = [int(text.split()[1].rstrip(":")) for text in texts if text.startswith("Page ")]
+        time.sleep((self.request_ms + self.page_ms * images) / 1000)
+        if page_nums:
+            text = "\n".join(f'<page number="{n}">{self._page_text(n)}</page>' for n in page_nums)
+        else:
+            text = self._page_text(0)
+        self.requests += 1
+        self.input_tokens += images * self.image_tokens + sum(approx_tokens(t) for t in texts)
+        self.output_tokens += approx_tokens(text)
+        return type("Response", (), {"text": text})()
+
+
+def make_pages(count, size):
+    """Páginas sintéticas com linhas de texto, para o PNG ter um tamanho realista."""
+    rng = random.Random(42)
+    pages = []
+    for page_num in range(1, count + 1):
+        image = Image.new("RGB", size, "white")
+        draw = ImageDraw.Draw(image)
+        for y in range(80, size[1] - 80, 28):
+            draw.text((80, y), " ".join(rng.choice(WORDS) for _ in range(12)), fill="black")
+        pages.append((page_num, image))
+    return pages
+
+
+def run(pages, pages_per_request, args):
+    model = StubGeminiModel(args.request_ms, args.page_ms, args.image_tokens, args.words_per_page)
+    limiter = AdaptiveLimiter(requests_per_min=args.rpm, max_concurrency=args.workers,
+                              initial_concurrency=args.workers)
+    groups = [pages[i:i + pages_per_request] for i in range(0, len(pages), pages_per_request)]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = OCRCache(f"{tmp}/ocr_cache.sqlite3")  # vazio: todas as páginas vão ao modelo
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(lambda group: process_pdf_pages("bench.pdf", group, model, limiter, cache),
+                                        groups))
+        elapsed = time.perf_counter() - start
+        cache.close()
+    chunks = [chunk for group_chunks, _ in results for chunk in group_chunks]
+    failed = sum(len(group_failed) for _, group_failed in results)
+    pages_with_chunks = {int(chunk["id"].split("_")[1]) for chunk in chunks}
+    assert pages_with_chunks == {page_num for page_num, _ in pages}, "ids de chunk fora da página de origem"
+    cost = (model.input_tokens * args.input_price + model.output_tokens * args.output_price) / 1e6
+    return {
+        "pages_per_min": len(pages) / elapsed * 60,
+        "requests": model.requests,
+        "input_tokens": model.input_tokens,
+        "output_tokens": model.output_tokens,
+        "cost_per_1k_pages": cost / len(pages) * 1000,
+        "failed": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Páginas/min e custo do OCR com 1, 2, 4 e 8 páginas por requisição")
+    parser.add_argument("--pages", type=int, default=64)
+    parser.add_argument("--batch-sizes", default="1,2,4,8")
+    parser.add_argument("--workers", type=int, default=4, help="Requisições em paralelo")
+    parser.add_argument("--rpm", type=int, default=120, help="Orçamento de requisições por minuto (0 = sem limite)")
+    parser.add_argument("--request-ms", type=float, default=1500, help="Latência fixa de cada requisição no stub")
+    parser.add_argument("--page-ms", type=float, default=1000, help="Latência extra por página no stub")
+    parser.add_argument("--image-tokens", type=int, default=258, help="Tokens de entrada cobrados por imagem")
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--input-price", type=float, default=0.10, help="US$ por 1M tokens de entrada")
+    parser.add_argument("--output-price", type=float, default=0.40, help="US$ por 1M tokens de saída")
+    parser.add_argument("--page-size", default="1240x1754", help="Tamanho das páginas renderizadas (150 dpi A4)")
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, tuple(int(v) for v in args.page_size.split("x")))
+    print(f"prompts: 1 página ~{approx_tokens(CHUNKING_PROMPT)} tokens, lote ~{approx_tokens(BATCH_CHUNKING_PROMPT)} tokens")
+    print(f"{'págs/req':>8} {'págs/min':>9} {'reqs':>5} {'tokens in':>10} {'tokens out':>10} {'US$/1k págs':>12} {'falhas':>6}")
+    for size in (int(v) for v in args.batch_sizes.split(",")):
+        r = run(pages, size, args)
+        print(f"{size:>8} {r['pages_per_min']:>9.1f} {r['requests']:>5} {r['input_tokens']:>10} "
+              f"{r['output_tokens']:>10} {r['cost_per_1k_pages']:>12.4f} {r['failed']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import time
+import argparse
+import logging
+from processar_pdfs import iter_page_images, prepare_image, encode_image, OCR_DPI
+
+# Configurar logging
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# (nome, maior lado, tons de cinza, formato, qualidade)
+CONFIGS = [
+    ("png (atual)", 0, "off", "png", None),
+    ("png cinza", 0, "on", "png", None),
+    ("png 2000px cinza", 2000, "on", "png", None),
+    ("jpeg q85 2000px", 2000, "off", "jpeg", 85),
+    ("jpeg q85 2000px cinza", 2000, "on", "jpeg", 85),
+    ("jpeg q70 1600px cinza", 1600, "on", "jpeg", 70),
+    ("webp q85 2000px cinza", 2000, "on", "webp", 85),
+    ("webp q85 2000px auto", 2000, "auto", "webp", 85),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes por página e tempo de codificação das imagens enviadas ao OCR")
+    parser.add_argument("pdf", help="PDF de amostra")
+    parser.add_argument("--pages", type=int, default=8, help="Quantas páginas do início do PDF usar")
+    parser.add_argument("--dpi", type=int, default=OCR_DPI)
+    args = parser.parse_args()
+
+    pages = []
+    for page_num, image in iter_page_images(args.pdf, dpi=args.dpi):
+        pages.append(image)
+        if len(pages) >= args.pages:
+            break
+
+    baseline = None
+    print(f"{'configuração':>24} {'KB/página':>10} {'ms/página':>10} {'vs png':>7}")
+    for name, max_edge, grayscale, image_format, quality in CONFIGS:
+        total_bytes = 0
+        start = time.perf_counter()
+        for image in pages:
+            data, _ = encode_image(prepare_image(image, max_edge=max_edge, grayscale=grayscale), image_format, quality)
+            total_bytes += len(data)
+        elapsed = time.perf_counter() - start
+        kb_per_page = total_bytes / len(pages) / 1024
+        baseline = baseline or kb_per_page
+        print(f"{name:>24} {kb_per_page:>10.0f} {elapsed * 1000 / len(pages):>10.1f} {kb_per_page / baseline:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import time
+import argparse
+import logging
+from PyPDF2 import PdfReader
+from pdf_extract import PageExtractor
+
+# Configurar logging
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Páginas/s da extração de texto do PyPDF2 por número de processos")
+    parser.add_argument("pdf", help="PDF grande de amostra (centenas de páginas)")
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--range-pages", type=int, default=16, help="Páginas por tarefa de extração")
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args()
+
+    page_count = len(PdfReader(args.pdf).pages)
+    print(f"{args.pdf}: {page_count} páginas")
+    print(f"{'processos':>9} {'1ª execução (s)':>16} {'páginas/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers in (int(v) for v in args.workers.split(",")):
+        extractor = PageExtractor(workers=workers, range_pages=args.range_pages)
+        try:
+            # A primeira execução inclui a criação dos processos (uma vez por servidor)
+            start = time.perf_counter()
+            for _ in extractor.pages(args.pdf, page_count):
+                pass
+            first_run = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                for _ in extractor.pages(args.pdf, page_count):
+                    pass
+            pages_per_s = page_count * args.repeats / (time.perf_counter() - start)
+        finally:
+            extractor.shutdown()
+        baseline = baseline or pages_per_s
+        print(f"{workers:>9} {first_run:>16.2f} {pages_per_s:>10.1f} {pages_per_s / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
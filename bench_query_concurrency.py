@@ -0,0 +1,123 @@
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import logging
+import numpy as np
+
+# O backend local evita precisar de credenciais do Supabase só para o benchmark
+os.environ.setdefault("VECTOR_STORE_BACKEND", "local")
+os.environ.setdefault("LOCAL_STORE_PATH", tempfile.mkdtemp(prefix="bench_query_"))
+os.environ.setdefault("ANSWER_CACHE_PATH", os.path.join(os.environ["LOCAL_STORE_PATH"], "answer_cache.sqlite3"))
+
+import httpx
+import rag_interface
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logging.getLogger("rag_interface").setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+class StubEmbedModel:
+    """Simula o encode (o PyTorch libera o GIL durante a inferência)."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def encode(self, text, show_progress_bar=False):
+        time.sleep(self.seconds)
+        if isinstance(text, str):
+            return np.ones(768, dtype=np.float32)
+        return np.ones((len(text), 768), dtype=np.float32)
+
+
+class StubVectorStore:
+    """Simula a RPC search_pdf_chunks: ida e volta de rede sem custo de CPU."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.rows = [{"id": str(i), "content": f"chunk {i}"} for i in range(5)]
+
+    def search(self, query_embedding, k=5):
+        time.sleep(self.seconds)
+        return self.rows[:k]
+
+    async def asearch(self, query_embedding, k=5):
+        await asyncio.sleep(self.seconds)
+        return self.rows[:k]
+
+    async def aclose(self):
+        pass
+
+
+class StubResponse:
+    text = "resposta"
+
+
+class StubGemini:
+    """Simula a geração do Gemini (a etapa mais lenta)."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def generate_content(self, prompt):
+        time.sleep(self.seconds)
+        return StubResponse()
+
+    async def generate_content_async(self, prompt):
+        await asyncio.sleep(self.seconds)
+        return StubResponse()
+
+
+async def query_blocking(user_query: str, bypass_cache: bool = False):
+    """Caminho antigo do /query: todas as etapas bloqueiam o event loop."""
+    query_embedding = rag_interface.embed_model.encode(user_query, show_progress_bar=False)
+    results = rag_interface.vector_store.search(query_embedding, k=5)
+    context = "\n\n".join(row["content"] for row in results)
+    response = rag_interface.gemini_model.generate_content(f"{user_query}\n\n{context}")
+    return {"response": response.text}
+
+
+async def run_load(path, clients, requests_per_client):
+    transport = httpx.ASGITransport(app=rag_interface.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker(i):
+            for j in range(requests_per_client):
+                # Perguntas distintas e bypass_cache para medir o pipeline, não os caches
+                response = await client.get(path, params={
+                    "user_query": f"Quais medicamentos tratam canalopatias? ({i}.{j})", "bypass_cache": "true"
+                })
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(i) for i in range(clients)])
+        return clients * requests_per_client / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput do /query com clientes concorrentes usando stubs locais")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=4, help="Requisições por cliente")
+    parser.add_argument("--encode-ms", type=float, default=10)
+    parser.add_argument("--search-ms", type=float, default=40)
+    parser.add_argument("--llm-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    rag_interface.embed_model = StubEmbedModel(args.encode_ms / 1000)
+    rag_interface.query_embedder.model = rag_interface.embed_model
+    rag_interface.vector_store = StubVectorStore(args.search_ms / 1000)
+    rag_interface.gemini_model = StubGemini(args.llm_ms / 1000)
+    rag_interface.app.add_api_route("/query_blocking", query_blocking, methods=["GET"])
+
+    before = asyncio.run(run_load("/query_blocking", args.clients, args.requests))
+    after = asyncio.run(run_load("/query", args.clients, args.requests))
+    print(f"{args.clients} clientes concorrentes (encode {args.encode_ms} ms, busca {args.search_ms} ms, LLM {args.llm_ms} ms)")
+    print(f"  antes (bloqueante):    {before:8.2f} consultas/s")
+    print(f"  depois (assíncrono):   {after:8.2f} consultas/s  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+class BulkWriteError(Exception):
+    """Um ou mais lotes falharam mesmo depois de todas as tentativas."""
+
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+
+class BulkWriter:
+    """Grava linhas no armazenamento vetorial em lotes, com várias requisições em voo.
+
+    As linhas são acumuladas em lotes de `batch_size` e enviadas por um pool de
+    `max_in_flight` threads; `add` bloqueia quando já há `max_in_flight` lotes
+    pendentes, então a memória fica limitada mesmo com entradas muito grandes.
+    Um lote que falha é reenviado sozinho (backoff exponencial com jitter), sem
+    refazer o resto do upload.
+
+    Uso:
+        with BulkWriter(vector_store) as writer:
+            writer.add(rows)
+        writer.stats  # rows, batches, retries, failed_batches, seconds, rows_per_s
+    """
+
+    def __init__(self, store, batch_size=200, max_in_flight=4, max_retries=3, backoff=0.5, on_batch=None):
+        self.store = store
+        self.on_batch = on_batch  # chamado com o número de linhas de cada lote gravado
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="bulk-writer")
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._stats_lock = threading.Lock()
+        self._buffer = []
+        self._futures = []
+        self._errors = []
+        self._start = time.perf_counter()
+        self.stats = {"rows": 0, "batches": 0, "retries": 0, "failed_batches": 0, "seconds": 0.0, "rows_per_s": 0.0}
+
+    def _write_batch(self, batch):
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.store.add(batch)
+                    with self._stats_lock:
+                        self.stats["rows"] += len(batch)
+                        self.stats["batches"] += 1
+                    if self.on_batch:
+                        self.on_batch(len(batch))
+                    return
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        logger.error(f"Lote de {len(batch)} linhas falhou após {attempt + 1} tentativas: {str(e)}")
+                        with self._stats_lock:
+                            self.stats["failed_batches"] += 1
+                            self._errors.append(e)
+                        return
+                    delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                    logger.warning(f"Erro ao gravar lote ({str(e)}), nova tentativa em {delay:.2f}s")
+                    with self._stats_lock:
+                        self.stats["retries"] += 1
+                    time.sleep(delay)
+        finally:
+            self._slots.release()
+
+    def _submit(self, batch):
+        self._slots.acquire()
+        self._futures.append(self._executor.submit(self._write_batch, batch))
+        # Descartar futures concluídos para não acumular referências aos lotes
+        self._futures = [f for f in self._futures if not f.done()]
+
+    def add(self, rows):
+        """Enfileira linhas; lotes completos são enviados imediatamente."""
+        for row in rows:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._submit(self._buffer)
+                self._buffer = []
+
+    def flush(self):
+        """Envia o lote parcial, espera todos os lotes e devolve as estatísticas."""
+        if self._buffer:
+            self._submit(self._buffer)
+            self._buffer = []
+        for future in self._futures:
+            future.result()
+        self._futures = []
+        self.stats["seconds"] = time.perf_counter() - self._start
+        self.stats["rows_per_s"] = self.stats["rows"] / self.stats["seconds"] if self.stats["seconds"] > 0 else 0.0
+        if self._errors:
+            raise BulkWriteError(
+                f"{self.stats['failed_batches']} lote(s) não foram gravados: {str(self._errors[0])}", dict(self.stats)
+            )
+        return dict(self.stats)
+
+    def close(self):
+        try:
+            return self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def write(self, rows):
+        """Grava todas as linhas e devolve as estatísticas."""
+        self.add(rows)
+        return self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(wait=True)
+        return False
@@ -0,0 +1,116 @@
+import re
+import logging
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Fim de frase seguido de espaço; quebras de parágrafo são tratadas à parte
+_SENTENCE_END = re.compile(r"(?<=[.!?…:;])\s+")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def approx_token_count(texts):
+    """Estimativa sem tokenizador: ~1,3 tokens WordPiece por palavra em português."""
+    return [int(len(text.split()) * 1.3) + 1 for text in texts]
+
+
+def tokenizer_counter(tokenizer):
+    """Contador de tokens (sem [CLS]/[SEP]) a partir de um tokenizador do Hugging Face."""
+    def count(texts):
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+    return count
+
+
+def split_sentences(text):
+    """Divide o texto de uma página em frases, respeitando parágrafos.
+
+    Quebras de linha dentro de um parágrafo (comuns no texto extraído de PDF)
+    viram espaços.
+    """
+    sentences = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = " ".join(paragraph.split())
+        if paragraph:
+            sentences.extend(s for s in _SENTENCE_END.split(paragraph) if s)
+    return sentences
+
+
+def _split_long(sentence, tokens, max_tokens):
+    # Frase maior que o chunk inteiro: cortar por palavras em pedaços proporcionais
+    words = sentence.split()
+    pieces = -(-tokens // max_tokens)
+    size = -(-len(words) // pieces)
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+def iter_chunks(pages, max_tokens=256, overlap_tokens=32, count_tokens=approx_token_count, page_aligned=False):
+    """Agrupa as frases das páginas em chunks de até `max_tokens` tokens do modelo.
+
+    `pages` é qualquer iterável de textos por página (pode ser um gerador) e
+    os chunks são produzidos assim que ficam completos, então só a janela do
+    chunk corrente fica em memória. Os chunks terminam em fronteiras de frase
+    e os seguintes repetem as últimas frases do anterior até somar
+    `overlap_tokens`. Cada chunk é um dicionário com 'content', 'page_start' e
+    'page_end' (páginas numeradas a partir de 1).
+
+    Com `page_aligned=True` nenhum chunk atravessa páginas: os chunks de uma
+    página dependem só do texto dela, então uma página inalterada numa nova
+    versão do PDF gera exatamente os mesmos chunks.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens deve ser menor que max_tokens")
+    window, window_tokens = [], 0
+    n_pages = n_segments = n_chunks = 0
+    for page_number, text in enumerate(pages, 1):
+        n_pages += 1
+        if page_aligned and window:
+            yield _make_chunk(window)
+            n_chunks += 1
+            window, window_tokens = [], 0
+        for segment in _page_segments(text or "", page_number, max_tokens, count_tokens):
+            n_segments += 1
+            if window and window_tokens + segment[2] > max_tokens:
+                yield _make_chunk(window)
+                n_chunks += 1
+                # Sobreposição: manter as últimas frases que cabem em overlap_tokens
+                kept, kept_tokens = [], 0
+                for previous in reversed(window):
+                    if kept_tokens + previous[2] > overlap_tokens or kept_tokens + previous[2] + segment[2] > max_tokens:
+                        break
+                    kept.append(previous)
+                    kept_tokens += previous[2]
+                window, window_tokens = kept[::-1], kept_tokens
+            window.append(segment)
+            window_tokens += segment[2]
+    if window:
+        yield _make_chunk(window)
+        n_chunks += 1
+    logger.debug(f"{n_segments} frases de {n_pages} páginas agrupadas em {n_chunks} chunks")
+
+
+def chunk_pages(pages, max_tokens=256, overlap_tokens=32, count_tokens=approx_token_count, page_aligned=False):
+    """Versão de `iter_chunks` que devolve a lista completa de chunks."""
+    return list(iter_chunks(pages, max_tokens, overlap_tokens, count_tokens, page_aligned))
+
+
+def _page_segments(text, page_number, max_tokens, count_tokens):
+    # (frase, página, tokens); os tokens de uma página são contados numa só chamada
+    segments = []
+    sentences = split_sentences(text)
+    for sentence, tokens in zip(sentences, count_tokens(sentences)):
+        if tokens > max_tokens:
+            pieces = _split_long(sentence, tokens, max_tokens)
+            segments.extend(zip(pieces, [page_number] * len(pieces), count_tokens(pieces)))
+        else:
+            segments.append((sentence, page_number, tokens))
+    return segments
+
+
+def _make_chunk(window):
+    return {
+        "content": " ".join(segment[0] for segment in window),
+        "page_start": window[0][1],
+        "page_end": window[-1][1],
+    }
@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import sqlite3
+import threading
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Namespace fixo: o mesmo conteúdo gera o mesmo id de chunk em qualquer processo
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c3a52-4f0e-4d8b-9a57-2b8e0c9d7e41")
+
+
+def copy_and_hash(source, destination, block_size=1024 * 1024):
+    """Copia um arquivo aberto calculando o SHA-256 do conteúdo no mesmo passo."""
+    digest = hashlib.sha256()
+    while True:
+        block = source.read(block_size)
+        if not block:
+            break
+        digest.update(block)
+        destination.write(block)
+    return digest.hexdigest()
+
+
+def _stream_bytes(stream):
+    # Bytes ainda codificados do stream: hashear não exige decodificar imagens
+    data = getattr(stream, "_data", None)
+    return data if data is not None else stream.get_data()
+
+
+def _hash_pdf_object(obj, digest, seen, depth=0):
+    """Alimenta `digest` com um objeto do PDF e tudo o que ele referencia (dicionários, arrays, streams)."""
+    if depth > 32:
+        return
+    idnum = getattr(obj, "idnum", None)
+    if idnum is not None:  # referência indireta: cada objeto entra uma vez só (evita ciclos)
+        key = (idnum, getattr(obj, "generation", 0))
+        if key in seen:
+            digest.update(f"ref {key}".encode("utf-8"))
+            return
+        seen.add(key)
+        obj = obj.get_object()
+    if hasattr(obj, "get_data"):
+        digest.update(b"stream " + hashlib.sha256(_stream_bytes(obj)).digest())
+    if isinstance(obj, dict):
+        # dict.items: os valores crus, sem a resolução automática das referências do PyPDF2
+        for name, value in sorted(dict.items(obj), key=lambda item: str(item[0])):
+            if name == "/Parent":
+                continue  # não subir pela árvore de páginas
+            digest.update(str(name).encode("utf-8"))
+            _hash_pdf_object(value, digest, seen, depth + 1)
+    elif isinstance(obj, list):
+        for value in list.__iter__(obj):
+            _hash_pdf_object(value, digest, seen, depth + 1)
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+
+
+def page_fingerprint(page):
+    """SHA-256 da página (PyPDF2): content stream bruto + os recursos que ele usa, sem extrair o texto.
+
+    Os recursos (imagens e formulários XObject, fontes...) entram pelo
+    conteúdo dos seus streams: páginas escaneadas, cujo content stream é só
+    um `Do` da imagem, diferem pela imagem. Páginas ilegíveis caem no hash do
+    texto extraído.
+    """
+    digest = hashlib.sha256()
+    try:
+        contents = page.get_contents()
+        digest.update(contents.get_data() if contents is not None else b"")
+        _hash_pdf_object(dict.get(page, "/Resources"), digest, set())
+    except Exception:
+        digest = hashlib.sha256((page.extract_text() or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def chunk_hash(content):
+    """SHA-256 do texto do chunk com espaços colapsados (quebras de linha não contam)."""
+    return hashlib.sha256(" ".join(content.split()).encode("utf-8")).hexdigest()
+
+
+def chunk_id(content):
+    """Id determinístico (UUID v5) derivado do hash do conteúdo do chunk."""
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, chunk_hash(content)))
+
+
+def take_page_ids(previous_pages, fingerprint):
+    """Ids dos chunks de uma página da versão anterior com essa impressão digital, ou None.
+
+    `previous_pages` vem de `DocumentRegistry.page_chunks`. Páginas repetidas
+    (mesma impressão digital) são casadas na ordem em que aparecem; as
+    excedentes reaproveitam a última.
+    """
+    candidates = previous_pages.get(fingerprint)
+    if not candidates:
+        return None
+    return candidates.pop(0) if len(candidates) > 1 else candidates[0]
+
+
+def document_key(document_id, doc_hash):
+    """Chave do documento no registro de versões: o `document_id` pedido ou, sem ele, o hash do arquivo.
+
+    Todo documento ingerido tem uma chave, para que os chunks de cada um fiquem
+    registrados e uma nova versão de outro documento não apague chunks que
+    ele ainda usa.
+    """
+    return document_id if document_id is not None else f"sha256:{doc_hash}"
+
+
+class DocumentRegistry:
+    """Registro dos PDFs já ingeridos, pelo SHA-256 do arquivo.
+
+    Os documentos concluídos ficam num SQLite local e sobrevivem a reinícios.
+    Uploads em andamento ficam só em memória (`track`/`in_flight`), para que um
+    segundo upload do mesmo arquivo enquanto o primeiro roda reaproveite o
+    mesmo job em vez de processar tudo de novo.
+
+    Para cada documento lógico (`doc_key`, ver `document_key`: o `document_id`
+    explícito ou, sem ele, o hash do arquivo) o registro guarda também a
+    versão mais recente página a página: a impressão digital de cada página e
+    os ids dos chunks gerados a partir dela. Uma nova versão reaproveita as
+    páginas com a mesma impressão digital; só há substituição de versão
+    quando o mesmo `document_id` é enviado de novo. Um chunk só é órfão
+    quando nenhum documento registrado o usa mais.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._in_flight = {}  # hash do documento -> Job
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_hash TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                chunks INTEGER NOT NULL,
+                ingested_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS document_pages (
+                doc_key TEXT NOT NULL,
+                page_number INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL,
+                chunk_ids TEXT NOT NULL,
+                PRIMARY KEY (doc_key, page_number)
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS document_chunks (
+                doc_key TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (doc_key, chunk_id)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS document_chunks_chunk_id ON document_chunks (chunk_id)")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS document_versions (
+                doc_key TEXT PRIMARY KEY,
+                doc_hash TEXT NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def get(self, doc_hash):
+        """Dados do documento já ingerido com esse hash, ou None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT filename, chunks, ingested_at FROM documents WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"doc_hash": doc_hash, "filename": row[0], "chunks": row[1], "ingested_at": row[2]}
+
+    def in_flight(self, doc_hash):
+        """Job que ainda está processando um documento com esse hash, ou None."""
+        with self._lock:
+            job = self._in_flight.get(doc_hash)
+            if job is not None and job.status in ("done", "failed"):
+                del self._in_flight[doc_hash]
+                job = None
+            return job
+
+    def track(self, doc_hash, job):
+        """Associa o documento ao job que vai processá-lo."""
+        with self._lock:
+            self._in_flight = {
+                key: value for key, value in self._in_flight.items() if value.status not in ("done", "failed")
+            }
+            self._in_flight[doc_hash] = job
+
+    def add(self, doc_hash, filename, chunks):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (doc_hash, filename, chunks, ingested_at) VALUES (?, ?, ?, ?)",
+                (doc_hash, filename, chunks, time.time())
+            )
+            self._db.commit()
+        logger.debug(f"Documento {filename} registrado ({doc_hash[:12]}, {chunks} chunks)")
+
+    def page_chunks(self, doc_key):
+        """Última versão do documento: impressão digital -> ids dos chunks de cada página com ela, em ordem."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT fingerprint, chunk_ids FROM document_pages WHERE doc_key = ? ORDER BY page_number", (doc_key,)
+            ).fetchall()
+        pages = {}
+        for fingerprint, chunk_ids in rows:
+            pages.setdefault(fingerprint, []).append(json.loads(chunk_ids))
+        return pages
+
+    def _orphans(self, doc_key, new_ids):
+        old_ids = {row[0] for row in self._db.execute(
+            "SELECT chunk_id FROM document_chunks WHERE doc_key = ?", (doc_key,)
+        )}
+        orphans = []
+        for chunk in old_ids - new_ids:
+            shared = self._db.execute(
+                "SELECT 1 FROM document_chunks WHERE chunk_id = ? AND doc_key != ? LIMIT 1", (chunk, doc_key)
+            ).fetchone()
+            if shared is None:
+                orphans.append(chunk)
+        return orphans
+
+    def orphans(self, doc_key, pages):
+        """Ids de chunks que `replace_version(doc_key, pages)` deixaria órfãos, sem gravar nada.
+
+        Permite apagar os órfãos do armazenamento antes de gravar a nova versão:
+        se a remoção falhar, o registro continua apontando para a versão antiga
+        e a próxima ingestão encontra os mesmos órfãos.
+        """
+        new_ids = {chunk for _, _, ids in pages for chunk in ids}
+        with self._lock:
+            return self._orphans(doc_key, new_ids)
+
+    def replace_version(self, doc_key, pages, doc_hash=None):
+        """Grava a nova versão do documento e devolve os ids de chunks que ficaram órfãos.
+
+        `pages` é uma lista de (número da página, impressão digital, ids dos
+        chunks). Órfãos são chunks da versão anterior que não aparecem na nova
+        nem em nenhum outro documento, e podem ser apagados do armazenamento.
+
+        Com `doc_hash` (o arquivo da nova versão), o arquivo da versão
+        substituída sai de `documents`: reenviá-lo depois (e.g. para voltar
+        a ele) não é recusado como duplicado, já que seus chunks exclusivos
+        foram apagados.
+        """
+        new_ids = {chunk for _, _, ids in pages for chunk in ids}
+        with self._lock:
+            orphans = self._orphans(doc_key, new_ids)
+            with self._db:
+                if doc_hash is not None:
+                    row = self._db.execute(
+                        "SELECT doc_hash FROM document_versions WHERE doc_key = ?", (doc_key,)
+                    ).fetchone()
+                    if row is not None and row[0] != doc_hash:
+                        self._db.execute("DELETE FROM documents WHERE doc_hash = ?", (row[0],))
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO document_versions (doc_key, doc_hash) VALUES (?, ?)", (doc_key, doc_hash)
+                    )
+                self._db.execute("DELETE FROM document_pages WHERE doc_key = ?", (doc_key,))
+                self._db.execute("DELETE FROM document_chunks WHERE doc_key = ?", (doc_key,))
+                self._db.executemany(
+                    "INSERT INTO document_pages (doc_key, page_number, fingerprint, chunk_ids) VALUES (?, ?, ?, ?)",
+                    [(doc_key, number, fingerprint, json.dumps(ids)) for number, fingerprint, ids in pages]
+                )
+                self._db.executemany(
+                    "INSERT INTO document_chunks (doc_key, chunk_id) VALUES (?, ?)",
+                    [(doc_key, chunk) for chunk in new_ids]
+                )
+        logger.debug(f"Versão de {doc_key} gravada: {len(pages)} páginas, {len(orphans)} chunks órfãos")
+        return orphans
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,135 @@
+import os
+import logging
+import numpy as np
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Limite de tokens do all-mpnet-base-v2 no sentence-transformers
+DEFAULT_MAX_SEQ_LENGTH = 384
+
+
+def _hf_repo(model_name):
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def export_onnx(model_name, output_dir, quantize=True):
+    """Exporta o transformer do modelo para ONNX e, opcionalmente, quantiza em int8.
+
+    Usa PyTorch/transformers (já instalados com o sentence-transformers) só na
+    exportação; a inferência depois precisa apenas do onnxruntime.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    repo = _hf_repo(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    tokenizer.save_pretrained(output_dir)
+    model = AutoModel.from_pretrained(repo).eval()
+
+    class _Encoder(torch.nn.Module):
+        # Só o last_hidden_state; o pooling é feito em NumPy
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    dummy = tokenizer(["exportação"], return_tensors="pt")
+    logger.info(f"Exportando {repo} para ONNX em {fp32_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(model), (dummy["input_ids"], dummy["attention_mask"]), fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14
+        )
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    int8_path = os.path.join(output_dir, "model_int8.onnx")
+    logger.info(f"Quantizando pesos em int8 (dinâmico) em {int8_path}")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class OnnxEmbeddingModel:
+    """all-mpnet-base-v2 via onnxruntime em CPU, com a mesma interface de `encode`.
+
+    Reproduz o pipeline do sentence-transformers: transformer -> mean pooling
+    sobre a máscara de atenção -> normalização L2. O modelo exportado fica em
+    `cache_dir` e é reaproveitado nas próximas inicializações.
+    """
+
+    def __init__(self, model_name="all-mpnet-base-v2", cache_dir="data/onnx", quantize=True, threads=None,
+                 max_seq_length=DEFAULT_MAX_SEQ_LENGTH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        model_path = os.path.join(model_dir, "model_int8.onnx" if quantize else "model.onnx")
+        if not os.path.exists(model_path):
+            model_path = export_onnx(model_name, model_dir, quantize=quantize)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = max_seq_length
+        self.model_path = model_path
+        logger.debug(f"Modelo ONNX carregado de {model_path} ({threads or 'auto'} threads)")
+
+    def _encode_batch(self, sentences):
+        tokens = self.tokenizer(
+            sentences, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        mask = tokens["attention_mask"].astype(np.int64)
+        hidden = self.session.run(None, {
+            "input_ids": tokens["input_ids"].astype(np.int64),
+            "attention_mask": mask,
+        })[0]
+        mask = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        if len(sentences) == 0:
+            return np.empty((0, 768), dtype=np.float32)
+        # Ordenar por tamanho reduz o padding dentro de cada lote (como o sentence-transformers faz)
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        parts = []
+        for start in range(0, len(sentences), batch_size):
+            batch = [sentences[i] for i in order[start:start + batch_size]]
+            parts.append(self._encode_batch(batch))
+        embeddings = np.empty((len(sentences), parts[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(parts)
+        return embeddings[0] if single else embeddings
+
+
+def load_embedding_model(backend="torch", model_name="all-mpnet-base-v2", threads=None, cache_dir="data/onnx",
+                         quantize=True):
+    """Carrega o modelo de embedding no backend escolhido (torch ou onnx)."""
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return OnnxEmbeddingModel(model_name, cache_dir=cache_dir, quantize=quantize, threads=threads)
+    raise ValueError(f"Backend de embedding desconhecido: {backend}")
@@ -0,0 +1,85 @@
+import time
+import asyncio
+import logging
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+class BatchingEmbedder:
+    """Agrupa pedidos de encode concorrentes (uma string cada) em lotes.
+
+    Com o executor ocioso o pedido é despachado na hora, sem latência extra
+    com pouco tráfego. Enquanto há `max_in_flight` lotes rodando, os novos
+    pedidos se acumulam e saem juntos quando um lote termina, quando o lote
+    chega a `max_batch_size` ou quando o mais antigo espera `max_wait_ms`.
+
+    Se `model` for None, `model_loader` é chamado (na thread do executor) no
+    primeiro lote para carregar o modelo.
+    """
+
+    def __init__(self, model, executor, max_batch_size=32, max_wait_ms=5, max_in_flight=1, model_loader=None):
+        self.model = model
+        self.model_loader = model_loader
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+        self._pending = []  # (texto, future)
+        self._timer = None
+        self._in_flight = 0
+        self.stats = {"requests": 0, "batches": 0, "max_batch": 0}
+
+    async def encode(self, text):
+        """Retorna o embedding de `text` (np.ndarray 1-D)."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        self.stats["requests"] += 1
+        self._maybe_dispatch()
+        return await future
+
+    def _maybe_dispatch(self):
+        while self._pending and (self._in_flight < self.max_in_flight or len(self._pending) >= self.max_batch_size):
+            self._dispatch()
+        if self._pending and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._on_timeout)
+
+    def _on_timeout(self):
+        self._timer = None
+        if self._pending:
+            self._dispatch()
+        self._maybe_dispatch()
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        self._in_flight += 1
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        asyncio.ensure_future(self._run_batch(batch))
+
+    def _encode(self, texts):
+        if self.model is None:
+            self.model = self.model_loader()
+        return self.model.encode(texts, show_progress_bar=False)
+
+    async def _run_batch(self, batch):
+        texts = [text for text, _ in batch]
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            embeddings = await loop.run_in_executor(self.executor, self._encode, texts)
+            logger.debug(f"Lote de {len(texts)} consultas codificado em {(time.perf_counter() - start) * 1000:.1f} ms")
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._in_flight -= 1
+            self._maybe_dispatch()
@@ -0,0 +1,96 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Estado de um job de ingestão em segundo plano."""
+
+    def __init__(self, description):
+        self.id = str(uuid.uuid4())
+        self.description = description
+        self.status = "queued"  # queued, running, done, failed
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        """Atualiza contadores de progresso (e.g. pages_parsed=3)."""
+        with self._lock:
+            self.progress.update(progress)
+
+    def increment(self, key, amount=1):
+        with self._lock:
+            self.progress[key] = self.progress.get(key, 0) + amount
+
+    def to_dict(self):
+        with self._lock:
+            now = self.finished_at or time.time()
+            return {
+                "job_id": self.id,
+                "description": self.description,
+                "status": self.status,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "elapsed_s": round(now - (self.started_at or now), 3),
+            }
+
+
+class JobManager:
+    """Executa jobs num pool de threads, fora do event loop do FastAPI.
+
+    A função do job recebe o próprio `Job` como primeiro argumento para
+    reportar progresso. Só os `max_finished` jobs concluídos mais recentes
+    ficam guardados.
+    """
+
+    def __init__(self, max_workers=2, max_finished=1000):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished = max_finished
+
+    def submit(self, description, fn, *args, **kwargs):
+        job = Job(description)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        logger.info(f"Job {job.id} enfileirado: {description}")
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            logger.error(f"Job {job.id} falhou: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
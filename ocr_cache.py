@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+def page_key(image, prompt, model_name):
+    """Chave do cache: hash dos pixels da página renderizada + prompt + modelo.
+
+    Usa os bytes crus da imagem (com tamanho e modo), então não depende da
+    codificação PNG; qualquer mudança no prompt ou no modelo invalida a entrada.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}\n".encode("utf-8"))
+    digest.update(image.tobytes())
+    digest.update(b"\n" + prompt.encode("utf-8") + b"\n" + model_name.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """Cache persistente do OCR do Gemini: chave da página -> lista de chunks (textos).
+
+    As entradas ficam num SQLite local e sobrevivem a reinícios; o total de
+    bytes é limitado a `max_bytes`, descartando as menos usadas. O arquivo é
+    compartilhado pelos processos do modo em lote: cada gravação trava o banco
+    e recalcula o uso a partir do disco, então o orçamento vale para todos
+    juntos, não por processo.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # timeout: o modo em lote do processar_pdfs.py abre o mesmo arquivo em vários processos
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                chunks TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+        self._db.commit()
+        logger.debug(f"Cache de OCR carregado de {path}: {self._disk_bytes()} bytes")
+
+    def _disk_bytes(self):
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, key):
+        """Chunks guardados para a página, ou None."""
+        with self._lock:
+            row = self._db.execute("SELECT chunks FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE pages SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, chunks):
+        data = json.dumps(chunks, ensure_ascii=False)
+        size = len(data.encode("utf-8")) + len(key)
+        with self._lock:
+            # Trava de escrita já no início: outro processo não grava entre a soma e o descarte
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages (key, chunks, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, data, size, time.time())
+                )
+                self._evict(self._disk_bytes())
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                raise
+
+    def _evict(self, total_bytes):
+        while total_bytes > self.max_bytes:
+            row = self._db.execute("SELECT key, size FROM pages ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._db.execute("DELETE FROM pages WHERE key = ?", (row[0],))
+            total_bytes -= row[1]
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0],
+                "bytes": self._disk_bytes(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,114 @@
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+from dedup import page_fingerprint
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+def extract_range(pdf_path, first, last, skip_fingerprints=frozenset()):
+    """Extrai as páginas `first`..`last` (a partir de 1) de um PDF em disco.
+
+    Roda num processo do pool: o documento é reaberto a partir do arquivo
+    temporário do upload, em vez de receber objetos de página serializados.
+    Devolve [(número, impressão digital, texto)], com texto None nas páginas
+    cuja impressão digital está em `skip_fingerprints` (reaproveitadas).
+    """
+    reader = PdfReader(pdf_path)
+    pages = []
+    for page_number in range(first, last + 1):
+        page = reader.pages[page_number - 1]
+        fingerprint = page_fingerprint(page)
+        text = None if fingerprint in skip_fingerprints else page.extract_text() or ""
+        pages.append((page_number, fingerprint, text))
+    return pages
+
+
+def iter_pages(pdf_reader, skip_fingerprints=frozenset()):
+    """Versão serial de `extract_range` sobre um PdfReader já aberto, página a página."""
+    for page_number, page in enumerate(pdf_reader.pages, 1):
+        fingerprint = page_fingerprint(page)
+        text = None if fingerprint in skip_fingerprints else page.extract_text() or ""
+        yield page_number, fingerprint, text
+
+
+def iter_ranges(executor, fn, page_count, range_pages, max_pending, *args):
+    """Distribui `fn(*args, first, last)` por trechos de páginas e entrega os resultados na ordem das páginas.
+
+    No máximo `max_pending` trechos ficam submetidos ao mesmo tempo, então a
+    memória não cresce com o tamanho do documento mesmo que o consumidor seja
+    mais lento que a extração.
+    """
+    ranges = iter(
+        (first, min(first + range_pages - 1, page_count)) for first in range(1, page_count + 1, range_pages)
+    )
+    pending = deque()
+
+    def submit_next():
+        page_range = next(ranges, None)
+        if page_range is not None:
+            pending.append(executor.submit(fn, *args, *page_range))
+
+    for _ in range(max_pending):
+        submit_next()
+    try:
+        while pending:
+            future = pending.popleft()
+            submit_next()  # o pool segue ocupado enquanto o consumidor processa este trecho
+            yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _extract_range_task(pdf_path, skip_fingerprints, first, last):
+    return extract_range(pdf_path, first, last, skip_fingerprints)
+
+
+class PageExtractor:
+    """Extração de texto de PDFs num pool de processos (o PyPDF2 é Python puro e preso ao GIL).
+
+    Cada trecho de `range_pages` páginas vai para um processo, que reabre o
+    arquivo pelo caminho; os resultados voltam na ordem das páginas. Com
+    `workers` <= 1 a extração é serial, no próprio processo. O pool é criado
+    no primeiro uso e compartilhado entre os uploads.
+
+    Uso:
+        extractor = PageExtractor(workers=4)
+        for page_number, fingerprint, text in extractor.pages(pdf_path, page_count):
+            ...
+    """
+
+    def __init__(self, workers=4, range_pages=16):
+        self.workers = workers
+        self.range_pages = range_pages
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: o processo do servidor tem threads e modelos carregados, que não devem ir num fork
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def pages(self, pdf_path, page_count, skip_fingerprints=frozenset(), pdf_reader=None):
+        """(número, impressão digital, texto ou None) de cada página, na ordem."""
+        skip_fingerprints = frozenset(skip_fingerprints)
+        if self.workers <= 1 or page_count <= self.range_pages:
+            # Documentos pequenos: abrir processos custaria mais que a extração
+            return iter_pages(pdf_reader or PdfReader(pdf_path), skip_fingerprints)
+        logger.debug(f"Extraindo {page_count} páginas de {pdf_path} em {self.workers} processos")
+        return iter_ranges(self._get_pool(), _extract_range_task, page_count, self.range_pages,
+                           2 * self.workers, pdf_path, skip_fingerprints)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,122 @@
+import queue
+import logging
+import resource
+import threading
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def prefetch(iterable, maxsize=4, name="prefetch"):
+    """Consome `iterable` numa thread própria, entregando os itens por uma fila limitada.
+
+    Assim o estágio anterior (e.g. extração de páginas) roda em paralelo com o
+    consumidor, mas nunca fica mais de `maxsize` itens à frente dele. Uma
+    exceção no produtor é relançada no consumidor; se o consumidor parar no
+    meio, o produtor é interrompido na próxima tentativa de enfileirar.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_DONE, e))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(iterable, size):
+    """Agrupa os itens em listas de até `size` elementos, sem materializar a entrada."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo até agora (ru_maxrss vem em KiB no Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb():
+    """Memória residente atual do processo, de /proc/self/statm; sem /proc (e.g. macOS), o pico."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+    return pages * resource.getpagesize() / (1024 * 1024)
+
+
+class RSSSampler:
+    """Amostra a memória residente atual numa thread enquanto um job roda.
+
+    O ru_maxrss de `peak_rss_mb` é o pico do processo desde que ele subiu:
+    não desce e inclui uploads anteriores. Aqui `peak_mb` é o maior RSS visto
+    entre `start` e `stop` e `start_mb` o RSS no início. Com vários jobs em
+    paralelo o RSS ainda é o do processo inteiro.
+
+    Uso:
+        rss = RSSSampler().start()
+        ...
+        rss.stop()
+        rss.peak_mb - rss.start_mb  # memória a mais durante o job
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        return self
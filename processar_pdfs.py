@@ -1,10 +1,24 @@
 import os
-from pdf2image import convert_from_bytes
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PyPDF2 import PdfReader
 import re
 from sentence_transformers import SentenceTransformer
 import concurrent.futures
+from collections import deque
 from tqdm import tqdm
 import logging
+import base64
+import threading
+from io import BytesIO
+from rate_limiter import AdaptiveLimiter, RetryError
+from ocr_cache import OCRCache, page_key
+from text_layer import route_pages
+from chunking import iter_chunks
 
 # Configurar logging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,6 +28,37 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 os.chdir(BASE_DIR)
 
+# Renderização e OCR: no máximo OCR_LOOKAHEAD páginas renderizadas ou em voo por vez
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))  # Resolução da renderização das páginas
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "4"))  # Chamadas ao Gemini em paralelo
+OCR_LOOKAHEAD = int(os.getenv("OCR_LOOKAHEAD", "8"))  # Páginas renderizadas à frente da página mais antiga pendente
+OCR_RENDER_BATCH = int(os.getenv("OCR_RENDER_BATCH", "4"))  # Páginas por chamada ao pdftoppm
+OCR_PAGES_PER_REQUEST = int(os.getenv("OCR_PAGES_PER_REQUEST", "1"))  # Páginas consecutivas por chamada ao Gemini
+OCR_MAX_PAYLOAD_MB = float(os.getenv("OCR_MAX_PAYLOAD_MB", "15"))  # Imagens (base64) por requisição; limite inline é 20 MB
+# Pré-processamento das imagens enviadas ao Gemini (os padrões mantêm o PNG na resolução de OCR_DPI)
+OCR_MAX_EDGE = int(os.getenv("OCR_MAX_EDGE", "0"))  # Maior lado em pixels após redução (0 = sem redução)
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "off").lower()  # on, off ou auto (só páginas sem cor)
+OCR_IMAGE_FORMAT = os.getenv("OCR_IMAGE_FORMAT", "png").lower()  # png, jpeg ou webp
+OCR_IMAGE_QUALITY = int(os.getenv("OCR_IMAGE_QUALITY", "85"))  # Qualidade de jpeg/webp (1-95)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))  # Orçamento de requisições por minuto (0 = sem limite)
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))  # Tentativas extras em erros transitórios
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "data/ocr_cache.sqlite3")  # Chunks já extraídos por página
+OCR_CACHE_MAX_MB = float(os.getenv("OCR_CACHE_MAX_MB", "256"))  # Orçamento em disco do cache de OCR
+# Roteamento por página: páginas com camada de texto boa não passam pelo OCR
+OCR_TEXT_LAYER = os.getenv("OCR_TEXT_LAYER", "on").lower() == "on"  # off = OCR em todas as páginas
+TEXT_MIN_CHARS = int(os.getenv("TEXT_MIN_CHARS", "200"))  # Caracteres mínimos para confiar no texto da página
+TEXT_MAX_GARBAGE = float(os.getenv("TEXT_MAX_GARBAGE", "0.05"))  # Fração máxima de glifos ilegíveis
+TEXT_CHUNK_TOKENS = int(os.getenv("TEXT_CHUNK_TOKENS", "800"))  # Tamanho dos chunks vindos da camada de texto
+
+# Limitador compartilhado por todas as páginas (e PDFs) deste processo; a concorrência
+# efetiva se adapta aos erros de cota entre 1 e OCR_WORKERS
+gemini_limiter = AdaptiveLimiter(
+    requests_per_min=GEMINI_RPM, max_concurrency=OCR_WORKERS, max_retries=GEMINI_MAX_RETRIES
+)
+
+# Cache do OCR: páginas já vistas (mesmos pixels, prompt e modelo) não vão ao Gemini
+ocr_cache = OCRCache(OCR_CACHE_PATH, max_bytes=int(OCR_CACHE_MAX_MB * 1024 * 1024))
+
 # Prompt para chunking
 CHUNKING_PROMPT = """\
 OCR the following page into Markdown. Tables should be formatted as HTML.
@@ -22,55 +67,509 @@ Surround each chunk with <chunk> and </chunk> tags.
 Preserve as much content as possible, including headings, tables, etc.
 """
 
-def process_pdf_page(pdf_path, page_num, image, gemini_model):
-    """Processa uma página de PDF com OCR e chunking usando Gemini."""
-    from io import BytesIO
-    import base64
-    buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    image_b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-    payload = [
-        {"inline_data": {"data": image_b64, "mime_type": "image/png"}},
-        {"text": CHUNKING_PROMPT}
+# Prompt para várias páginas numa só requisição; a resposta é separada por página
+BATCH_CHUNKING_PROMPT = """\
+Each image above is one page of the same document, preceded by its page number.
+For every page, OCR it into Markdown. Tables should be formatted as HTML.
+Chunk each page into sections of roughly 250 - 1000 words.
+Surround each chunk with <chunk> and </chunk> tags.
+Wrap all chunks of a page in <page number="N"> and </page>, where N is its page number.
+Never merge content from different pages into the same chunk.
+Preserve as much content as possible, including headings, tables, etc.
+"""
+
+class PageOCRError(Exception):
+    """O OCR de uma página falhou mesmo depois das novas tentativas."""
+
+    def __init__(self, page_num, cause):
+        super().__init__(f"Página {page_num}: {str(cause)}")
+        self.page_num = page_num
+        self.cause = cause
+
+def _page_chunks(pdf_path, page_num, texts, source="ocr"):
+    return [
+        {"id": f"{os.path.basename(pdf_path)}_{page_num}_chunk_{i}", "text": text, "page": page_num, "source": source}
+        for i, text in enumerate(texts)
     ]
-    try:
-        response = gemini_model.generate_content(payload)
-        text = response.text
-    except Exception as e:
-        print(f"Erro na página {page_num} do arquivo {pdf_path}: {e}")
-        return []
 
+def text_layer_chunks(pdf_path, page_num, text, max_tokens=TEXT_CHUNK_TOKENS):
+    """Chunks de uma página a partir da camada de texto, com os mesmos ids dos chunks do OCR."""
+    texts = [chunk["content"] for chunk in iter_chunks([text], max_tokens=max_tokens, overlap_tokens=0)]
+    return _page_chunks(pdf_path, page_num, texts, source="text")
+
+def _parse_chunks(text):
     chunks = re.findall(r"<chunk>(.*?)</chunk>", text, re.DOTALL)
     if not chunks:
         chunks = text.split("\n\n")  # Fallback se não houver tags
-    return [{"id": f"{os.path.basename(pdf_path)}_{page_num}_chunk_{i}", "text": chunk.strip()} for i, chunk in enumerate(chunks)]
+    return [chunk.strip() for chunk in chunks]
+
+def parse_batch_response(text, page_nums):
+    """Separa a resposta de uma requisição com várias páginas: número da página -> textos dos chunks.
+
+    Páginas que não aparecem na resposta (ou aparecem vazias) ficam de fora,
+    para serem refeitas individualmente.
+    """
+    pages = {}
+    for number, body in re.findall(r'<page number="(\d+)">(.*?)</page>', text, re.DOTALL):
+        number = int(number)
+        if number in page_nums and body.strip():
+            pages[number] = _parse_chunks(body)
+    return pages
+
+IMAGE_MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+# Bytes enviados e tempo de codificação das páginas deste processo
+encode_stats = {"pages": 0, "bytes": 0, "seconds": 0.0}
+_encode_lock = threading.Lock()
+_encode_buffers = threading.local()  # um BytesIO reaproveitado por thread
+
+def is_colorless(image, threshold=40, max_fraction=0.005):
+    """Página sem cor: menos de `max_fraction` dos pixels (numa miniatura) com saturação acima de `threshold`."""
+    if image.mode in ("L", "1"):
+        return True
+    histogram = image.convert("RGB").resize((128, 128)).convert("HSV").getchannel("S").histogram()
+    return sum(histogram[threshold:]) / sum(histogram) < max_fraction
+
+def prepare_image(image, max_edge=None, grayscale=None):
+    """Reduz a página para no máximo `max_edge` pixels no maior lado e, se pedido, para tons de cinza."""
+    max_edge = OCR_MAX_EDGE if max_edge is None else max_edge
+    grayscale = OCR_GRAYSCALE if grayscale is None else grayscale
+    if max_edge and max(image.size) > max_edge:
+        scale = max_edge / max(image.size)
+        image = image.resize((max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale))),
+                             resample=3)  # Image.Resampling.BICUBIC
+    if grayscale == "on" or (grayscale == "auto" and is_colorless(image)):
+        image = image.convert("L")
+    return image
+
+def encode_image(image, image_format=None, quality=None):
+    """Codifica a página já preparada em base64, devolvendo (dados, mime_type).
+
+    Reaproveita o buffer da thread entre páginas em vez de alocar um novo a cada uma.
+    """
+    image_format = image_format or OCR_IMAGE_FORMAT
+    quality = quality or OCR_IMAGE_QUALITY
+    start = time.perf_counter()
+    buffer = getattr(_encode_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _encode_buffers.buffer = BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    if image_format == "png":
+        image.save(buffer, format="PNG")
+    else:
+        image.save(buffer, format=image_format.upper(), quality=quality)
+    with buffer.getbuffer() as view:
+        data = base64.b64encode(view).decode("ascii")
+    with _encode_lock:
+        encode_stats["pages"] += 1
+        encode_stats["bytes"] += len(data)
+        encode_stats["seconds"] += time.perf_counter() - start
+    return data, IMAGE_MIME_TYPES[image_format]
+
+def payload_stats():
+    """Resumo do pré-processamento: bytes (base64) e milissegundos de codificação por página."""
+    with _encode_lock:
+        pages = encode_stats["pages"]
+        return {
+            "pages": pages,
+            "bytes_per_page": round(encode_stats["bytes"] / pages) if pages else 0,
+            "encode_ms_per_page": round(encode_stats["seconds"] * 1000 / pages, 1) if pages else 0.0,
+        }
+
+def _split_by_payload(encoded, max_bytes):
+    # Grupos de páginas consecutivas cujo base64 somado cabe em max_bytes (pelo menos uma página por grupo)
+    groups, group, size = [], [], 0
+    for page_num, data, mime_type in encoded:
+        if group and size + len(data) > max_bytes:
+            groups.append(group)
+            group, size = [], 0
+        group.append((page_num, data, mime_type))
+        size += len(data)
+    if group:
+        groups.append(group)
+    return groups
+
+def _ocr_request(pdf_path, group, gemini_model, limiter):
+    """Uma chamada ao Gemini para as páginas de `group` [(número, base64, mime_type)]: número -> textos dos chunks."""
+    if len(group) == 1:
+        _, data, mime_type = group[0]
+        payload = [{"inline_data": {"data": data, "mime_type": mime_type}}, {"text": CHUNKING_PROMPT}]
+    else:
+        payload = []
+        for page_num, data, mime_type in group:
+            payload.append({"text": f"Page {page_num}:"})
+            payload.append({"inline_data": {"data": data, "mime_type": mime_type}})
+        payload.append({"text": BATCH_CHUNKING_PROMPT})
+    text = limiter.call(lambda: gemini_model.generate_content(payload).text)
+    if len(group) == 1:
+        return {group[0][0]: _parse_chunks(text)}
+    return parse_batch_response(text, {page_num for page_num, _, _ in group})
+
+def process_pdf_pages(pdf_path, pages, gemini_model, limiter=None, cache=None, max_payload_bytes=None):
+    """OCR de várias páginas consecutivas [(número, imagem)] em poucas requisições.
+
+    Cada página passa antes por `prepare_image` (redução e tons de cinza).
+    Páginas do cache não vão ao Gemini; as demais são agrupadas em
+    requisições de até `max_payload_bytes` de imagem (base64). Uma página que
+    não volta separada na resposta do lote é refeita sozinha. Devolve
+    (chunks na ordem das páginas, páginas que falharam).
+    """
+    limiter = limiter or gemini_limiter
+    cache = cache or ocr_cache
+    max_payload_bytes = max_payload_bytes or int(OCR_MAX_PAYLOAD_MB * 1024 * 1024)
+    model_name = getattr(gemini_model, "model_name", "")
+    if OCR_IMAGE_FORMAT != "png":
+        # Formato com perdas: o resultado do OCR pode mudar, então entra na chave do cache
+        model_name += f"|{OCR_IMAGE_FORMAT}:{OCR_IMAGE_QUALITY}"
+    results, keys, to_send = {}, {}, []
+    for page_num, image in pages:
+        image = prepare_image(image)
+        if cache is not None:
+            keys[page_num] = page_key(image, CHUNKING_PROMPT, model_name)
+            cached = cache.get(keys[page_num])
+            if cached is not None:
+                results[page_num] = cached
+                continue
+        to_send.append((page_num, *encode_image(image)))
+
+    failed_pages = []
+    for group in _split_by_payload(to_send, max_payload_bytes):
+        try:
+            parsed = _ocr_request(pdf_path, group, gemini_model, limiter)
+        except RetryError as e:
+            logger.error(f"Erro nas páginas {[n for n, _, _ in group]} do arquivo {pdf_path} "
+                         f"após {e.attempts} tentativa(s): {e.cause}")
+            if len(group) == 1:
+                failed_pages.append(group[0][0])
+                continue
+            parsed = {}
+        for page_num, data, mime_type in group:
+            if page_num not in parsed and len(group) > 1:
+                # A resposta do lote não trouxe esta página: refazer só ela
+                try:
+                    parsed.update(_ocr_request(pdf_path, [(page_num, data, mime_type)], gemini_model, limiter))
+                except RetryError as e:
+                    logger.error(f"Erro na página {page_num} do arquivo {pdf_path} após {e.attempts} tentativa(s): {e.cause}")
+                    failed_pages.append(page_num)
+                    continue
+            results[page_num] = parsed[page_num]
+            if cache is not None:
+                cache.put(keys[page_num], parsed[page_num])
+
+    chunks = []
+    for page_num, _ in pages:
+        if page_num in results:
+            chunks.extend(_page_chunks(pdf_path, page_num, results[page_num]))
+    return chunks, sorted(failed_pages)
+
+def process_pdf_page(pdf_path, page_num, image, gemini_model, limiter=None, cache=None):
+    """Processa uma página de PDF com OCR e chunking usando Gemini.
+
+    Páginas já presentes no cache de OCR não chamam o Gemini. A chamada passa
+    pelo limitador (orçamento/minuto, concorrência adaptativa e novas
+    tentativas); se ainda assim falhar, levanta PageOCRError.
+    """
+    chunks, failed_pages = process_pdf_pages(pdf_path, [(page_num, image)], gemini_model, limiter, cache)
+    if failed_pages:
+        raise PageOCRError(page_num, RuntimeError("OCR falhou após as novas tentativas"))
+    return chunks
+
+def _page_runs(page_numbers, batch_pages):
+    # Trechos de páginas consecutivas com até batch_pages páginas: (primeira, última)
+    runs = []
+    for page_num in page_numbers:
+        if runs and page_num == runs[-1][1] + 1 and page_num - runs[-1][0] < batch_pages:
+            runs[-1][1] = page_num
+        else:
+            runs.append([page_num, page_num])
+    return runs
+
+def iter_page_images(pdf_path, dpi=OCR_DPI, batch_pages=OCR_RENDER_BATCH, page_numbers=None):
+    """Renderiza o PDF sob demanda, `batch_pages` páginas por vez, produzindo (número, imagem).
+
+    Com `page_numbers`, só essas páginas (em ordem crescente) são renderizadas.
+    """
+    if page_numbers is None:
+        page_numbers = range(1, pdfinfo_from_path(pdf_path)["Pages"] + 1)
+    for first, last in _page_runs(page_numbers, batch_pages):
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=first, last_page=last)
+        for offset, image in enumerate(images):
+            yield first + offset, image
+
+def iter_pdf_chunks(pdf_path, gemini_model, dpi=OCR_DPI, max_workers=OCR_WORKERS, lookahead=OCR_LOOKAHEAD,
+                    pages_per_request=OCR_PAGES_PER_REQUEST, text_layer=OCR_TEXT_LAYER, page_numbers=None,
+                    failed_pages=None):
+    """Produz os chunks de um PDF na ordem das páginas, à medida que o OCR de cada página termina.
+
+    Com `text_layer`, cada página tenta primeiro a camada de texto do PDF:
+    se ela tem texto suficiente e pouco lixo (ver `text_layer.py`), os chunks
+    saem dela sem renderizar nem chamar o Gemini. Só as páginas escaneadas ou
+    com extração ruim vão para o OCR. Cada chunk leva a página e a origem
+    ("text" ou "ocr"). Com `page_numbers`, só essas páginas são processadas.
+
+    As páginas do OCR são renderizadas aos poucos e no máximo `lookahead` delas ficam
+    na memória ou em OCR ao mesmo tempo: a próxima só é renderizada quando a
+    mais antiga pendente termina. Com `pages_per_request` > 1, páginas
+    consecutivas vão juntas numa mesma chamada ao Gemini. Uma página cujo OCR
+    falhou de vez vai para `failed_pages` (se for uma lista) em vez de sumir
+    silenciosamente. Como é um gerador, quem consome (e.g. o encode) trabalha
+    nas primeiras páginas enquanto as seguintes ainda estão no OCR.
+    """
+    failed_pages = failed_pages if failed_pages is not None else []
+    selected = set(page_numbers) if page_numbers is not None else None
+    text_chunks = {}  # página -> chunks da camada de texto, ainda não entregues
 
-def process_pdf(pdf_path, gemini_model):
-    """Processa um PDF completo, retornando todos os chunks."""
     try:
-        with open(pdf_path, "rb") as f:
-            pdf_data = f.read()
-        pages = convert_from_bytes(pdf_data)
-        all_chunks = []
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_to_page = {executor.submit(process_pdf_page, pdf_path, i + 1, page, gemini_model): i for i, page in enumerate(pages)}
-            for future in tqdm(concurrent.futures.as_completed(future_to_page), total=len(pages), desc=f"Processando {os.path.basename(pdf_path)}"):
-                page_chunks = future.result()
-                all_chunks.extend(page_chunks)
-        return all_chunks
+        page_count = pdfinfo_from_path(pdf_path)["Pages"]
+        ocr_pages = sorted(selected) if selected is not None else None  # None = todas
+        if text_layer:
+            ocr_pages = []
+            try:
+                for page_num, text, quality, use_text in route_pages(
+                        PdfReader(pdf_path).pages, min_chars=TEXT_MIN_CHARS, max_garbage_ratio=TEXT_MAX_GARBAGE):
+                    if selected is not None and page_num not in selected:
+                        continue
+                    if use_text:
+                        text_chunks[page_num] = text_layer_chunks(pdf_path, page_num, text)
+                    else:
+                        ocr_pages.append(page_num)
+            except Exception as e:
+                # PDF que o PyPDF2 não lê (criptografado, xref quebrado...): OCR em tudo
+                logger.warning(f"{pdf_path}: camada de texto ilegível ({e}); todas as páginas vão para o OCR")
+                text_chunks, ocr_pages = {}, sorted(selected) if selected is not None else None
+            else:
+                logger.info(f"{pdf_path}: {len(text_chunks)} páginas pela camada de texto, "
+                            f"{len(ocr_pages)} para o OCR")
+        total = len(ocr_pages) + len(text_chunks) if ocr_pages is not None else page_count
+
+        def text_pages_until(last_page):
+            # Chunks da camada de texto das páginas até last_page, em ordem
+            pages = sorted(page for page in text_chunks if last_page is None or page <= last_page)
+            return [chunk for page in pages for chunk in text_chunks.pop(page)]
+
+        def collect(future):
+            # Chunks de um grupo do OCR intercalados com as páginas de texto anteriores a ele
+            chunks, failed = future.result()
+            failed_pages.extend(failed)
+            pages = pages_per_group.popleft()
+            progress.update(len(pages))
+            merged = text_pages_until(pages[-1]) + chunks
+            merged.sort(key=lambda chunk: chunk["page"])  # estável: a ordem dentro da página se mantém
+            return len(pages), merged
+
+        pending = deque()  # futures (um por grupo de páginas) na ordem das páginas
+        pages_per_group = deque()
+        in_flight = 0
+        lookahead = max(lookahead, max_workers * pages_per_request)
+        group = []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                tqdm(total=total, desc=f"Processando {os.path.basename(pdf_path)}") as progress:
+            progress.update(len(text_chunks))
+
+            def submit(group):
+                pending.append(executor.submit(process_pdf_pages, pdf_path, group, gemini_model))
+                pages_per_group.append([page_num for page_num, _ in group])
+
+            for page_num, image in iter_page_images(pdf_path, dpi=dpi, batch_pages=min(OCR_RENDER_BATCH, lookahead),
+                                                    page_numbers=ocr_pages):
+                # Entregar o que já terminou; esperar só quando o limite de páginas em voo foi atingido
+                while pending and (in_flight >= lookahead or pending[0].done()):
+                    done, chunks = collect(pending.popleft())
+                    in_flight -= done
+                    yield from chunks
+                group.append((page_num, image))
+                in_flight += 1
+                if len(group) >= pages_per_request:
+                    submit(group)
+                    group = []
+                del image  # a imagem só fica viva enquanto a página está em voo
+            if group:
+                submit(group)
+            while pending:
+                yield from collect(pending.popleft())[1]
+            yield from text_pages_until(None)
+        failed_pages.sort()
+        if failed_pages:
+            logger.error(f"{pdf_path}: OCR falhou nas páginas {failed_pages}")
+        logger.info(f"{pdf_path}: limitador do Gemini {gemini_limiter.stats}; cache de OCR {ocr_cache.stats()}; "
+                    f"imagens {payload_stats()}")
     except Exception as e:
-        print(f"Erro ao processar {pdf_path}: {e}")
-        return []
+        # Falha do PDF inteiro (arquivo ilegível, pdftoppm ausente...): não há como saber as páginas
+        logger.exception(f"Erro ao processar {pdf_path}: {e}")
+        raise
 
-if __name__ == "__main__":
+def process_pdf(pdf_path, gemini_model, **options):
+    """Processa um PDF completo, retornando (chunks na ordem das páginas, páginas que falharam).
+
+    Versão de `iter_pdf_chunks` que devolve a lista completa; aceita as mesmas opções.
+    """
+    failed_pages = []
+    chunks = list(iter_pdf_chunks(pdf_path, gemini_model, failed_pages=failed_pages, **options))
+    return chunks, failed_pages
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """Último registro de cada documento no manifesto JSONL (linhas corrompidas são ignoradas)."""
+    records = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # última linha truncada por uma interrupção
+                records[record["file"]] = record
+    return records
+
+# Modelo do Gemini de cada processo do modo em lote (criado no initializer)
+worker_model = None
+
+def _init_worker(requests_per_min):
+    """Cada processo tem seu próprio cliente do Gemini e uma fatia do orçamento/minuto."""
+    global worker_model, gemini_limiter
     import google.generativeai as genai
     from dotenv import load_dotenv
     load_dotenv()
-    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    genai.configure(api_key=GOOGLE_API_KEY)
-    gemini_model = genai.GenerativeModel(model_name="gemini-2.0-flash")
-    pdf_files = [f for f in os.listdir(BASE_DIR) if f.endswith(".pdf")]
-    for pdf_file in pdf_files:
-        chunks = process_pdf(pdf_file, gemini_model)
-        print(f"Processed {pdf_file}: {len(chunks)} chunks")
\ No newline at end of file
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    worker_model = genai.GenerativeModel(model_name="gemini-2.0-flash")
+    gemini_limiter = AdaptiveLimiter(
+        requests_per_min=requests_per_min, max_concurrency=OCR_WORKERS, max_retries=GEMINI_MAX_RETRIES
+    )
+
+def _process_document(pdf_path, output_dir, sha256):
+    """Processa um PDF num processo do pool e grava os chunks em <output_dir>/<nome>.jsonl."""
+    start = time.perf_counter()
+    record = {"file": os.path.basename(pdf_path), "sha256": sha256}
+    hits_before = ocr_cache.stats()["hits"]
+    encoded_before = dict(encode_stats)
+    try:
+        pages = pdfinfo_from_path(pdf_path)["Pages"]
+        chunks, failed_pages = process_pdf(pdf_path, worker_model)
+    except Exception as e:
+        return dict(record, status="failed", error=str(e), pages=0, chunks=0, failed_pages=[],
+                    seconds=round(time.perf_counter() - start, 2))
+    # Escrita atômica: um arquivo de chunks só existe completo
+    output_path = os.path.join(output_dir, os.path.basename(pdf_path) + ".jsonl")
+    with open(output_path + ".tmp", "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+    os.replace(output_path + ".tmp", output_path)
+    return dict(record, status="partial" if failed_pages else "done", pages=pages, chunks=len(chunks),
+                failed_pages=failed_pages, cached_pages=ocr_cache.stats()["hits"] - hits_before,
+                text_pages=len({chunk["page"] for chunk in chunks if chunk["source"] == "text"}),
+                payload_bytes=encode_stats["bytes"] - encoded_before["bytes"],
+                encode_seconds=round(encode_stats["seconds"] - encoded_before["seconds"], 3),
+                output=output_path, seconds=round(time.perf_counter() - start, 2))
+
+def run_batch(input_dir, output_dir, processes=2, requests_per_min=GEMINI_RPM):
+    """Processa os PDFs de `input_dir` em paralelo, com checkpoint em <output_dir>/manifest.jsonl.
+
+    Cada documento concluído ganha uma linha no manifesto assim que termina.
+    Numa nova execução, documentos já concluídos (mesmo SHA-256, sem páginas
+    com falha) são pulados; os parciais são refeitos, e o cache de OCR faz
+    com que só as páginas que falharam voltem ao Gemini.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, "manifest.jsonl")
+    done = load_manifest(manifest_path)
+    pending = []
+    for name in sorted(os.listdir(input_dir)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        path = os.path.join(input_dir, name)
+        sha256 = file_sha256(path)
+        previous = done.get(name)
+        if previous and previous["status"] == "done" and previous["sha256"] == sha256:
+            continue
+        pending.append((path, sha256))
+    logger.info(f"{len(pending)} PDFs a processar ({len(done)} no manifesto) com {processes} processos")
+
+    totals = {"documents": 0, "pages": 0, "chunks": 0, "failed_documents": 0, "failed_pages": 0, "cached_pages": 0,
+              "text_pages": 0, "payload_bytes": 0, "encode_seconds": 0.0}
+    start = time.perf_counter()
+    # spawn: cada processo abre suas próprias conexões (SQLite e gRPC não sobrevivem a um fork)
+    context = multiprocessing.get_context("spawn")
+    # Fração do orçamento sem arredondar: com mais processos que requisições/minuto, `//` daria 0 (sem limite)
+    rpm_per_process = requests_per_min / processes if requests_per_min else 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                                initializer=_init_worker, initargs=(rpm_per_process,)) as executor, \
+            open(manifest_path, "a", encoding="utf-8") as manifest:
+        futures = [executor.submit(_process_document, path, output_dir, sha256) for path, sha256 in pending]
+        for future in concurrent.futures.as_completed(futures):
+            record = future.result()
+            manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+            manifest.flush()
+            os.fsync(manifest.fileno())
+            totals["documents"] += 1
+            totals["pages"] += record["pages"]
+            totals["chunks"] += record["chunks"]
+            totals["failed_pages"] += len(record["failed_pages"])
+            totals["cached_pages"] += record.get("cached_pages", 0)
+            totals["text_pages"] += record.get("text_pages", 0)
+            totals["payload_bytes"] += record.get("payload_bytes", 0)
+            totals["encode_seconds"] += record.get("encode_seconds", 0.0)
+            totals["failed_documents"] += int(record["status"] == "failed")
+            logger.info(f"{record['file']}: {record['status']}, {record['chunks']} chunks em {record['seconds']}s")
+
+    elapsed = time.perf_counter() - start
+    totals["seconds"] = round(elapsed, 1)
+    totals["pages_per_s"] = round(totals["pages"] / elapsed, 2) if elapsed > 0 else 0.0
+    totals["chunks_per_s"] = round(totals["chunks"] / elapsed, 2) if elapsed > 0 else 0.0
+    return totals
+
+def ingest_directory(input_dir):
+    """OCR -> embeddings -> armazenamento vetorial de cada PDF do diretório, um documento por vez.
+
+    Usa o pipeline de ingestão do rag_interface.py: o OCR, o encode em lotes e
+    a gravação em lote correm juntos, ligados por filas limitadas. PDFs já
+    ingeridos (mesmo SHA-256) são pulados.
+    """
+    from rag_interface import ingest_file
+    for name in sorted(os.listdir(input_dir)):
+        if not name.lower().endswith(".pdf"):
+            continue
+        try:
+            result = ingest_file(os.path.join(input_dir, name), ocr=True)
+        except Exception as e:
+            logger.error(f"{name}: falha na ingestão: {e}")
+            continue
+        if result["duplicate"]:
+            print(f"{name}: já ingerido como {result['original_filename']} ({result['chunks']} chunks)")
+        else:
+            print(f"{name}: {result['rows']} chunks gravados | páginas por OCR: {result['pages_ocr']} | "
+                  f"com falha: {result['pages_failed']} | {result['pages_per_s']} páginas/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR e chunking de um diretório de PDFs com o Gemini")
+    parser.add_argument("--input-dir", default=BASE_DIR)
+    parser.add_argument("--output-dir", default="data/ocr_output", help="Chunks por PDF e manifest.jsonl")
+    parser.add_argument("--processes", type=int, default=2, help="PDFs processados em paralelo")
+    parser.add_argument("--ingest", action="store_true",
+                        help="Gerar embeddings e gravar no armazenamento vetorial (o mesmo do /query) em vez do JSONL")
+    args = parser.parse_args()
+
+    if args.ingest:
+        ingest_directory(args.input_dir)
+        return
+
+    totals = run_batch(args.input_dir, args.output_dir, processes=args.processes)
+    print(f"Documentos: {totals['documents']} ({totals['failed_documents']} com falha) | "
+          f"Páginas: {totals['pages']} ({totals['failed_pages']} com falha no OCR) | Chunks: {totals['chunks']}")
+    print(f"Tempo: {totals['seconds']}s | {totals['pages_per_s']} páginas/s | {totals['chunks_per_s']} chunks/s")
+    print(f"Páginas pela camada de texto (sem OCR): {totals['text_pages']} | "
+          f"vindas do cache de OCR: {totals['cached_pages']}")
+    sent = totals["pages"] - totals["text_pages"] - totals["cached_pages"]
+    if sent > 0:
+        print(f"Imagens enviadas: {totals['payload_bytes'] / sent / 1024:.0f} KB/página (base64) | "
+              f"codificação {totals['encode_seconds'] * 1000 / sent:.1f} ms/página")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import time
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text):
+    """Chave de cache: Unicode NFC, minúsculas e espaços colapsados."""
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+class TTLCache:
+    """Cache LRU limitado por número de entradas e com expiração por tempo."""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class QueryCache:
+    """Cache dos embeddings das perguntas e dos chunks recuperados para cada uma.
+
+    Os embeddings só dependem do texto; os resultados da busca dependem do
+    corpus e são descartados em `invalidate` (chamado a cada upload). A
+    `generation` evita que uma busca iniciada antes do upload grave um
+    resultado velho depois da invalidação.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.embeddings = TTLCache(max_entries, ttl)
+        self.results = TTLCache(max_entries, ttl)
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def get_embedding(self, key):
+        return self.embeddings.get(key)
+
+    def set_embedding(self, key, embedding):
+        self.embeddings.set(key, embedding)
+
+    def get_results(self, key, k):
+        return self.results.get((key, k))
+
+    def set_results(self, key, k, results, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            # O score vai junto: o /query_stream o devolve no evento 'metadata'
+            self.results.set((key, k), [{"id": row.get("id"), "content": row["content"], "score": row.get("score")}
+                                        for row in results])
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self.results.clear()
+        logger.debug(f"Cache de resultados invalidado (geração {self.generation})")
+
+    def stats(self):
+        return {"generation": self.generation, "embeddings": self.embeddings.stats(), "results": self.results.stats()}
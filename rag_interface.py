@@ -1,12 +1,34 @@
+import time
+_IMPORT_START = time.perf_counter()
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import json
+import asyncio
+import shutil
+import tempfile
+import importlib
+import importlib.util
+import threading
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
-from supabase import create_client, Client
 import logging
-from sentence_transformers import SentenceTransformer
-import google.generativeai as genai
 from PyPDF2 import PdfReader
-import uuid     
+from vector_store import create_vector_store
+from bulk_writer import BulkWriter
+from jobs import Job, JobManager
+from embedding_service import BatchingEmbedder
+from query_cache import QueryCache, normalize_query
+from answer_cache import SemanticAnswerCache
+from embedding_backends import load_embedding_model
+from chunking import iter_chunks, tokenizer_counter
+from pipeline import prefetch, batched, RSSSampler
+from dedup import DocumentRegistry, copy_and_hash, chunk_id, document_key, page_fingerprint, take_page_ids
+from pdf_extract import PageExtractor
+from text_layer import text_quality, is_text_page
 
 # Configurar logging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,84 +36,639 @@ logger = logging.getLogger(__name__)
 
 # Carregar variáveis de ambiente
 load_dotenv()
-SUPABASE_URL = "https://hgpjrzouqfzqgkcxrbhv.supabase.co"
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-# Inicializar Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-# Configurar Gemini
-genai.configure(api_key=GOOGLE_API_KEY)
-gemini_model = genai.GenerativeModel(model_name="gemini-2.0-flash")
-
-# Carregar modelo de embedding
-logger.debug("Carregando modelo de embedding")
-embed_model = SentenceTransformer("all-mpnet-base-v2")
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "supabase")  # supabase, local ou kdbai
+EMBED_MODEL_NAME = os.getenv("EMBED_MODEL_NAME", "all-mpnet-base-v2")
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")  # torch (PyTorch float32) ou onnx (int8 quantizado)
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0")) or None  # Threads de inferência (0 = automático)
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "data/onnx")  # Onde o modelo exportado para ONNX é guardado
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "200"))  # Linhas por requisição de inserção
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", "4"))  # Lotes enviados em paralelo
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))  # Chunks por chamada ao encode na ingestão
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))  # Tamanho alvo do chunk em tokens do modelo
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))  # Tokens repetidos entre chunks vizinhos
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))  # Páginas (e lotes de chunks) à frente do encode
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))  # Uploads processados em paralelo
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "2"))  # Threads dedicadas ao encode das consultas
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))  # Consultas por lote de encode
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))  # Espera máxima para formar um lote
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))  # Perguntas guardadas no cache
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))  # Validade das entradas em segundos
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "data/answer_cache.sqlite3")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # Similaridade mínima entre perguntas
+ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", "64"))  # Orçamento em disco do cache de respostas
+DOCUMENT_REGISTRY_PATH = os.getenv("DOCUMENT_REGISTRY_PATH", "data/documents.sqlite3")  # Hashes dos PDFs já ingeridos
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "4"))  # Processos da extração de texto (1 = serial)
+EXTRACT_RANGE_PAGES = int(os.getenv("EXTRACT_RANGE_PAGES", "16"))  # Páginas por tarefa de extração
+TEXT_MIN_CHARS = int(os.getenv("TEXT_MIN_CHARS", "200"))  # Caracteres mínimos para confiar no texto da página
+TEXT_MAX_GARBAGE = float(os.getenv("TEXT_MAX_GARBAGE", "0.05"))  # Fração máxima de glifos ilegíveis
+# on = páginas escaneadas ou com texto ruim passam pelo OCR do Gemini (requer pdf2image e poppler)
+UPLOAD_OCR_FALLBACK = os.getenv("UPLOAD_OCR_FALLBACK", "off").lower() == "on"
 
 # Configurar o diretório de trabalho
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 os.chdir(BASE_DIR)
 
+# Recursos pesados (modelo de embedding, Gemini, armazenamento vetorial) são
+# carregados sob demanda: o aquecimento em segundo plano disparado no startup
+# os inicializa e o /ready só responde 200 depois disso.
+vector_store = None
+gemini_model = None
+embed_model = None
+_init_lock = threading.Lock()
+
+# Estado do aquecimento exposto pelo /ready, com a duração de cada fase em ms
+startup_state = {"ready": False, "error": None, "phases_ms": {"imports": 0.0}}
+
+def _timed_phase(name, fn):
+    start = time.perf_counter()
+    result = fn()
+    startup_state["phases_ms"][name] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def get_vector_store():
+    """Armazenamento vetorial configurado (Supabase por padrão), criado no primeiro uso."""
+    global vector_store
+    if vector_store is None:
+        with _init_lock:
+            if vector_store is None:
+                vector_store = _timed_phase("vector_store", lambda: create_vector_store(VECTOR_STORE_BACKEND))
+    return vector_store
+
+def _load_gemini():
+    import google.generativeai as genai
+    genai.configure(api_key=GOOGLE_API_KEY)
+    return genai.GenerativeModel(model_name="gemini-2.0-flash")
+
+def get_gemini_model():
+    global gemini_model
+    if gemini_model is None:
+        with _init_lock:
+            if gemini_model is None:
+                gemini_model = _timed_phase("gemini", _load_gemini)
+    return gemini_model
+
+def _load_embed_model():
+    runtime = "sentence_transformers" if EMBED_BACKEND == "torch" else "onnxruntime"
+    _timed_phase(f"import_{runtime}", lambda: importlib.import_module(runtime))
+    logger.debug(f"Carregando modelo de embedding ({EMBED_BACKEND})")
+    return _timed_phase("load_embed_model", lambda: load_embedding_model(
+        EMBED_BACKEND, EMBED_MODEL_NAME, threads=EMBED_THREADS, cache_dir=ONNX_CACHE_DIR
+    ))
+
+def get_embed_model():
+    global embed_model
+    if embed_model is None:
+        with _init_lock:
+            if embed_model is None:
+                embed_model = _load_embed_model()
+    return embed_model
+
+def warm_up():
+    """Inicializa todos os recursos e faz um encode de teste; roda numa thread no startup."""
+    start = time.perf_counter()
+    try:
+        get_vector_store()
+        get_gemini_model()
+        model = get_embed_model()
+        _timed_phase("warmup_encode", lambda: model.encode(["aquecimento"], show_progress_bar=False))
+        startup_state["phases_ms"]["total_warm_up"] = round((time.perf_counter() - start) * 1000, 1)
+        startup_state["ready"] = True
+        logger.info(f"Backend pronto; tempos de inicialização (ms): {startup_state['phases_ms']}")
+    except Exception as e:
+        startup_state["error"] = str(e)
+        logger.error(f"Falha no aquecimento do backend: {str(e)}")
+
+# Executor dos jobs de ingestão (uploads não bloqueiam o event loop)
+job_manager = JobManager(max_workers=INGEST_WORKERS)
+
+# Pool de processos da extração de texto dos PDFs, compartilhado entre os uploads
+page_extractor = PageExtractor(workers=EXTRACT_WORKERS, range_pages=EXTRACT_RANGE_PAGES)
+
+# Executor dedicado ao encode das consultas (CPU), separado do pool padrão do asyncio
+embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="query-embed")
+
+# Micro-batching: consultas concorrentes são codificadas juntas num único encode
+query_embedder = BatchingEmbedder(
+    embed_model, embed_executor, model_loader=get_embed_model,
+    max_batch_size=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS, max_in_flight=EMBED_WORKERS
+)
+
+# Cache de embeddings e de resultados da busca, invalidado a cada upload
+query_cache = QueryCache(max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+# Cache semântico de respostas do Gemini, persistido em disco
+answer_cache = SemanticAnswerCache(
+    ANSWER_CACHE_PATH, threshold=ANSWER_CACHE_THRESHOLD, max_bytes=int(ANSWER_CACHE_MAX_MB * 1024 * 1024)
+)
+
+# PDFs já ingeridos (pelo SHA-256 do arquivo), para recusar uploads repetidos
+document_registry = DocumentRegistry(DOCUMENT_REGISTRY_PATH)
+
 # Inicializar a aplicação FastAPI
 app = FastAPI(title="RAG Interface API", description="API para processamento de PDFs e consultas RAG")
 
+startup_state["phases_ms"]["imports"] = round((time.perf_counter() - _IMPORT_START) * 1000, 1)
+
+@app.on_event("startup")
+async def startup():
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if vector_store is not None:
+        await vector_store.aclose()
+        # Inclui inserções de jobs interrompidos; espera uma construção do índice em andamento
+        await asyncio.to_thread(vector_store.persist_index)
+    embed_executor.shutdown(wait=False)
+    job_manager.shutdown()
+    page_extractor.shutdown()
+    answer_cache.close()
+    document_registry.close()
+
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    # Liveness: o processo está de pé, mesmo que os modelos ainda estejam carregando
+    # "ocr" diz se o servidor aceita ocr=true no /upload_pdf
+    return {"status": "ok", "ocr": ocr_available()}
+
+@app.get("/ready")
+async def readiness_check():
+    # Readiness: só aceita tráfego depois do aquecimento dos modelos e clientes
+    if startup_state["ready"]:
+        return {"status": "ready", "phases_ms": startup_state["phases_ms"]}
+    status = "error" if startup_state["error"] else "warming_up"
+    return JSONResponse(status_code=503, content={
+        "status": status, "error": startup_state["error"], "phases_ms": startup_state["phases_ms"]
+    })
+
+def ocr_available():
+    """O OCR renderiza as páginas com o pdf2image, que chama o pdftoppm do poppler."""
+    return importlib.util.find_spec("pdf2image") is not None and shutil.which("pdftoppm") is not None
+
+def ocr_pages(pdf_path, page_numbers):
+    """Texto de algumas páginas pelo OCR do Gemini, numa só requisição em lote quando couber.
+
+    Usa o mesmo caminho do processar_pdfs.py (renderização, limitador e cache
+    de OCR). Devolve ({número: texto}, páginas que falharam).
+    """
+    from processar_pdfs import iter_page_images, process_pdf_pages
+    try:
+        pages = list(iter_page_images(pdf_path, page_numbers=page_numbers))
+        chunks, failed_pages = process_pdf_pages(pdf_path, pages, get_gemini_model())
+    except Exception as e:
+        # Renderização ou OCR indisponível: as páginas contam como falhas, não derrubam o upload
+        logger.error(f"OCR das páginas {page_numbers} de {pdf_path} falhou: {str(e)}")
+        return {}, list(page_numbers)
+    texts = {number: [] for number in page_numbers if number not in failed_pages}
+    for chunk in chunks:
+        texts[chunk["page"]].append(chunk["text"])
+    return {number: "\n\n".join(parts) for number, parts in texts.items()}, failed_pages
+
+_OCR_QUEUED = object()  # página à espera de completar um lote de OCR
+
+def iter_pdf_pages(pdf_reader, job, previous_pages, page_records, pdf_path):
+    """Extrai o texto página a página, sem guardar o documento inteiro.
+
+    A extração é distribuída por trechos de páginas entre os processos do
+    `page_extractor` (que reabrem o arquivo em `pdf_path`) e volta na ordem
+    das páginas. Páginas cuja impressão digital já existe na versão anterior do documento
+    não são extraídas (rendem texto vazio); seus chunks são reaproveitados.
+    `page_records` recebe (número da página, impressão digital, ids reaproveitados ou None).
+
+    A qualidade do texto extraído é avaliada por página (`text_layer.py`).
+    Com UPLOAD_OCR_FALLBACK, só as páginas escaneadas ou com texto ruim vão
+    ao OCR; as demais seguem direto da camada de texto. O OCR roda em
+    segundo plano, em lotes de `OCR_PAGES_PER_REQUEST` páginas pelo limitador
+    do processar_pdfs.py, enquanto a extração continua; as páginas saem na
+    ordem, com no máximo `OCR_LOOKAHEAD` esperando o OCR. Uma página cujo OCR
+    falhou mantém o texto do PyPDF2, conta em `pages_failed` e é registrada
+    com uma impressão digital que nunca coincide, para ser refeita num novo envio.
+    """
+    extracted = page_extractor.pages(pdf_path, len(pdf_reader.pages), previous_pages.keys(), pdf_reader=pdf_reader)
+    executor = group_size = lookahead = None
+    if UPLOAD_OCR_FALLBACK:
+        from processar_pdfs import OCR_WORKERS, OCR_PAGES_PER_REQUEST, OCR_LOOKAHEAD
+        executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="upload-ocr")
+        group_size, lookahead = OCR_PAGES_PER_REQUEST, max(OCR_LOOKAHEAD, OCR_WORKERS * OCR_PAGES_PER_REQUEST)
+    pending = deque()  # páginas na ordem: [número, impressão digital, ids reaproveitados, texto, OCR]
+    group = []  # páginas com texto ruim esperando completar um lote
+
+    def submit_group():
+        future = executor.submit(ocr_pages, pdf_path, [entry[0] for entry in group])
+        for entry in group:
+            entry[4] = future
+        group.clear()
+
+    def ready(entry):
+        return entry[4] is None or (entry[4] is not _OCR_QUEUED and entry[4].done())
+
+    def finish(entry):
+        page_number, fingerprint, reused, text, future = entry
+        if future is not None:
+            texts, failed_pages = future.result()
+            if page_number in failed_pages:
+                job.increment("pages_failed")
+                fingerprint = f"ocr-failed:{fingerprint}"  # nunca coincide com uma página real
+            else:
+                text = texts[page_number]
+                job.increment("pages_ocr")
+        page_records.append((page_number, fingerprint, reused))
+        job.increment("pages_parsed")
+        return text
 
-@app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
+    try:
+        for page_number, fingerprint, text in extracted:
+            reused = take_page_ids(previous_pages, fingerprint)
+            entry = [page_number, fingerprint, reused, text, None]
+            if reused is not None:
+                job.increment("pages_reused")
+                job.increment("chunks_reused", len(reused))
+                entry[3] = ""
+            else:
+                job.increment("pages_recomputed")
+                if not is_text_page(text_quality(text), TEXT_MIN_CHARS, TEXT_MAX_GARBAGE):
+                    job.increment("pages_low_text")
+                    if executor is not None:
+                        entry[4] = _OCR_QUEUED
+                        group.append(entry)
+                        if len(group) >= group_size:
+                            submit_group()
+            pending.append(entry)
+            # Entregar o que já terminou; esperar o OCR só quando há páginas demais pendentes
+            while pending and (len(pending) > (lookahead or 0) or ready(pending[0])):
+                if pending[0][4] is _OCR_QUEUED:
+                    submit_group()  # o lote incompleto vai assim mesmo
+                yield finish(pending.popleft())
+        if group:
+            submit_group()
+        while pending:
+            yield finish(pending.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_ocr_pages(pdf_path, job, previous_pages, page_records):
+    """Texto de cada página pelo pipeline do processar_pdfs.py (camada de texto + OCR do Gemini), em ordem.
+
+    As páginas saem assim que o OCR delas termina, então o chunking e o encode
+    das primeiras páginas correm enquanto as seguintes ainda estão no Gemini.
+    Páginas inalteradas em relação à versão anterior não passam pelo OCR. Uma
+    página cujo OCR falhou rende texto vazio e não é registrada com a sua
+    impressão digital, para ser refeita na próxima ingestão.
+    """
+    from processar_pdfs import iter_pdf_chunks
+    fingerprints = [page_fingerprint(page) for page in PdfReader(pdf_path).pages]
+    to_process = [number for number, fingerprint in enumerate(fingerprints, 1) if fingerprint not in previous_pages]
+    failed_pages = []
+    chunks = iter_pdf_chunks(pdf_path, get_gemini_model(), page_numbers=to_process, failed_pages=failed_pages)
+    by_page = itertools.groupby(chunks, key=lambda chunk: chunk["page"])
+    next_page = next(by_page, None)
+    for page_number, fingerprint in enumerate(fingerprints, 1):
+        reused = take_page_ids(previous_pages, fingerprint)
+        text = ""
+        if reused is not None:
+            job.increment("pages_reused")
+            job.increment("chunks_reused", len(reused))
+        else:
+            job.increment("pages_recomputed")
+            if next_page is not None and next_page[0] == page_number:
+                page_chunks = list(next_page[1])
+                text = "\n\n".join(chunk["text"] for chunk in page_chunks)
+                if page_chunks[0]["source"] == "ocr":
+                    job.increment("pages_ocr")
+                next_page = next(by_page, None)  # espera o OCR da próxima página com chunks
+            elif page_number in failed_pages:
+                job.increment("pages_failed")
+                fingerprint = f"ocr-failed:{fingerprint}"  # nunca coincide com uma página real
+        page_records.append((page_number, fingerprint, reused))
+        job.increment("pages_parsed")
+        yield text
+
+def ingest_pdf(job, pdf_path, filename, doc_hash, doc_key, ocr=False):
+    """Extrai, gera embeddings e grava os chunks de um PDF (executa em segundo plano).
+
+    Os estágios formam um pipeline: extração de páginas e chunking rodam em
+    threads próprias ligadas por filas limitadas, o encode consome lotes de
+    `EMBED_BATCH_SIZE` chunks e o BulkWriter grava enquanto o próximo lote é
+    codificado. A memória fica limitada pelo tamanho das filas e dos lotes,
+    não pelo número de páginas.
+
+    O id de cada chunk é derivado do hash do conteúdo: chunks repetidos no
+    próprio PDF ou já gravados por outro upload não passam pelo encode.
+
+    Com `ocr=True` o texto das páginas vem do pipeline do processar_pdfs.py
+    (camada de texto quando ela é boa, OCR do Gemini nas demais) em vez da
+    extração do PyPDF2; o OCR, o encode e a gravação rodam ao mesmo tempo.
+
+    Se `doc_key` já tem uma versão registrada, as páginas inalteradas
+    (mesma impressão digital) reaproveitam os chunks da versão anterior sem
+    extração nem encode, e os chunks que só existiam na versão anterior são
+    apagados do armazenamento no fim, desde que nenhum outro documento os use.
+    Sem `doc_key` (None) o PDF é registrado pelo próprio hash: nenhuma versão
+    é substituída, mas os chunks dele ficam protegidos contra novas versões
+    de outros documentos.
+    """
+    start = time.perf_counter()
+    rss = RSSSampler().start()  # RSS atual amostrado durante o job (o ru_maxrss é o pico do processo todo)
     try:
         # Ler o conteúdo do PDF usando PyPDF2
-        pdf_reader = PdfReader(file.file)
-        content = ""
-        for page in pdf_reader.pages:
-            content += page.extract_text() or ""
-        chunks = [content[i:i+500] for i in range(0, len(content), 500)]  # Chunking básico
-        
-        # Gerar embeddings para cada chunk
-        embeddings = embed_model.encode(chunks, show_progress_bar=False).tolist()
-        
-        # Inserir no Supabase com o nome correto da coluna 'content', 'embedding', e UUID para 'id'
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            data = {
-                "id": str(uuid.uuid4()),  # Gerar um UUID válido (e.g., "550e8400-e29b-41d4-a716-446655440000")
-                "content": chunk,  # Corrigido de "text" para "content"
-                "embedding": embedding  # Corrigido de "vectors" para "embedding"
-            }
-            supabase.table("pdf_chunks").insert(data).execute()
+        pdf_reader = PdfReader(pdf_path)
+        job.update(pages_total=len(pdf_reader.pages), pages_parsed=0, pages_reused=0, pages_recomputed=0,
+                   chunks_total=0, chunks_reused=0, chunks_duplicate=0, chunks_embedded=0, rows_written=0,
+                   chunks_deleted=0, pages_low_text=0, pages_ocr=0, pages_failed=0)
+        model = get_embed_model()
+        version_key = document_key(doc_key, doc_hash)
+        previous_pages = document_registry.page_chunks(version_key)
+        page_records = []
+        if ocr:
+            page_texts = iter_ocr_pages(pdf_path, job, previous_pages, page_records)
+        else:
+            page_texts = iter_pdf_pages(pdf_reader, job, previous_pages, page_records, pdf_path)
+        pages = prefetch(page_texts, maxsize=PIPELINE_QUEUE_SIZE, name="ingest-pages")
+        # Chunks em fronteiras de frase, medidos em tokens do modelo de embedding; um chunk
+        # nunca atravessa páginas, para que páginas inalteradas gerem os mesmos chunks
+        chunks = prefetch(iter_chunks(
+            pages, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            count_tokens=tokenizer_counter(model.tokenizer), page_aligned=True
+        ), maxsize=PIPELINE_QUEUE_SIZE * EMBED_BATCH_SIZE, name="ingest-chunks")
+        page_chunk_ids = {}  # página -> ids dos chunks gerados agora
+
+        store = get_vector_store()
+        writer = BulkWriter(
+            store, batch_size=BULK_BATCH_SIZE, max_in_flight=BULK_MAX_IN_FLIGHT,
+            on_batch=lambda n: job.increment("rows_written", n)
+        )
+        seen_ids = set()  # ids deste documento (um id ocupa poucos bytes mesmo em PDFs enormes)
+        try:
+            with writer:
+                # Gerar embeddings em lotes e entregar cada lote ao writer assim que fica pronto
+                # (vetores float32; cada backend converte para o próprio formato só na gravação)
+                for batch in batched(chunks, EMBED_BATCH_SIZE):
+                    job.increment("chunks_total", len(batch))
+                    # Descartar chunks repetidos no PDF ou já presentes no armazenamento
+                    unique = []
+                    for chunk in batch:
+                        chunk["id"] = chunk_id(chunk["content"])
+                        page_chunk_ids.setdefault(chunk["page_start"], []).append(chunk["id"])
+                        if chunk["id"] not in seen_ids:
+                            seen_ids.add(chunk["id"])
+                            unique.append(chunk)
+                    stored = store.existing_ids([chunk["id"] for chunk in unique])
+                    new_chunks = [chunk for chunk in unique if chunk["id"] not in stored]
+                    job.increment("chunks_duplicate", len(batch) - len(new_chunks))
+                    batch = new_chunks
+                    if not batch:
+                        continue
+                    embeddings = model.encode([chunk["content"] for chunk in batch], show_progress_bar=False)
+                    job.increment("chunks_embedded", len(batch))
+                    # Inserir no armazenamento vetorial com as colunas 'content', 'embedding', e UUID para 'id'
+                    writer.add([
+                        {
+                            "id": chunk["id"],  # UUID v5 do hash do conteúdo (e.g., "550e8400-e29b-51d4-a716-446655440000")
+                            "content": chunk["content"],  # Corrigido de "text" para "content"
+                            "embedding": embedding,  # Corrigido de "vectors" para "embedding"
+                            "page_start": chunk["page_start"],
+                            "page_end": chunk["page_end"]
+                        }
+                        for chunk, embedding in zip(batch, embeddings.astype("float32"))
+                    ])
+
+            # Registrar a nova versão e apagar os chunks que só existiam na anterior
+            version_pages = [
+                (number, fingerprint, reused if reused is not None else page_chunk_ids.get(number, []))
+                for number, fingerprint, reused in page_records
+            ]
+            # Todo documento registra os chunks que usa (inclusive os que já estavam gravados
+            # por outro upload), então um chunk compartilhado nunca é órfão.
+            # Apagar os órfãos antes de gravar a versão: se a remoção falhar, o
+            # registro ainda aponta para a versão antiga e um novo envio os encontra de novo
+            orphans = document_registry.orphans(version_key, version_pages)
+            if orphans:
+                try:
+                    job.update(chunks_deleted=store.delete(orphans))
+                except NotImplementedError:
+                    logger.warning(f"Backend {store.name} não remove linhas; {len(orphans)} chunks antigos mantidos")
+            document_registry.replace_version(version_key, version_pages, doc_hash)
+        finally:
+            # O corpus mudou (mesmo que só parte dos lotes tenha sido gravada)
+            query_cache.invalidate()
+        stats = writer.stats
+        if stats["rows"]:
+            # Sem isso, os vetores novos só entrariam no índice salvo na próxima abertura (reconstrução)
+            store.persist_index()
+        pages_failed = job.progress.get("pages_failed", 0)
+        if pages_failed:
+            # Documento incompleto: sem registro, um novo envio do mesmo arquivo não é
+            # tratado como duplicado e as páginas que falharam voltam ao OCR
+            logger.warning(f"{filename}: OCR falhou em {pages_failed} páginas; documento não registrado como ingerido")
+        else:
+            document_registry.add(doc_hash, filename, sum(len(ids) for _, _, ids in version_pages))
+        elapsed = time.perf_counter() - start
+        pages_per_s = len(pdf_reader.pages) / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"{filename}: {stats['rows']} chunks gravados em {stats['batches']} lotes em {elapsed:.1f}s "
+            f"({pages_per_s:.1f} páginas/s, {stats['rows_per_s']:.1f} linhas/s); "
+            f"RSS do processo durante o job: pico {rss.stop().peak_mb:.0f} MB (no início: {rss.start_mb:.0f} MB)"
+        )
         
-        return {"message": f"PDF {file.filename} processado com sucesso"}
+        return {
+            "message": f"PDF {filename} processado com sucesso",
+            "rows": stats["rows"],
+            "duplicate_chunks": job.progress.get("chunks_duplicate", 0),
+            "pages_reused": job.progress.get("pages_reused", 0),
+            "pages_recomputed": job.progress.get("pages_recomputed", 0),
+            "chunks_reused": job.progress.get("chunks_reused", 0),
+            "chunks_recomputed": job.progress.get("chunks_embedded", 0),
+            "chunks_deleted": job.progress.get("chunks_deleted", 0),
+            "pages_low_text": job.progress.get("pages_low_text", 0),
+            "pages_ocr": job.progress.get("pages_ocr", 0),
+            "pages_failed": job.progress.get("pages_failed", 0),
+            "batches": stats["batches"],
+            "retries": stats["retries"],
+            "rows_per_s": round(stats["rows_per_s"], 1),
+            "pages_per_s": round(pages_per_s, 1),
+            "rss_start_mb": round(rss.start_mb, 1),
+            "rss_peak_mb": round(rss.peak_mb, 1)
+        }
+    finally:
+        rss.stop()
+        os.unlink(pdf_path)
+
+def ingest_file(path, document_id=None, ocr=True):
+    """Ingere um PDF do disco de forma síncrona, pelo mesmo pipeline do /upload_pdf (usado pela linha de comando).
+
+    O arquivo original não é tocado: a ingestão trabalha numa cópia temporária.
+    Como no /upload_pdf, só há substituição de versão com `document_id`.
+    """
+    filename = os.path.basename(path)
+    with open(path, "rb") as source, tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        doc_hash = copy_and_hash(source, tmp)
+    existing = document_registry.get(doc_hash)
+    if existing is not None:
+        os.unlink(tmp.name)
+        return {"message": f"PDF {filename} já foi processado", "duplicate": True, "doc_hash": doc_hash,
+                "original_filename": existing["filename"], "chunks": existing["chunks"]}
+    job = Job(f"ingest_file {filename}")
+    result = ingest_pdf(job, tmp.name, filename, doc_hash, document_id, ocr=ocr)
+    return dict(result, duplicate=False, doc_hash=doc_hash)
+
+@app.post("/upload_pdf")
+async def upload_pdf(file: UploadFile = File(...), document_id: Optional[str] = Form(None),
+                     ocr: bool = Form(False)):
+    # document_id identifica o documento entre edições: uma nova versão com o mesmo id só
+    # reprocessa as páginas que mudaram e substitui a anterior. Sem ele, o PDF é um documento novo.
+    # ocr=true extrai as páginas pelo pipeline de OCR do processar_pdfs.py (Gemini)
+    if ocr and not ocr_available():
+        # Recusar já no envio, em vez de deixar o job falhar depois do upload
+        raise HTTPException(status_code=400, detail="OCR indisponível neste servidor (requer pdf2image e poppler)")
+    try:
+        # Copiar o upload para um arquivo temporário; o processamento roda num job em segundo plano
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            doc_hash = await asyncio.to_thread(copy_and_hash, file.file, tmp)
+
+        # Arquivo idêntico já ingerido (ou sendo ingerido): responder sem gerar embeddings
+        existing = await asyncio.to_thread(document_registry.get, doc_hash)
+        running = document_registry.in_flight(doc_hash)
+        if existing is not None or running is not None:
+            os.unlink(tmp.name)
+            logger.info(f"PDF {file.filename} duplicado ({doc_hash[:12]}), ingestão ignorada")
+            response = {"message": f"PDF {file.filename} já foi processado", "duplicate": True, "doc_hash": doc_hash}
+            if existing is not None:
+                response.update(original_filename=existing["filename"], chunks=existing["chunks"])
+            else:
+                response.update(message=f"PDF {file.filename} já está em processamento", job_id=running.id)
+            return response
+
+        job = job_manager.submit(f"upload_pdf {file.filename}", ingest_pdf, tmp.name, file.filename, doc_hash, document_id,
+                                 ocr=ocr)
+        document_registry.track(doc_hash, job)
+        return {"message": f"PDF {file.filename} recebido, processamento em andamento", "job_id": job.id,
+                "duplicate": False, "doc_hash": doc_hash}
     except Exception as e:
         logger.error(f"Erro ao processar PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao processar PDF: {str(e)}")
-    
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado")
+    return job.to_dict()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return dict(query_cache.stats(), answers=answer_cache.stats())
+
+async def retrieve(user_query):
+    """Embedding da pergunta e top-k chunks, passando pelos caches."""
+    # Encode em lote numa thread dedicada; busca com cliente assíncrono
+    cache_key = normalize_query(user_query)
+    query_embedding = query_cache.get_embedding(cache_key)
+    if query_embedding is None:
+        query_embedding = await query_embedder.encode(user_query)
+        query_cache.set_embedding(cache_key, query_embedding)
+    results = query_cache.get_results(cache_key, 5)
+    if results is None:
+        generation = query_cache.generation
+        results = await get_vector_store().asearch(query_embedding, k=5)
+        query_cache.set_results(cache_key, 5, results, generation)
+    return query_embedding, results
+
+def build_prompt(user_query, results, instructions=""):
+    # Todos os backends devolvem o texto do chunk na chave 'content'
+    chunks = [row["content"] for row in results]
+    context = "\n\n".join(chunks)
+    prompt = f"Com base no seguinte contexto, responda à pergunta: {user_query}\n\nContexto:\n{context}"
+    return f"{instructions}\n\n{prompt}" if instructions else prompt
 
 @app.get("/query")
-async def query_rag(user_query: str):
+async def query_rag(user_query: str, bypass_cache: bool = False, instructions: str = ""):
+    # user_query é só a pergunta: é ela que vai para o embedding, a busca e os caches.
+    # instructions (e.g. o prompt de sistema do Streamlit) entra apenas no prompt do Gemini.
     try:
         logger.debug(f"Realizando consulta RAG: {user_query}")
-        query_embedding = embed_model.encode(user_query, show_progress_bar=False).tolist()
-        response = supabase.rpc("search_pdf_chunks", {
-            "query_vector": query_embedding,
-            "limit_val": 5  # Corrigido de "limit" para "limit_val"
-        }).execute()
+        query_embedding, results = await retrieve(user_query)
         
-        if not response.data:
+        if not results:
             return {"response": "Nenhum resultado encontrado para a consulta."}
         
-        # Ajuste para usar 'content' em vez de 'text', pois é o nome da coluna na tabela
-        chunks = [row["content"] for row in response.data]  # Corrigido de "text" para "content"
-        context = "\n\n".join(chunks)
-        prompt = f"Com base no seguinte contexto, responda à pergunta: {user_query}\n\nContexto:\n{context}"
-        response = gemini_model.generate_content(prompt)
-        return {"response": response.text}
+        prompt = build_prompt(user_query, results, instructions)
+        
+        # Pergunta equivalente com os mesmos chunks: reaproveitar a resposta (bypass_cache=true força nova geração)
+        # O cache é um SQLite: as chamadas rodam fora do event loop
+        if not bypass_cache:
+            cached_answer = await asyncio.to_thread(answer_cache.lookup, query_embedding, results, instructions)
+            if cached_answer is not None:
+                return {"response": cached_answer, "cached": True}
+        response = await get_gemini_model().generate_content_async(prompt)
+        await asyncio.to_thread(answer_cache.store, user_query, query_embedding, results, response.text, instructions)
+        return {"response": response.text, "cached": False}
     except Exception as e:
         logger.error(f"Erro na consulta RAG: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro na consulta: {str(e)}")
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/query_stream")
+async def query_rag_stream(user_query: str, bypass_cache: bool = False, instructions: str = ""):
+    """Mesma consulta do /query, mas via Server-Sent Events.
+
+    Eventos: 'metadata' (chunks recuperados, assim que a busca termina),
+    'token' (trechos da resposta conforme o Gemini gera), 'done' (tempo até o
+    primeiro token e tempo total) ou 'error'.
+    """
+    async def events():
+        start = time.perf_counter()
+        try:
+            logger.debug(f"Realizando consulta RAG (streaming): {user_query}")
+            query_embedding, results = await retrieve(user_query)
+            retrieval_ms = (time.perf_counter() - start) * 1000
+            yield sse_event("metadata", {
+                "chunks": [{"id": row.get("id"), "score": row.get("score")} for row in results],
+                "retrieval_ms": round(retrieval_ms, 1)
+            })
+            if not results:
+                yield sse_event("token", {"text": "Nenhum resultado encontrado para a consulta."})
+                yield sse_event("done", {"ttft_ms": round(retrieval_ms, 1), "total_ms": round(retrieval_ms, 1), "cached": False})
+                return
+
+            cached_answer = None
+            if not bypass_cache:
+                cached_answer = await asyncio.to_thread(answer_cache.lookup, query_embedding, results, instructions)
+            if cached_answer is not None:
+                ttft_ms = (time.perf_counter() - start) * 1000
+                yield sse_event("token", {"text": cached_answer})
+                yield sse_event("done", {"ttft_ms": round(ttft_ms, 1), "total_ms": round(ttft_ms, 1), "cached": True})
+                return
+
+            ttft_ms = None
+            parts = []
+            response = await get_gemini_model().generate_content_async(build_prompt(user_query, results, instructions),
+                                                                       stream=True)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunk sem partes de texto (e.g. só o motivo de término)
+                    continue
+                if not text:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+            total_ms = (time.perf_counter() - start) * 1000
+            await asyncio.to_thread(answer_cache.store, user_query, query_embedding, results, "".join(parts), instructions)
+            logger.info(f"Consulta em streaming: primeiro token em {ttft_ms or total_ms:.0f} ms, total {total_ms:.0f} ms")
+            yield sse_event("done", {"ttft_ms": round(ttft_ms or total_ms, 1), "total_ms": round(total_ms, 1), "cached": False})
+        except Exception as e:
+            logger.error(f"Erro na consulta RAG (streaming): {str(e)}")
+            yield sse_event("error", {"detail": f"Erro na consulta: {str(e)}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 if __name__ == "__main__":
     import uvicorn
     import sys
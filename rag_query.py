@@ -1,9 +1,7 @@
-from sentence_transformers import SentenceTransformer
-import kdbai_client as kdbai
-import google.generativeai as genai
 from dotenv import load_dotenv
 import os
 import logging
+from vector_store import KDBAIVectorStore
 
 # Configurar logging
 logging.basicConfig(level=logging.DEBUG)
@@ -15,24 +13,45 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 KDBAI_ENDPOINT = os.getenv("KDBAI_ENDPOINT")
 KDBAI_API_KEY = os.getenv("KDBAI_API_KEY")
 
-# Configurar Gemini
-genai.configure(api_key=GOOGLE_API_KEY)
-gemini_model = genai.GenerativeModel(model_name="gemini-2.0-flash")  # Modelo válido
+# Clientes e modelo são criados no primeiro uso, não na importação do módulo
+gemini_model = None
+vector_store = None
+embed_model = None
 
-# Configurar KDB.AI
-logger.debug("Conectando ao KDB.AI")
-kdbai_session = kdbai.Session(endpoint=KDBAI_ENDPOINT, api_key=KDBAI_API_KEY)
-kdbai_db = kdbai_session.database('default')
-kdbai_table = kdbai_db.table("pdf_chunks")
+def get_gemini_model():
+    global gemini_model
+    if gemini_model is None:
+        # Configurar Gemini
+        import google.generativeai as genai
+        genai.configure(api_key=GOOGLE_API_KEY)
+        gemini_model = genai.GenerativeModel(model_name="gemini-2.0-flash")  # Modelo válido
+    return gemini_model
 
-# Carregar modelo de embedding
-logger.debug("Carregando modelo de embedding")
-embed_model = SentenceTransformer("all-mpnet-base-v2")
+def get_vector_store():
+    global vector_store
+    if vector_store is None:
+        # Configurar KDB.AI
+        import kdbai_client as kdbai
+        logger.debug("Conectando ao KDB.AI")
+        kdbai_session = kdbai.Session(endpoint=KDBAI_ENDPOINT, api_key=KDBAI_API_KEY)
+        kdbai_db = kdbai_session.database('default')
+        kdbai_table = kdbai_db.table("pdf_chunks")
+        vector_store = KDBAIVectorStore(kdbai_table, vector_column="vectors", text_column="text")
+    return vector_store
+
+def get_embed_model():
+    global embed_model
+    if embed_model is None:
+        # Carregar modelo de embedding
+        from sentence_transformers import SentenceTransformer
+        logger.debug("Carregando modelo de embedding")
+        embed_model = SentenceTransformer("all-mpnet-base-v2")
+    return embed_model
 
 def perform_rag_query(user_query="What are the molecular mechanisms of DM1?"):
     try:
         logger.debug("Verificando índices na tabela pdf_chunks")
-        indexes = kdbai_table.indexes  # Atributo, não função
+        indexes = get_vector_store().table.indexes  # Atributo, não função
         
         # Log dos índices disponíveis (para depuração)
         logger.debug(f"Índices encontrados: {indexes}")
@@ -41,26 +60,23 @@ def perform_rag_query(user_query="What are the molecular mechanisms of DM1?"):
             logger.warning("Nenhum índice encontrado. A busca pode falhar.")
         
         # Gerar embedding da consulta do usuário
-        query_embedding = embed_model.encode(user_query, show_progress_bar=False)
+        query_embedding = get_embed_model().encode(user_query, show_progress_bar=False)
         
         # Realizar busca nos dados armazenados usando a coluna 'vectors'
-        search_result = kdbai_table.search(
-            vectors={"vectors": [query_embedding.tolist()]},  # Atualizado para 'vectors'
-            n=5  # Número de resultados a retornar
-        )
+        results = get_vector_store().search(query_embedding, k=5)  # Número de resultados a retornar
         
-        # Extrair os chunks relevantes (assumindo que a coluna de texto é 'text')
-        if not search_result or not search_result[0]:
+        # Extrair os chunks relevantes (a coluna 'text' é exposta como 'content')
+        if not results:
             return "Nenhum resultado encontrado para a consulta."
         
-        chunks = search_result[0]["text"]  # Ajuste o nome da coluna se necessário
+        chunks = [row["content"] for row in results]
         
         # Combinar os chunks em um contexto
         context = "\n\n".join(chunks)
         
         # Gerar resposta com Gemini
         prompt = f"Com base no seguinte contexto, responda à pergunta: {user_query}\n\nContexto:\n{context}"
-        response = gemini_model.generate_content(prompt)
+        response = get_gemini_model().generate_content(prompt)
         
         return response.text
     
@@ -0,0 +1,134 @@
+import time
+import random
+import logging
+import threading
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Erros transitórios da API do Gemini (google.api_core.exceptions) e códigos HTTP equivalentes
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "ServerError",
+}
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+# Erros que indicam cota/limite: além de reenviar, reduzem a concorrência
+THROTTLE_ERRORS = {"ResourceExhausted", "TooManyRequests"}
+
+
+def is_retryable(error):
+    code = getattr(error, "code", None)
+    return type(error).__name__ in RETRYABLE_ERRORS or (isinstance(code, int) and code in RETRYABLE_CODES)
+
+
+def is_throttle(error):
+    return type(error).__name__ in THROTTLE_ERRORS or getattr(error, "code", None) == 429
+
+
+class RetryError(Exception):
+    """A chamada falhou mesmo depois de todas as tentativas (ou com um erro não transitório)."""
+
+    def __init__(self, message, attempts, cause):
+        super().__init__(message)
+        self.attempts = attempts
+        self.cause = cause
+
+
+class TokenBucket:
+    """Orçamento de requisições por minuto: `rate_per_min` fichas, repostas continuamente."""
+
+    def __init__(self, rate_per_min, burst=None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = burst or max(1, rate_per_min // 6)  # até ~10s de rajada
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueia até haver uma ficha disponível e a consome."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """Limita as chamadas ao Gemini por orçamento/minuto e por concorrência adaptativa.
+
+    A concorrência segue AIMD: cada `limit` sucessos seguidos aumentam o
+    limite em 1 (até `max_concurrency`); um erro de cota (429) o reduz à
+    metade (até `min_concurrency`). Erros transitórios são reenviados com
+    backoff exponencial com jitter; os demais são relançados como RetryError.
+
+    Uso:
+        limiter = AdaptiveLimiter(requests_per_min=60, max_concurrency=8)
+        response = limiter.call(model.generate_content, payload)
+        limiter.stats  # calls, retries, throttled, failures, limit
+    """
+
+    def __init__(self, requests_per_min=60, max_concurrency=8, min_concurrency=1, initial_concurrency=None,
+                 max_retries=5, backoff=1.0, max_backoff=60.0):
+        self.bucket = TokenBucket(requests_per_min) if requests_per_min else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = initial_concurrency or max(min_concurrency, max_concurrency // 2)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0, "limit": self.limit}
+
+    def _enter(self):
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+
+    def _exit(self, error=None):
+        with self._cond:
+            self._active -= 1
+            if error is None:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            elif is_throttle(error):
+                self.limit = max(self.min_concurrency, self.limit // 2)
+                self._successes = 0
+                logger.warning(f"Cota do Gemini atingida; concorrência reduzida para {self.limit}")
+            self.stats["limit"] = self.limit
+            self._cond.notify_all()
+
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self._enter()
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                self._exit(e)
+                with self._cond:
+                    self.stats["throttled"] += int(is_throttle(e))
+                if not is_retryable(e) or attempt == self.max_retries:
+                    with self._cond:
+                        self.stats["failures"] += 1
+                    raise RetryError(f"Falha após {attempt + 1} tentativa(s): {str(e)}", attempt + 1, e) from e
+                delay = min(self.max_backoff, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                logger.warning(f"Erro transitório do Gemini ({type(e).__name__}), nova tentativa em {delay:.1f}s")
+                with self._cond:
+                    self.stats["retries"] += 1
+                time.sleep(delay)
+                continue
+            self._exit()
+            with self._cond:
+                self.stats["calls"] += 1
+            return result
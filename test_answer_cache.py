@@ -0,0 +1,67 @@
+import os
+import logging
+import tempfile
+import numpy as np
+from answer_cache import SemanticAnswerCache
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def test_semantic_answer_cache():
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=768).astype(np.float32)
+    similar = query + 0.01 * rng.normal(size=768).astype(np.float32)
+    unrelated = rng.normal(size=768).astype(np.float32)
+    results = [{"id": "a", "content": "chunk a"}, {"id": "b", "content": "chunk b"}]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "answers.sqlite3")
+        cache = SemanticAnswerCache(path, threshold=0.95)
+        cache.store("pergunta", query, results, "resposta")
+        # Mesmos chunks em outra ordem e pergunta quase idêntica: acerto
+        assert cache.lookup(similar, list(reversed(results))) == "resposta"
+        # Pergunta diferente ou chunks diferentes: erro
+        assert cache.lookup(unrelated, results) is None
+        assert cache.lookup(query, results[:1]) is None
+        cache.close()
+
+        # As respostas sobrevivem a um reinício
+        reopened = SemanticAnswerCache(path, threshold=0.95)
+        assert reopened.lookup(query, results) == "resposta"
+        logger.info(f"Estatísticas: {reopened.stats()}")
+        reopened.close()
+
+def test_semantic_answer_cache_eviction():
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Cada entrada ocupa ~3 KB (embedding) + texto: cabem só duas
+        cache = SemanticAnswerCache(os.path.join(tmp, "answers.sqlite3"), max_bytes=7000)
+        queries = [rng.normal(size=768).astype(np.float32) for _ in range(3)]
+        results = [{"id": "a", "content": "chunk a"}]
+        cache.store("q0", queries[0], results, "r0")
+        cache.store("q1", queries[1], results, "r1")
+        assert cache.lookup(queries[0], results) == "r0"  # q0 passa a ser a mais recente
+        cache.store("q2", queries[2], results, "r2")
+        assert cache.lookup(queries[1], results) is None  # q1 era a menos usada
+        assert cache.lookup(queries[0], results) == "r0"
+        assert cache.stats()["evictions"] == 1
+        cache.close()
+
+def test_answer_cache_separates_instructions():
+    rng = np.random.default_rng(2)
+    query = rng.normal(size=768).astype(np.float32)
+    results = [{"id": "a", "content": "chunk a"}]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SemanticAnswerCache(os.path.join(tmp, "answers.sqlite3"))
+        cache.store("pergunta", query, results, "resposta curta", instructions="Responda em uma frase.")
+        assert cache.lookup(query, results, instructions="Responda em uma frase.") == "resposta curta"
+        # Mesma pergunta e mesmos chunks, mas outras instruções (ou nenhuma): erro
+        assert cache.lookup(query, results, instructions="Responda em tópicos.") is None
+        assert cache.lookup(query, results) is None
+        cache.close()
+
+if __name__ == "__main__":
+    test_semantic_answer_cache()
+    test_semantic_answer_cache_eviction()
+    test_answer_cache_separates_instructions()
@@ -0,0 +1,54 @@
+import logging
+import threading
+from bulk_writer import BulkWriter, BulkWriteError
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class FlakyStore:
+    """Armazenamento falso que falha na primeira tentativa de alguns lotes."""
+
+    def __init__(self, fail_first=(), always_fail=()):
+        self.fail_first = set(fail_first)
+        self.always_fail = set(always_fail)
+        self.rows = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def add(self, batch):
+        first_id = batch[0]["id"]
+        with self.lock:
+            self.calls += 1
+            if first_id in self.always_fail:
+                raise RuntimeError("falha permanente")
+            if first_id in self.fail_first:
+                self.fail_first.discard(first_id)
+                raise RuntimeError("HTTP 503")
+            self.rows.extend(batch)
+
+def test_bulk_writer_batches_and_retries():
+    store = FlakyStore(fail_first={200})
+    rows = [{"id": i, "content": f"chunk {i}"} for i in range(450)]
+    stats = BulkWriter(store, batch_size=200, max_in_flight=2, backoff=0.01).write(rows)
+    logger.info(f"Estatísticas: {stats}")
+    assert stats["rows"] == 450
+    assert stats["batches"] == 3
+    assert stats["retries"] == 1
+    # Só o lote que falhou é reenviado
+    assert store.calls == 4
+    assert sorted(row["id"] for row in store.rows) == list(range(450))
+
+def test_bulk_writer_reports_failed_batches():
+    store = FlakyStore(always_fail={0})
+    rows = [{"id": i, "content": f"chunk {i}"} for i in range(300)]
+    try:
+        BulkWriter(store, batch_size=100, max_retries=1, backoff=0.01).write(rows)
+        raise AssertionError("BulkWriteError esperado")
+    except BulkWriteError as e:
+        assert e.stats["failed_batches"] == 1
+        assert e.stats["rows"] == 200
+
+if __name__ == "__main__":
+    test_bulk_writer_batches_and_retries()
+    test_bulk_writer_reports_failed_batches()
@@ -0,0 +1,52 @@
+import logging
+from chunking import chunk_pages, split_sentences
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def word_count(texts):
+    # Contador determinístico: um token por palavra
+    return [len(text.split()) for text in texts]
+
+def test_split_sentences():
+    text = "Primeira frase do\nparágrafo. Segunda frase!\n\nNovo parágrafo sem ponto"
+    assert split_sentences(text) == ["Primeira frase do parágrafo.", "Segunda frase!", "Novo parágrafo sem ponto"]
+
+def test_chunk_pages():
+    pages = [
+        " ".join(f"Frase {i} da página um com sete palavras." for i in range(6)),
+        " ".join(f"Frase {i} da página dois com sete palavras." for i in range(6)),
+    ]
+    chunks = chunk_pages(pages, max_tokens=20, overlap_tokens=8, count_tokens=word_count)
+    logger.info(f"Chunks: {chunks}")
+    for chunk in chunks:
+        assert len(chunk["content"].split()) <= 20
+        # Nenhuma frase é cortada no meio
+        assert chunk["content"].startswith("Frase") and chunk["content"].endswith(".")
+    assert chunks[0]["page_start"] == 1
+    assert chunks[-1]["page_end"] == 2
+    assert any(chunk["page_start"] == 1 and chunk["page_end"] == 2 for chunk in chunks)
+    # Sobreposição: a última frase de um chunk abre o seguinte
+    assert chunks[1]["content"].startswith(chunks[0]["content"].split(". ")[-1])
+
+def test_chunk_pages_long_sentence():
+    pages = [" ".join(["palavra"] * 50)]
+    chunks = chunk_pages(pages, max_tokens=16, overlap_tokens=0, count_tokens=word_count)
+    assert all(len(chunk["content"].split()) <= 16 for chunk in chunks)
+    assert sum(len(chunk["content"].split()) for chunk in chunks) == 50
+
+def test_chunk_pages_page_aligned():
+    pages = ["Frase curta um. Frase curta dois.", "Outra página."]
+    chunks = chunk_pages(pages, max_tokens=20, overlap_tokens=4, count_tokens=word_count, page_aligned=True)
+    assert [(chunk["page_start"], chunk["page_end"]) for chunk in chunks] == [(1, 1), (2, 2)]
+    # Mudar a página 1 não altera os chunks da página 2
+    changed = chunk_pages(["Texto novo."] + pages[1:], max_tokens=20, overlap_tokens=4,
+                          count_tokens=word_count, page_aligned=True)
+    assert changed[-1] == chunks[-1]
+
+if __name__ == "__main__":
+    test_split_sentences()
+    test_chunk_pages()
+    test_chunk_pages_long_sentence()
+    test_chunk_pages_page_aligned()
@@ -0,0 +1,196 @@
+import io
+import hashlib
+import logging
+import tempfile
+import numpy as np
+from dedup import DocumentRegistry, copy_and_hash, chunk_id, document_key, page_fingerprint, take_page_ids
+from vector_store import LocalVectorStore, SupabaseVectorStore
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def test_chunk_id_is_deterministic():
+    assert chunk_id("Mesmo  texto\ndo chunk.") == chunk_id("Mesmo texto do chunk.")
+    assert chunk_id("Mesmo texto do chunk.") != chunk_id("Outro texto.")
+
+def test_copy_and_hash():
+    data = b"%PDF-1.4 conteudo" * 1000
+    destination = io.BytesIO()
+    assert copy_and_hash(io.BytesIO(data), destination, block_size=1024) == hashlib.sha256(data).hexdigest()
+    assert destination.getvalue() == data
+
+def test_document_registry():
+    with tempfile.TemporaryDirectory() as path:
+        registry = DocumentRegistry(f"{path}/documents.sqlite3")
+        assert registry.get("abc") is None
+        registry.add("abc", "livro.pdf", 42)
+        registry.close()
+        # O registro sobrevive a reinícios
+        reopened = DocumentRegistry(f"{path}/documents.sqlite3")
+        assert reopened.get("abc")["chunks"] == 42
+        reopened.close()
+
+def test_local_store_skips_existing_ids():
+    rng = np.random.default_rng(0)
+    rows = [{"id": chunk_id(f"chunk {i}"), "content": f"chunk {i}", "embedding": rng.normal(size=768)} for i in range(10)]
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(path)
+        assert store.add(rows[:6]) == 6
+        # Linhas repetidas (de outro upload ou do próprio lote) são gravadas uma vez só
+        assert store.add(rows[4:] + rows[8:]) == 4
+        assert store.count() == 10
+        assert store.existing_ids([rows[0]["id"], "desconhecido"]) == {rows[0]["id"]}
+        logger.info(f"Vetores armazenados: {store.count()}")
+
+def test_document_versions():
+    with tempfile.TemporaryDirectory() as path:
+        registry = DocumentRegistry(f"{path}/documents.sqlite3")
+        assert registry.replace_version("diretriz", [(1, "p1", ["a", "b"]), (2, "p2", ["c"])]) == []
+        registry.replace_version("outro", [(1, "x1", ["c"])])
+        assert registry.page_chunks("diretriz") == {"p1": [["a", "b"]], "p2": [["c"]]}
+        # Nova edição: página 1 igual, página 2 trocada; "c" ainda é usado por outro documento
+        orphans = registry.replace_version("diretriz", [(1, "p1", ["a", "b"]), (2, "p2-v2", ["d"])])
+        assert orphans == []
+        # A prévia dos órfãos não grava nada: a versão só muda no replace_version
+        assert sorted(registry.orphans("diretriz", [(1, "p1-v3", ["e"])])) == ["a", "b", "d"]
+        assert registry.page_chunks("diretriz") == {"p1": [["a", "b"]], "p2-v2": [["d"]]}
+        orphans = registry.replace_version("diretriz", [(1, "p1-v3", ["e"])])
+        assert sorted(orphans) == ["a", "b", "d"]
+        registry.close()
+
+def test_unversioned_documents_protect_shared_chunks():
+    with tempfile.TemporaryDirectory() as path:
+        registry = DocumentRegistry(f"{path}/documents.sqlite3")
+        # B sem document_id: registrado pelo hash do arquivo, com o chunk "s"
+        b_key = document_key(None, "hash-b")
+        registry.replace_version(b_key, [(1, "pagina-s", ["s"])], "hash-b")
+        registry.add("hash-b", "b.pdf", 1)
+        # A1 repete a página de B (o chunk "s" já estava gravado) e tem uma própria
+        registry.replace_version("A", [(1, "pagina-s", ["s"]), (2, "pagina-x", ["x"])], "hash-a1")
+        # A2 não tem mais nenhuma das duas: só "x" fica órfão, "s" ainda é de B
+        assert registry.orphans("A", [(1, "pagina-y", ["y"])]) == ["x"]
+        assert registry.replace_version("A", [(1, "pagina-y", ["y"])], "hash-a2") == ["x"]
+        assert registry.get("hash-b") is not None
+        registry.close()
+
+def test_rollback_to_superseded_version():
+    with tempfile.TemporaryDirectory() as path:
+        registry = DocumentRegistry(f"{path}/documents.sqlite3")
+        registry.replace_version("A", [(1, "p1", ["a"]), (2, "p2", ["b"])], "hash-v1")
+        registry.add("hash-v1", "a.pdf", 2)
+        registry.replace_version("A", [(1, "p1", ["a"]), (2, "p3", ["c"])], "hash-v2")
+        registry.add("hash-v2", "a.pdf", 2)
+        # v1 foi substituída: reenviá-la não é mais duplicado; v2 é a versão ingerida
+        assert registry.get("hash-v1") is None
+        assert registry.get("hash-v2") is not None
+        # Voltar para v1 substitui v2 da mesma forma
+        assert registry.replace_version("A", [(1, "p1", ["a"]), (2, "p2", ["b"])], "hash-v1") == ["c"]
+        registry.add("hash-v1", "a.pdf", 2)
+        assert registry.get("hash-v2") is None
+        assert registry.get("hash-v1") is not None
+        # A mesma versão gravada de novo (e.g. depois de páginas que falharam) não se remove
+        registry.replace_version("A", [(1, "p1", ["a"]), (2, "p2", ["b"])], "hash-v1")
+        assert registry.get("hash-v1") is not None
+        registry.close()
+
+class FakeStream(dict):
+    """Imitação mínima de um stream do PyPDF2 (dados ainda codificados em `_data`)."""
+
+    def __init__(self, data, **entries):
+        super().__init__(entries)
+        self._data = data
+
+    def get_data(self):
+        return self._data
+
+class FakePage(dict):
+    def __init__(self, contents, resources):
+        super().__init__({"/Resources": resources, "/Parent": {"/Kids": []}})
+        self.contents = FakeStream(contents)
+
+    def get_contents(self):
+        return self.contents
+
+def scanned_page(image):
+    # Página escaneada: o content stream só desenha a imagem /Im0
+    return FakePage(b"q 612 0 0 792 0 0 cm /Im0 Do Q", {"/XObject": {"/Im0": FakeStream(image, **{"/Subtype": "/Image"})}})
+
+def test_page_fingerprint_includes_resources():
+    pages = [scanned_page(b"pixels da pagina %d" % i) for i in range(3)]
+    fingerprints = [page_fingerprint(page) for page in pages]
+    assert len(set(fingerprints)) == 3
+    assert page_fingerprint(scanned_page(b"pixels da pagina 1")) == fingerprints[1]
+    # Mesma imagem com fonte diferente também muda a impressão digital
+    with_font = scanned_page(b"pixels da pagina 1")
+    with_font["/Resources"]["/Font"] = {"/F1": FakeStream(b"fonte embutida")}
+    assert page_fingerprint(with_font) != fingerprints[1]
+
+def test_repeated_fingerprints_keep_every_page():
+    with tempfile.TemporaryDirectory() as path:
+        registry = DocumentRegistry(f"{path}/documents.sqlite3")
+        registry.replace_version("apostila", [(1, "branca", ["a"]), (2, "capa", ["b"]), (3, "branca", ["c"])])
+        previous = registry.page_chunks("apostila")
+        assert previous == {"branca": [["a"], ["c"]], "capa": [["b"]]}
+        assert take_page_ids(previous, "branca") == ["a"]
+        assert take_page_ids(previous, "branca") == ["c"]
+        assert take_page_ids(previous, "branca") == ["c"]  # excedentes reaproveitam a última
+        assert take_page_ids(previous, "nova") is None
+        registry.close()
+
+def test_local_store_delete():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(5, 768))
+    rows = [{"id": str(i), "content": f"chunk {i}", "embedding": vectors[i]} for i in range(5)]
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(path)
+        store.add(rows)
+        assert store.delete(["2", "desconhecido"]) == 1
+        assert store.count() == 4
+        assert store.search(vectors[2], k=5)[0]["id"] != "2"
+        assert len(store.search(vectors[2], k=5)) == 4
+        # Os tombstones sobrevivem à reabertura e o id pode ser gravado de novo
+        reopened = LocalVectorStore(path)
+        assert reopened.existing_ids(["2"]) == set()
+        assert reopened.add(rows[2:3]) == 1
+        assert reopened.search(vectors[2], k=1)[0]["id"] == "2"
+
+class FakeSupabaseTable:
+    """Imita o encadeamento table().delete().in_().execute() do cliente Supabase."""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def delete(self):
+        return self
+
+    def in_(self, column, values):
+        self.calls.append(list(values))
+        self.values = values
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": [{"id": value} for value in self.values]})()
+
+def test_supabase_delete_in_batches():
+    calls = []
+    client = type("Client", (), {"table": lambda self, name: FakeSupabaseTable(calls)})()
+    store = SupabaseVectorStore(client)
+    ids = [str(i) for i in range(450)]
+    assert store.delete(ids) == 450
+    assert [len(batch) for batch in calls] == [200, 200, 50]
+    assert [i for batch in calls for i in batch] == ids
+    assert store.delete([]) == 0
+
+if __name__ == "__main__":
+    test_chunk_id_is_deterministic()
+    test_copy_and_hash()
+    test_document_registry()
+    test_local_store_skips_existing_ids()
+    test_document_versions()
+    test_page_fingerprint_includes_resources()
+    test_repeated_fingerprints_keep_every_page()
+    test_local_store_delete()
+    test_supabase_delete_in_batches()
+    test_unversioned_documents_protect_shared_chunks()
+    test_rollback_to_superseded_version()
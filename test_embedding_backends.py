@@ -0,0 +1,27 @@
+import logging
+import numpy as np
+from embedding_backends import load_embedding_model
+from bench_embedding_backends import cosine_parity
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def test_cosine_parity():
+    reference = np.array([[1.0, 0.0], [0.0, 2.0]], dtype=np.float32)
+    candidate = np.array([[3.0, 0.0], [1.0, 1.0]], dtype=np.float32)
+    cosines = cosine_parity(reference, candidate)
+    logger.info(f"Cossenos: {cosines}")
+    assert np.allclose(cosines, [1.0, np.sqrt(0.5)])
+
+def test_unknown_backend():
+    try:
+        load_embedding_model("tensorflow")
+    except ValueError as e:
+        logger.info(f"Erro esperado: {e}")
+    else:
+        raise AssertionError("Backend desconhecido deveria falhar")
+
+if __name__ == "__main__":
+    test_cosine_parity()
+    test_unknown_backend()
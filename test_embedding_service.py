@@ -0,0 +1,44 @@
+import time
+import asyncio
+import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from embedding_service import BatchingEmbedder
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class EchoModel:
+    """Modelo falso: o embedding é o comprimento do texto repetido."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, show_progress_bar=False):
+        self.calls.append(len(texts))
+        time.sleep(0.02)
+        return np.array([[len(text)] * 4 for text in texts], dtype=np.float32)
+
+def test_batching_embedder():
+    model = EchoModel()
+    executor = ThreadPoolExecutor(max_workers=1)
+    embedder = BatchingEmbedder(model, executor, max_batch_size=8, max_wait_ms=50, max_in_flight=1)
+
+    async def run():
+        texts = ["x" * i for i in range(1, 21)]
+        return texts, await asyncio.gather(*[embedder.encode(text) for text in texts])
+
+    texts, embeddings = asyncio.run(run())
+    executor.shutdown()
+    logger.info(f"Tamanhos dos lotes: {model.calls}")
+    # Cada chamador recebe o próprio vetor
+    for text, embedding in zip(texts, embeddings):
+        assert embedding[0] == len(text)
+    # O primeiro pedido sai sozinho (executor ocioso); os demais são agrupados
+    assert model.calls[0] == 1
+    assert len(model.calls) < len(texts)
+    assert max(model.calls) <= 8
+
+if __name__ == "__main__":
+    test_batching_embedder()
@@ -0,0 +1,81 @@
+import time
+import logging
+import threading
+from jobs import Job, JobManager
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def wait_for(job, statuses, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.status not in statuses:
+        assert time.monotonic() < deadline, f"job ficou em {job.status}"
+        time.sleep(0.005)
+
+def test_job_lifecycle():
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def work(job, pages):
+        started.set()
+        release.wait(5)
+        for _ in range(pages):
+            job.increment("pages_parsed")
+        job.update(chunks=7)
+        return {"pages": pages}
+
+    try:
+        job = manager.submit("teste", work, 3)
+        # Com o único worker ocupado, o segundo job espera na fila
+        queued = manager.submit("na fila", lambda job: None)
+        assert started.wait(5)
+        assert job.status == "running" and job.started_at is not None
+        assert queued.status == "queued" and queued.to_dict()["elapsed_s"] == 0
+        release.set()
+        wait_for(job, ("done", "failed"))
+        assert job.status == "done"
+        state = job.to_dict()
+        assert state["job_id"] == job.id and state["description"] == "teste"
+        assert state["progress"] == {"pages_parsed": 3, "chunks": 7}
+        assert state["result"] == {"pages": 3} and state["error"] is None
+        assert manager.get(job.id) is job
+        assert manager.get("nao-existe") is None
+    finally:
+        release.set()
+        manager.shutdown()
+
+def test_job_failure():
+    manager = JobManager(max_workers=1)
+
+    def work(job):
+        job.increment("pages_parsed")
+        raise ValueError("PDF corrompido")
+
+    try:
+        job = manager.submit("falha", work)
+        wait_for(job, ("done", "failed"))
+        state = job.to_dict()
+        assert state["status"] == "failed" and state["error"] == "PDF corrompido"
+        assert state["progress"] == {"pages_parsed": 1} and state["result"] is None
+    finally:
+        manager.shutdown()
+
+def test_finished_jobs_are_evicted():
+    manager = JobManager(max_workers=1, max_finished=2)
+    try:
+        jobs = []
+        for i in range(4):
+            jobs.append(manager.submit(f"job {i}", lambda job: None))
+            wait_for(jobs[-1], ("done",))
+        # Ao enfileirar o quarto, só os dois concluídos mais recentes continuam guardados
+        assert manager.get(jobs[0].id) is None
+        assert [manager.get(job.id) is not None for job in jobs[1:]] == [True, True, True]
+    finally:
+        manager.shutdown()
+
+if __name__ == "__main__":
+    test_job_lifecycle()
+    test_job_failure()
+    test_finished_jobs_are_evicted()
@@ -0,0 +1,69 @@
+import logging
+import sqlite3
+import tempfile
+from ocr_cache import OCRCache, page_key
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class FakeImage:
+    """Imitação mínima de uma PIL.Image."""
+
+    def __init__(self, pixels, mode="RGB", size=(2, 2)):
+        self.pixels = pixels
+        self.mode = mode
+        self.size = size
+
+    def tobytes(self):
+        return self.pixels
+
+def test_page_key():
+    image = FakeImage(b"\x00" * 12)
+    key = page_key(image, "prompt", "gemini-2.0-flash")
+    assert key == page_key(FakeImage(b"\x00" * 12), "prompt", "gemini-2.0-flash")
+    assert key != page_key(FakeImage(b"\x01" * 12), "prompt", "gemini-2.0-flash")
+    assert key != page_key(image, "outro prompt", "gemini-2.0-flash")
+    assert key != page_key(image, "prompt", "gemini-1.5-pro")
+
+def test_ocr_cache_eviction_and_persistence():
+    with tempfile.TemporaryDirectory() as path:
+        cache = OCRCache(f"{path}/ocr.sqlite3", max_bytes=400)
+        cache.put("a" * 64, ["chunk " * 10])
+        cache.put("b" * 64, ["outro chunk " * 5])
+        assert cache.get("a" * 64) == ["chunk " * 10]
+        # "b" é a menos usada e sai quando o orçamento estoura
+        cache.put("c" * 64, ["terceiro " * 10])
+        assert cache.get("b" * 64) is None
+        stats = cache.stats()
+        logger.info(f"Estatísticas: {stats}")
+        assert stats["evictions"] == 1 and stats["bytes"] <= 400
+        cache.close()
+
+        reopened = OCRCache(f"{path}/ocr.sqlite3", max_bytes=400)
+        assert reopened.get("c" * 64) == ["terceiro " * 10]
+        assert reopened.stats()["bytes"] == stats["bytes"]
+        reopened.close()
+
+def test_ocr_cache_budget_is_shared_between_processes():
+    with tempfile.TemporaryDirectory() as path:
+        # Duas conexões ao mesmo arquivo, como os processos do modo em lote
+        first = OCRCache(f"{path}/ocr.sqlite3", max_bytes=600)
+        second = OCRCache(f"{path}/ocr.sqlite3", max_bytes=600)
+        db = sqlite3.connect(f"{path}/ocr.sqlite3")
+        for i in range(10):
+            cache = first if i % 2 == 0 else second
+            cache.put(f"{i:064d}", [f"página {i} " * 10])
+            # O orçamento vale para o arquivo todo, não para cada processo
+            assert db.execute("SELECT SUM(size) FROM pages").fetchone()[0] <= 600
+        assert first.stats()["bytes"] == second.stats()["bytes"] <= 600
+        db.close()
+        assert first.get(f"{9:064d}") == [f"página 9 " * 10]
+        assert first.get(f"{0:064d}") is None
+        first.close()
+        second.close()
+
+if __name__ == "__main__":
+    test_page_key()
+    test_ocr_cache_eviction_and_persistence()
+    test_ocr_cache_budget_is_shared_between_processes()
@@ -0,0 +1,56 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pdf_extract import iter_ranges
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def test_iter_ranges_keeps_page_order():
+    def extract(prefix, first, last):
+        time.sleep(random.uniform(0, 0.01))  # trechos terminam fora de ordem
+        return [(page, f"{prefix}{page}") for page in range(first, last + 1)]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pages = list(iter_ranges(executor, extract, 103, 10, 8, "p"))
+    assert [page for page, _ in pages] == list(range(1, 104))
+    assert pages[-1] == (103, "p103")
+
+def test_iter_ranges_bounded():
+    submitted = []
+    lock = threading.Lock()
+
+    def extract(first, last):
+        with lock:
+            submitted.append(first)
+        return list(range(first, last + 1))
+
+    consumed = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for page in iter_ranges(executor, extract, 100, 5, 3):
+            time.sleep(0.001)
+            # Nunca mais que max_pending trechos submetidos à frente do trecho em consumo
+            with lock:
+                assert len(submitted) * 5 - len(consumed) <= 4 * 5
+            consumed.append(page)
+    assert consumed == list(range(1, 101))
+
+def test_iter_ranges_propagates_errors():
+    def extract(first, last):
+        if first > 20:
+            raise ValueError("xref corrompido")
+        return list(range(first, last + 1))
+
+    consumed = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        try:
+            for page in iter_ranges(executor, extract, 50, 10, 2):
+                consumed.append(page)
+        except ValueError as e:
+            logger.info(f"Erro propagado: {e}")
+        else:
+            raise AssertionError("o erro do trecho deveria chegar ao consumidor")
+    assert consumed == list(range(1, 21))
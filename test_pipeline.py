@@ -0,0 +1,60 @@
+import time
+import logging
+from pipeline import prefetch, batched, current_rss_mb, RSSSampler
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def test_prefetch_bounded():
+    produced = []
+
+    def pages():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    consumed = []
+    for item in prefetch(pages(), maxsize=3):
+        time.sleep(0.005)
+        # O produtor nunca fica mais que a fila (+ o item em mãos) à frente
+        assert len(produced) - len(consumed) <= 5
+        consumed.append(item)
+    logger.info(f"Consumidos: {consumed}")
+    assert consumed == list(range(20))
+
+def test_prefetch_propagates_errors():
+    def broken():
+        yield 1
+        raise RuntimeError("página corrompida")
+
+    items = []
+    try:
+        for item in prefetch(broken()):
+            items.append(item)
+    except RuntimeError as e:
+        logger.info(f"Erro esperado: {e}")
+    else:
+        raise AssertionError("O erro do produtor deveria chegar ao consumidor")
+    assert items == [1]
+
+def test_batched():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+
+def test_rss_sampler_sees_current_memory():
+    rss = RSSSampler(interval=0.01).start()
+    block = b"x" * (64 * 1024 * 1024)  # 64 MB residentes enquanto o sampler roda
+    time.sleep(0.05)
+    during = current_rss_mb()
+    del block
+    rss.stop()
+    assert rss.peak_mb >= rss.start_mb + 48
+    assert rss.peak_mb >= during
+    # Memória devolvida ao sistema: o RSS atual cai, ao contrário do ru_maxrss
+    assert current_rss_mb() < during
+
+if __name__ == "__main__":
+    test_prefetch_bounded()
+    test_prefetch_propagates_errors()
+    test_batched()
+    test_rss_sampler_sees_current_memory()
@@ -0,0 +1,247 @@
+import os
+import time
+import base64
+import random
+import logging
+import tempfile
+import threading
+from io import BytesIO
+from unittest import mock
+from PIL import Image
+import processar_pdfs
+from processar_pdfs import (parse_batch_response, process_pdf_pages, iter_pdf_chunks, _split_by_payload,
+                            _page_runs, is_colorless, prepare_image, encode_image, CHUNKING_PROMPT)
+from rate_limiter import AdaptiveLimiter
+from ocr_cache import OCRCache
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class FakeImage:
+    """Imitação mínima de uma página renderizada pelo pdf2image (o "PNG" é o número da página)."""
+
+    mode = "RGB"
+    size = (10, 10)
+
+    def __init__(self, page_num):
+        self.page_num = page_num
+
+    def tobytes(self):
+        return f"pixels {self.page_num}".encode("utf-8")
+
+    def save(self, buffer, format=None, **options):
+        buffer.write(f"page {self.page_num}".encode("utf-8"))
+
+def page_of(data):
+    return int(base64.b64decode(data).decode("utf-8").split()[1])
+
+class FakeGemini:
+    """Modelo falso: responde cada página com um chunk; páginas em `drop` somem das respostas em lote
+    e páginas em `fail` falham sempre."""
+
+    model_name = "fake-gemini"
+
+    def __init__(self, drop=(), fail=(), delay=0.0):
+        self.drop = set(drop)
+        self.fail = set(fail)
+        self.delay = delay
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def generate_content(self, payload):
+        pages = [page_of(part["inline_data"]["data"]) for part in payload if "inline_data" in part]
+        with self.lock:
+            self.requests.append(pages)
+        time.sleep(random.uniform(0, self.delay))  # respostas terminam fora de ordem
+        if len(pages) == 1:
+            assert payload[-1]["text"] == CHUNKING_PROMPT
+            if pages[0] in self.fail:
+                raise ValueError(f"imagem inválida na página {pages[0]}")
+            text = f"<chunk>ocr {pages[0]}</chunk>"
+        else:
+            text = "".join(f'<page number="{page}"><chunk>ocr {page}</chunk></page>'
+                           for page in pages if page not in self.drop and page not in self.fail)
+        return type("Response", (), {"text": text})()
+
+def gray_page(size=(400, 200)):
+    """Página "escaneada" sem cor, guardada em RGB como o pdf2image entrega."""
+    image = Image.new("RGB", size, (250, 250, 250))
+    image.paste((20, 20, 20), (40, 40, 360, 60))
+    return image
+
+def colored_page(size=(400, 200)):
+    image = gray_page(size)
+    image.paste((200, 30, 30), (40, 100, 200, 160))  # um gráfico em vermelho
+    return image
+
+def test_is_colorless():
+    assert is_colorless(gray_page())
+    assert not is_colorless(colored_page())
+    assert is_colorless(gray_page().convert("L"))
+
+def test_prepare_image():
+    # Reduz pelo maior lado, mantendo a proporção; páginas menores ficam como estão
+    image = prepare_image(gray_page((400, 200)), max_edge=100, grayscale="off")
+    assert image.size == (100, 50) and image.mode == "RGB"
+    assert prepare_image(gray_page((400, 200)), max_edge=1000, grayscale="off").size == (400, 200)
+    assert prepare_image(gray_page((400, 200)), max_edge=0, grayscale="off").size == (400, 200)
+
+    assert prepare_image(colored_page(), max_edge=0, grayscale="on").mode == "L"
+    # auto: só a página sem cor vai para tons de cinza
+    assert prepare_image(gray_page(), max_edge=0, grayscale="auto").mode == "L"
+    assert prepare_image(colored_page(), max_edge=0, grayscale="auto").mode == "RGB"
+
+def test_encode_image():
+    page = colored_page()
+    for image_format, mime_type, pil_format in [("png", "image/png", "PNG"), ("jpeg", "image/jpeg", "JPEG"),
+                                                ("webp", "image/webp", "WEBP")]:
+        data, mime = encode_image(page, image_format=image_format, quality=80)
+        assert mime == mime_type
+        decoded = Image.open(BytesIO(base64.b64decode(data)))
+        assert decoded.format == pil_format and decoded.size == page.size
+
+    # O buffer da thread é reaproveitado e não deixa restos de uma página maior
+    buffer = processar_pdfs._encode_buffers.buffer
+    large, _ = encode_image(colored_page((800, 600)), image_format="png")
+    small, _ = encode_image(gray_page((40, 20)), image_format="png")
+    assert processar_pdfs._encode_buffers.buffer is buffer
+    assert len(small) < len(large)
+    assert Image.open(BytesIO(base64.b64decode(small))).size == (40, 20)
+
+def test_parse_batch_response():
+    text = ('<page number="1"><chunk>a</chunk><chunk> b </chunk></page>\n'
+            '<page number="2">  </page>'
+            '<page number="3">sem tags\n\noutro parágrafo</page>'
+            '<page number="9"><chunk>fora do lote</chunk></page>')
+    # A página 2 veio vazia e a 9 não foi pedida: ficam de fora para serem refeitas
+    assert parse_batch_response(text, {1, 2, 3}) == {1: ["a", "b"], 3: ["sem tags", "outro parágrafo"]}
+    assert parse_batch_response("resposta sem páginas", {1, 2}) == {}
+
+def test_split_by_payload():
+    encoded = [(1, "x" * 40, "image/png"), (2, "x" * 50, "image/png"), (3, "x" * 200, "image/png"),
+               (4, "x" * 10, "image/png")]
+    groups = _split_by_payload(encoded, 100)
+    assert [[page for page, _, _ in group] for group in groups] == [[1, 2], [3], [4]]  # uma página grande vai sozinha
+    assert _split_by_payload([], 100) == []
+
+def test_page_runs():
+    assert _page_runs([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5, 5]]
+    assert _page_runs([2, 3, 7, 8, 9, 12], 4) == [[2, 3], [7, 9], [12, 12]]
+    assert _page_runs([], 4) == []
+
+def test_process_pdf_pages_retries_missing_pages():
+    limiter = AdaptiveLimiter(requests_per_min=0, max_retries=0)
+    model = FakeGemini(drop={2}, fail={3})
+    pages = [(page, FakeImage(page)) for page in range(1, 5)]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = OCRCache(os.path.join(tmp, "ocr.sqlite3"))
+        chunks, failed_pages = process_pdf_pages("doc.pdf", pages, model, limiter, cache)
+        # Um lote com as 4 páginas; 2 e 3 não voltaram e foram refeitas sozinhas
+        assert model.requests == [[1, 2, 3, 4], [2], [3]]
+        assert [chunk["text"] for chunk in chunks] == ["ocr 1", "ocr 2", "ocr 4"]
+        assert [chunk["page"] for chunk in chunks] == [1, 2, 4]
+        assert failed_pages == [3]
+
+        # Páginas que deram certo saem do cache; só a que falhou volta ao Gemini
+        model.requests.clear()
+        chunks, failed_pages = process_pdf_pages("doc.pdf", pages, model, limiter, cache)
+        assert model.requests == [[3]]
+        assert [chunk["page"] for chunk in chunks] == [1, 2, 4]
+        assert failed_pages == [3]
+        cache.close()
+
+class FakePage:
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        return self.text
+
+def test_iter_pdf_chunks_keeps_page_order():
+    # Páginas pares têm camada de texto boa; as ímpares são escaneadas e vão ao OCR
+    page_count = 12
+    texts = [f"Texto legível da página {page}. " * 30 if page % 2 == 0 else "" for page in range(1, page_count + 1)]
+    rendered = []
+
+    def convert_from_path(pdf_path, dpi, first_page, last_page):
+        rendered.extend(range(first_page, last_page + 1))
+        return [FakeImage(page) for page in range(first_page, last_page + 1)]
+
+    model = FakeGemini(fail={7}, delay=0.02)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = OCRCache(os.path.join(tmp, "ocr.sqlite3"))
+        with mock.patch.object(processar_pdfs, "pdfinfo_from_path", lambda path: {"Pages": page_count}), \
+                mock.patch.object(processar_pdfs, "PdfReader",
+                                  lambda path: type("Reader", (), {"pages": [FakePage(t) for t in texts]})()), \
+                mock.patch.object(processar_pdfs, "convert_from_path", convert_from_path), \
+                mock.patch.object(processar_pdfs, "gemini_limiter", AdaptiveLimiter(requests_per_min=0, max_retries=0)), \
+                mock.patch.object(processar_pdfs, "ocr_cache", cache):
+            failed_pages = []
+            chunks = list(iter_pdf_chunks("doc.pdf", model, max_workers=4, lookahead=4, pages_per_request=1,
+                                          failed_pages=failed_pages))
+            pages = [chunk["page"] for chunk in chunks]
+            assert pages == sorted(pages)  # OCR fora de ordem, chunks na ordem das páginas
+            assert sorted(set(pages)) == [page for page in range(1, page_count + 1) if page != 7]
+            assert {chunk["source"] for chunk in chunks if chunk["page"] % 2 == 0} == {"text"}
+            assert {chunk["source"] for chunk in chunks if chunk["page"] % 2 == 1} == {"ocr"}
+            assert failed_pages == [7]
+            assert sorted(rendered) == [1, 3, 5, 7, 9, 11]  # páginas de texto não são renderizadas
+
+            # Com page_numbers, só as páginas pedidas
+            rendered.clear()
+            chunks = list(iter_pdf_chunks("doc.pdf", model, max_workers=2, page_numbers=[4, 5, 9]))
+            assert sorted({chunk["page"] for chunk in chunks}) == [4, 5, 9]
+            assert sorted(rendered) == [5, 9]
+        cache.close()
+
+def test_iter_pdf_chunks_bounds_pages_in_flight():
+    page_count, lookahead, render_batch = 40, 6, 3
+    lock = threading.Lock()
+    rendered = set()
+    started = set()
+    delivered = set()
+    peaks = {"ocr": 0, "rendered": 0}
+
+    def convert_from_path(pdf_path, dpi, first_page, last_page):
+        with lock:
+            rendered.update(range(first_page, last_page + 1))
+            peaks["rendered"] = max(peaks["rendered"], len(rendered - delivered))
+        return [FakeImage(page) for page in range(first_page, last_page + 1)]
+
+    def fake_process_pdf_pages(pdf_path, pages, gemini_model, limiter=None, cache=None):
+        # OCR falso: conta as páginas que começaram o OCR e ainda não chegaram a quem consome
+        with lock:
+            started.update(page for page, _ in pages)
+            peaks["ocr"] = max(peaks["ocr"], len(started - delivered))
+        time.sleep(random.uniform(0, 0.01))
+        return [{"page": page, "text": f"ocr {page}", "source": "ocr"} for page, _ in pages], []
+
+    with mock.patch.object(processar_pdfs, "pdfinfo_from_path", lambda path: {"Pages": page_count}), \
+            mock.patch.object(processar_pdfs, "convert_from_path", convert_from_path), \
+            mock.patch.object(processar_pdfs, "process_pdf_pages", fake_process_pdf_pages), \
+            mock.patch.object(processar_pdfs, "OCR_RENDER_BATCH", render_batch):
+        pages = []
+        for chunk in iter_pdf_chunks("doc.pdf", None, max_workers=3, lookahead=lookahead, pages_per_request=2,
+                                     text_layer=False):
+            with lock:
+                delivered.add(chunk["page"])
+            pages.append(chunk["page"])
+            time.sleep(0.001)  # quem consome é mais lento que o OCR
+
+    assert pages == list(range(1, page_count + 1))
+    # Nunca mais que `lookahead` páginas no OCR sem terem sido entregues, e o
+    # pdftoppm adianta no máximo um lote de renderização além disso
+    assert 1 < peaks["ocr"] <= lookahead
+    assert peaks["rendered"] <= lookahead + render_batch
+
+if __name__ == "__main__":
+    test_is_colorless()
+    test_prepare_image()
+    test_encode_image()
+    test_parse_batch_response()
+    test_split_by_payload()
+    test_page_runs()
+    test_process_pdf_pages_retries_missing_pages()
+    test_iter_pdf_chunks_keeps_page_order()
+    test_iter_pdf_chunks_bounds_pages_in_flight()
@@ -0,0 +1,42 @@
+import time
+import logging
+from query_cache import TTLCache, QueryCache, normalize_query
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def test_ttl_cache_eviction():
+    cache = TTLCache(max_entries=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" passa a ser o mais recente
+    cache.set("c", 3)
+    assert cache.get("b") is None  # "b" era o menos usado
+    time.sleep(0.06)
+    assert cache.get("a") is None  # expirado
+    stats = cache.stats()
+    logger.info(f"Estatísticas: {stats}")
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["evictions"] == 1
+
+def test_query_cache_invalidation():
+    cache = QueryCache()
+    key = normalize_query("  Quais   MEDICAMENTOS tratam canalopatias? ")
+    assert key == normalize_query("quais medicamentos tratam canalopatias?")
+    cache.set_embedding(key, [0.1, 0.2])
+    generation = cache.generation
+    cache.set_results(key, 5, [{"id": "1", "content": "chunk", "score": 0.9}], generation)
+    assert cache.get_results(key, 5) == [{"id": "1", "content": "chunk", "score": 0.9}]
+
+    # Upload concluído: resultados descartados, embedding mantido
+    cache.invalidate()
+    assert cache.get_results(key, 5) is None
+    assert cache.get_embedding(key) == [0.1, 0.2]
+
+    # Busca iniciada antes da invalidação não grava resultado velho
+    cache.set_results(key, 5, [{"id": "1", "content": "chunk"}], generation)
+    assert cache.get_results(key, 5) is None
+
+if __name__ == "__main__":
+    test_ttl_cache_eviction()
+    test_query_cache_invalidation()
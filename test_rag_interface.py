@@ -0,0 +1,439 @@
+import os
+import sys
+import time
+import types
+import asyncio
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from unittest import mock
+import httpx
+import numpy as np
+import rag_interface
+from jobs import Job, JobManager
+from dedup import DocumentRegistry, chunk_id
+from pdf_extract import PageExtractor
+from vector_store import LocalVectorStore
+from query_cache import QueryCache
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def fake_iter_pdf_chunks(pdf_path, gemini_model, page_numbers=None, failed_pages=None):
+    """Imita o iter_pdf_chunks do processar_pdfs.py: chunks na ordem das páginas, falhas em `failed_pages`."""
+    assert page_numbers == [2, 3, 4, 5]  # a página 1 é reaproveitada e não vai ao OCR
+    yield {"page": 2, "text": "texto 2a", "source": "text"}
+    yield {"page": 2, "text": "texto 2b", "source": "text"}
+    yield {"page": 3, "text": "ocr 3", "source": "ocr"}
+    failed_pages.append(4)  # o OCR da página 4 falhou: nenhum chunk
+    yield {"page": 5, "text": "texto 5", "source": "text"}
+
+def test_iter_ocr_pages():
+    fake_processar_pdfs = types.ModuleType("processar_pdfs")
+    fake_processar_pdfs.iter_pdf_chunks = fake_iter_pdf_chunks
+    fake_reader = types.SimpleNamespace(pages=["f1", "f2", "f3", "f4", "f5"])
+    job = Job("teste")
+    page_records = []
+    with mock.patch.dict(sys.modules, {"processar_pdfs": fake_processar_pdfs}), \
+            mock.patch.object(rag_interface, "PdfReader", lambda path: fake_reader), \
+            mock.patch.object(rag_interface, "page_fingerprint", lambda page: page), \
+            mock.patch.object(rag_interface, "get_gemini_model", lambda: None):
+        previous_pages = {"f1": [["a", "b"]]}
+        texts = list(rag_interface.iter_ocr_pages("doc.pdf", job, previous_pages, page_records))
+
+    assert texts == ["", "texto 2a\n\ntexto 2b", "ocr 3", "", "texto 5"]
+    assert page_records == [
+        (1, "f1", ["a", "b"]),
+        (2, "f2", None),
+        (3, "f3", None),
+        (4, "ocr-failed:f4", None),  # não coincide com a página real: é refeita na próxima versão
+        (5, "f5", None),
+    ]
+    assert job.progress == {
+        "pages_reused": 1, "chunks_reused": 2, "pages_recomputed": 4,
+        "pages_ocr": 1, "pages_failed": 1, "pages_parsed": 5,
+    }
+
+class FakeExtractor:
+    """PageExtractor falso: a impressão digital de cada página é o próprio texto."""
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    def pages(self, pdf_path, page_count, skip_fingerprints=frozenset(), pdf_reader=None):
+        return ((number, f"fp{number}", text) for number, text in enumerate(self.texts, 1))
+
+GOOD = "Texto legível de uma página com camada de texto boa. " * 5
+
+def test_iter_pdf_pages_ocr_fallback():
+    texts = ["", GOOD, "", "", GOOD, ""]  # as páginas vazias vão ao OCR; a 4 falha
+    requests = []
+
+    def fake_ocr_pages(pdf_path, page_numbers):
+        requests.append(list(page_numbers))
+        failed = [number for number in page_numbers if number == 4]
+        return {number: f"ocr {number}" for number in page_numbers if number not in failed}, failed
+
+    fake_reader = types.SimpleNamespace(pages=texts)
+    job = Job("teste")
+    page_records = []
+    with mock.patch.object(rag_interface, "UPLOAD_OCR_FALLBACK", True), \
+            mock.patch.object(rag_interface, "page_extractor", FakeExtractor(texts)), \
+            mock.patch.object(rag_interface, "ocr_pages", fake_ocr_pages), \
+            mock.patch("processar_pdfs.OCR_PAGES_PER_REQUEST", 2), \
+            mock.patch("processar_pdfs.OCR_WORKERS", 2), \
+            mock.patch("processar_pdfs.OCR_LOOKAHEAD", 2):
+        pages = list(rag_interface.iter_pdf_pages(fake_reader, job, {}, page_records, "doc.pdf"))
+
+    assert pages == ["ocr 1", GOOD, "ocr 3", "", GOOD, "ocr 6"]  # a 4 mantém o texto do PyPDF2
+    assert sorted(number for group in requests for number in group) == [1, 3, 4, 6]
+    assert all(len(group) <= 2 for group in requests)  # em lotes, não página a página
+    assert page_records == [
+        (1, "fp1", None), (2, "fp2", None), (3, "fp3", None),
+        (4, "ocr-failed:fp4", None), (5, "fp5", None), (6, "fp6", None),
+    ]
+    assert job.progress == {
+        "pages_recomputed": 6, "pages_low_text": 4, "pages_ocr": 3, "pages_failed": 1, "pages_parsed": 6,
+    }
+
+def write_pdf(path, page_texts):
+    """PDF mínimo com uma linha de texto (Helvetica) por página."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+class FakeEmbedder:
+    """Modelo de embedding falso: vetor determinístico por texto, uma "palavra" por token."""
+
+    @staticmethod
+    def tokenizer(texts, add_special_tokens=False):
+        return {"input_ids": [text.split() for text in texts]}
+
+    def encode(self, texts, show_progress_bar=False):
+        seeds = [int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) for text in texts]
+        return np.stack([np.random.default_rng(seed).normal(size=768) for seed in seeds]).astype(np.float32)
+
+def ingestion_env(tmp):
+    """Armazenamento, registro e modelo isolados num diretório temporário."""
+    store = LocalVectorStore(os.path.join(tmp, "store"))
+    registry = DocumentRegistry(os.path.join(tmp, "documents.sqlite3"))
+    patches = [
+        mock.patch.object(rag_interface, "get_embed_model", lambda: FakeEmbedder()),
+        mock.patch.object(rag_interface, "get_vector_store", lambda: store),
+        mock.patch.object(rag_interface, "document_registry", registry),
+        mock.patch.object(rag_interface, "page_extractor", PageExtractor(workers=1)),
+    ]
+    for patch in patches:
+        patch.start()
+    return store, registry, patches
+
+def ingest(tmp, name, pages, document_id=None):
+    path = os.path.join(tmp, name)
+    write_pdf(path, pages)
+    return rag_interface.ingest_file(path, document_id=document_id, ocr=False)
+
+SHARED = "Pagina compartilhada entre os documentos."
+
+def test_new_version_keeps_chunks_of_unversioned_documents():
+    with tempfile.TemporaryDirectory() as tmp:
+        store, registry, patches = ingestion_env(tmp)
+        try:
+            # B sem document_id; depois A1 (document_id=A) repete a página de B; depois A2
+            b = ingest(tmp, "b.pdf", [SHARED])
+            ingest(tmp, "a1.pdf", [SHARED, "Pagina so da primeira versao de A."], document_id="A")
+            a2 = ingest(tmp, "a2.pdf", ["Pagina nova da segunda versao de A."], document_id="A")
+            # Só o chunk exclusivo de A1 sai; o de B continua gravado e B continua ingerido
+            assert a2["chunks_deleted"] == 1
+            assert store.existing_ids([chunk_id(SHARED)]) == {chunk_id(SHARED)}
+            assert store.existing_ids([chunk_id("Pagina so da primeira versao de A.")]) == set()
+            assert registry.get(b["doc_hash"]) is not None
+        finally:
+            for patch in patches:
+                patch.stop()
+            registry.close()
+
+def test_rollback_to_previous_version():
+    v1 = [SHARED, "Pagina dois da versao um."]
+    with tempfile.TemporaryDirectory() as tmp:
+        store, registry, patches = ingestion_env(tmp)
+        try:
+            ingest(tmp, "v1.pdf", v1, document_id="A")
+            v2 = ingest(tmp, "v2.pdf", [SHARED, "Pagina dois da versao dois."], document_id="A")
+            assert v2["chunks_deleted"] == 1
+            # Voltar para v1: não é duplicado, a página 1 é reaproveitada e a 2 volta ao armazenamento
+            rollback = ingest(tmp, "v1-de-novo.pdf", v1, document_id="A")
+            assert rollback["duplicate"] is False
+            assert rollback["pages_reused"] == 1 and rollback["pages_recomputed"] == 1
+            assert rollback["chunks_deleted"] == 1
+            assert store.existing_ids([chunk_id(v1[1])]) == {chunk_id(v1[1])}
+            # Agora v1 é a versão ingerida: o mesmo arquivo de novo é duplicado
+            assert ingest(tmp, "v1-outra-vez.pdf", v1, document_id="A")["duplicate"] is True
+        finally:
+            for patch in patches:
+                patch.stop()
+            registry.close()
+
+def test_failed_ocr_fallback_is_not_registered():
+    with tempfile.TemporaryDirectory() as tmp:
+        store, registry, patches = ingestion_env(tmp)
+        failing_ocr = mock.patch.object(rag_interface, "ocr_pages",
+                                        lambda pdf_path, page_numbers: ({}, list(page_numbers)))
+        fallback = mock.patch.object(rag_interface, "UPLOAD_OCR_FALLBACK", True)
+        failing_ocr.start()
+        fallback.start()
+        try:
+            # Páginas curtas demais para a camada de texto: vão ao OCR, que falha
+            result = ingest(tmp, "curto.pdf", ["Oi.", "Ok."])
+            assert result["pages_failed"] == 2
+            assert registry.get(result["doc_hash"]) is None
+        finally:
+            fallback.stop()
+            failing_ocr.stop()
+            for patch in patches:
+                patch.stop()
+            registry.close()
+
+def api_request(method, path, **kwargs):
+    """Chama a API em memória, como o bench_query_concurrency.py."""
+    async def call():
+        transport = httpx.ASGITransport(app=rag_interface.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://teste") as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(call())
+
+def test_upload_returns_job_id():
+    def fake_ingest_pdf(job, pdf_path, filename, doc_hash, doc_key, ocr=False):
+        job.update(pages_parsed=1)
+        os.unlink(pdf_path)
+        return {"filename": filename, "document_id": doc_key}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = JobManager(max_workers=1)
+        registry = DocumentRegistry(os.path.join(tmp, "documents.sqlite3"))
+        with mock.patch.object(rag_interface, "job_manager", manager), \
+                mock.patch.object(rag_interface, "document_registry", registry), \
+                mock.patch.object(rag_interface, "ingest_pdf", fake_ingest_pdf):
+            response = api_request("POST", "/upload_pdf", files={"file": ("a.pdf", b"%PDF-1.4 teste")},
+                                   data={"document_id": "A"})
+            assert response.status_code == 200
+            body = response.json()
+            assert body["duplicate"] is False and body["job_id"]
+            assert body["doc_hash"] == hashlib.sha256(b"%PDF-1.4 teste").hexdigest()
+
+            deadline = time.monotonic() + 5
+            while (state := api_request("GET", f"/jobs/{body['job_id']}").json())["status"] in ("queued", "running"):
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+            assert state["status"] == "done"
+            assert state["progress"] == {"pages_parsed": 1}
+            assert state["result"] == {"filename": "a.pdf", "document_id": "A"}
+
+            response = api_request("GET", "/jobs/nao-existe")
+            assert response.status_code == 404
+        manager.shutdown()
+        registry.close()
+
+class FakeQueryEmbedder:
+    async def encode(self, text):
+        return np.ones(768, dtype=np.float32)
+
+class FakeSearchStore:
+    def __init__(self):
+        self.searches = 0
+
+    async def asearch(self, embedding, k=5):
+        self.searches += 1
+        return [{"id": "c1", "content": "primeiro chunk", "score": 0.91},
+                {"id": "c2", "content": "segundo chunk", "score": 0.52}]
+
+class FakeAnswerCache:
+    def __init__(self):
+        self.answers = {}
+
+    def lookup(self, embedding, results, instructions=""):
+        return self.answers.get(tuple(row["id"] for row in results))
+
+    def store(self, query, embedding, results, answer, instructions=""):
+        self.answers[tuple(row["id"] for row in results)] = answer
+
+class FakeStreamingGemini:
+    """Gera a resposta em partes; com `error`, falha no meio do streaming."""
+
+    def __init__(self, parts, error=None):
+        self.parts = parts
+        self.error = error
+
+    async def generate_content_async(self, prompt, stream=False):
+        assert stream
+        async def chunks():
+            for text in self.parts:
+                yield types.SimpleNamespace(text=text)
+            if self.error is not None:
+                raise self.error
+        return chunks()
+
+def stream_events(**params):
+    """Eventos (nome, dados) de uma chamada ao /query_stream."""
+    response = api_request("GET", "/query_stream", params=params)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.split("\n\n"):
+        if not block:
+            continue
+        event_line, data_line = block.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+def query_stream_env(model):
+    store = FakeSearchStore()
+    patches = [
+        mock.patch.object(rag_interface, "query_embedder", FakeQueryEmbedder()),
+        mock.patch.object(rag_interface, "get_vector_store", lambda: store),
+        mock.patch.object(rag_interface, "get_gemini_model", lambda: model),
+        mock.patch.object(rag_interface, "query_cache", QueryCache()),
+        mock.patch.object(rag_interface, "answer_cache", FakeAnswerCache()),
+    ]
+    for patch in patches:
+        patch.start()
+    return store, patches
+
+def test_query_stream_events():
+    store, patches = query_stream_env(FakeStreamingGemini(["Canalo", "patias são ", "doenças."]))
+    try:
+        events = stream_events(user_query="O que são canalopatias?")
+        assert [name for name, _ in events] == ["metadata", "token", "token", "token", "done"]
+        assert events[0][1]["chunks"] == [{"id": "c1", "score": 0.91}, {"id": "c2", "score": 0.52}]
+        assert "".join(data["text"] for name, data in events if name == "token") == "Canalopatias são doenças."
+        assert events[-1][1]["cached"] is False
+        assert events[-1][1]["ttft_ms"] <= events[-1][1]["total_ms"]
+
+        # Mesma pergunta: chunks do cache de resultados (com os scores) e resposta do cache de respostas
+        events = stream_events(user_query="o que são   canalopatias?")
+        assert store.searches == 1
+        assert [name for name, _ in events] == ["metadata", "token", "done"]
+        assert events[0][1]["chunks"] == [{"id": "c1", "score": 0.91}, {"id": "c2", "score": 0.52}]
+        assert events[1][1]["text"] == "Canalopatias são doenças." and events[-1][1]["cached"] is True
+    finally:
+        for patch in patches:
+            patch.stop()
+
+def test_query_stream_error_event():
+    store, patches = query_stream_env(FakeStreamingGemini(["Canalo"], error=RuntimeError("cota esgotada")))
+    try:
+        events = stream_events(user_query="O que são canalopatias?")
+        # O erro chega como evento, depois do que já tinha sido enviado, e encerra o stream
+        assert [name for name, _ in events] == ["metadata", "token", "error"]
+        assert events[-1][1] == {"detail": "Erro na consulta: cota esgotada"}
+    finally:
+        for patch in patches:
+            patch.stop()
+
+class BlockingEmbedder:
+    """Modelo de embedding cujo carregamento só termina quando `release` é sinalizado."""
+
+    def __init__(self):
+        self.loading = threading.Event()
+        self.release = threading.Event()
+
+    def load(self):
+        self.loading.set()
+        assert self.release.wait(5)
+        return self
+
+    def encode(self, texts, show_progress_bar=False):
+        return np.zeros((len(texts), 768), dtype=np.float32)
+
+def readiness_env(load_embed_model):
+    """Aquecimento do zero, com os carregadores dos modelos e do armazenamento trocados por imitações."""
+    patches = [
+        mock.patch.object(rag_interface, "startup_state", {"ready": False, "error": None, "phases_ms": {}}),
+        mock.patch.object(rag_interface, "vector_store", None),
+        mock.patch.object(rag_interface, "gemini_model", None),
+        mock.patch.object(rag_interface, "embed_model", None),
+        mock.patch.object(rag_interface, "create_vector_store", lambda backend: object()),
+        mock.patch.object(rag_interface, "_load_gemini", lambda: object()),
+        mock.patch.object(rag_interface, "_load_embed_model", load_embed_model),
+    ]
+    for patch in patches:
+        patch.start()
+    return patches
+
+def wait_ready_status(status_code):
+    deadline = time.monotonic() + 5
+    while (response := api_request("GET", "/ready")).status_code != status_code:
+        assert time.monotonic() < deadline, response.json()
+        time.sleep(0.01)
+    return response.json()
+
+def test_ready_after_warm_up():
+    embedder = BlockingEmbedder()
+    patches = readiness_env(embedder.load)
+    try:
+        asyncio.run(rag_interface.startup())  # dispara o aquecimento em segundo plano
+        assert embedder.loading.wait(5)
+        # Modelo ainda carregando: vivo, mas não pronto
+        assert api_request("GET", "/health").status_code == 200
+        response = api_request("GET", "/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up" and response.json()["error"] is None
+
+        embedder.release.set()
+        body = wait_ready_status(200)
+        assert body["status"] == "ready"
+        assert {"vector_store", "gemini", "warmup_encode", "total_warm_up"} <= set(body["phases_ms"])
+    finally:
+        embedder.release.set()
+        for patch in patches:
+            patch.stop()
+
+def test_ready_reports_warm_up_error():
+    def broken_loader():
+        raise OSError("modelo não encontrado")
+
+    patches = readiness_env(broken_loader)
+    try:
+        asyncio.run(rag_interface.startup())
+        deadline = time.monotonic() + 5
+        while rag_interface.startup_state["error"] is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        response = api_request("GET", "/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "error" and response.json()["error"] == "modelo não encontrado"
+    finally:
+        for patch in patches:
+            patch.stop()
+
+if __name__ == "__main__":
+    test_iter_ocr_pages()
+    test_iter_pdf_pages_ocr_fallback()
+    test_new_version_keeps_chunks_of_unversioned_documents()
+    test_rollback_to_previous_version()
+    test_failed_ocr_fallback_is_not_registered()
+    test_upload_returns_job_id()
+    test_query_stream_events()
+    test_query_stream_error_event()
+    test_ready_after_warm_up()
+    test_ready_reports_warm_up_error()
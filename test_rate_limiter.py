@@ -0,0 +1,85 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import AdaptiveLimiter, RetryError, TokenBucket
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class ResourceExhausted(Exception):
+    """Mesmo nome da exceção de cota do google.api_core."""
+
+class FlakyGemini:
+    """API falsa: responde 429 enquanto houver mais de `quota` chamadas simultâneas."""
+
+    def __init__(self, quota):
+        self.quota = quota
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def generate(self, page):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            over_quota = self.active > self.quota
+        try:
+            time.sleep(0.005)
+            if over_quota:
+                raise ResourceExhausted("429 Quota exceeded")
+            return f"texto da página {page}"
+        finally:
+            with self.lock:
+                self.active -= 1
+
+def test_adaptive_limiter_recovers_every_page():
+    api = FlakyGemini(quota=2)
+    limiter = AdaptiveLimiter(requests_per_min=0, max_concurrency=8, initial_concurrency=8,
+                              max_retries=10, backoff=0.001, max_backoff=0.01)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda page: limiter.call(api.generate, page), range(40)))
+    logger.info(f"Estatísticas: {limiter.stats}")
+    # Nenhuma página perdida, e os 429 reduziram a concorrência
+    assert results == [f"texto da página {page}" for page in range(40)]
+    assert limiter.stats["throttled"] > 0
+    assert limiter.stats["limit"] < 8
+
+def test_non_retryable_error_is_reported():
+    limiter = AdaptiveLimiter(requests_per_min=0, backoff=0.001)
+
+    def broken():
+        raise ValueError("payload inválido")
+
+    try:
+        limiter.call(broken)
+    except RetryError as e:
+        assert e.attempts == 1
+        assert isinstance(e.cause, ValueError)
+    else:
+        raise AssertionError("Erro não transitório deveria ser relançado")
+    assert limiter.stats["failures"] == 1
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(rate_per_min=600, burst=1)  # 10 requisições/s
+    start = time.perf_counter()
+    for _ in range(4):
+        bucket.acquire()
+    assert time.perf_counter() - start >= 0.25
+
+def test_token_bucket_fractional_rate():
+    # Orçamento dividido entre mais processos que requisições/minuto (e.g. 3 rpm / 4 processos)
+    limiter = AdaptiveLimiter(requests_per_min=3 / 4)
+    assert limiter.bucket is not None  # 0.75 rpm ainda limita
+    assert limiter.bucket.capacity == 1
+    start = time.perf_counter()
+    limiter.bucket.acquire()  # a primeira ficha já está disponível
+    assert time.perf_counter() - start < 0.1
+    assert limiter.bucket._tokens < 1  # a próxima espera ~80 s
+
+if __name__ == "__main__":
+    test_adaptive_limiter_recovers_every_page()
+    test_non_retryable_error_is_reported()
+    test_token_bucket_rate()
+    test_token_bucket_fractional_rate()
@@ -0,0 +1,48 @@
+import logging
+from text_layer import text_quality, is_text_page, route_pages
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+TEXTO = ("A insuficiência cardíaca com fração de ejeção reduzida responde a betabloqueadores. "
+         "Pacientes com fibrilação atrial devem ser avaliados quanto ao risco de AVC. ") * 4
+
+class FakePage:
+    """Imitação mínima de uma página do PyPDF2."""
+
+    def __init__(self, text=None, error=None):
+        self.text = text
+        self.error = error
+
+    def extract_text(self):
+        if self.error:
+            raise self.error
+        return self.text
+
+def test_text_quality():
+    quality = text_quality(TEXTO)
+    assert quality["chars"] > 500
+    assert quality["garbage_ratio"] == 0.0
+    assert 4 < quality["mean_word_length"] < 10
+
+    quality = text_quality("(cid:12)(cid:7) �� ab \x01")
+    assert quality["chars"] == 2
+    assert quality["garbage_ratio"] > 0.8
+    assert text_quality("") == {"chars": 0, "garbage_ratio": 0.0, "mean_word_length": 0.0}
+
+def test_is_text_page():
+    assert is_text_page(text_quality(TEXTO))
+    assert not is_text_page(text_quality("Página 3"))  # escaneada: só o número da página
+    assert not is_text_page(text_quality(TEXTO + "�" * 100))
+    assert not is_text_page(text_quality(" ".join(TEXTO.replace(" ", ""))))  # letras soltas
+    assert not is_text_page(text_quality(TEXTO.replace(" ", "")))  # palavras coladas
+
+def test_route_pages():
+    pages = [FakePage(TEXTO), FakePage(""), FakePage(None), FakePage(error=ValueError("fonte quebrada"))]
+    routed = list(route_pages(pages))
+    assert [number for number, _, _, _ in routed] == [1, 2, 3, 4]
+    assert [use_text for _, _, _, use_text in routed] == [True, False, False, False]
+    assert routed[0][1] == TEXTO
+    assert routed[3][1] == ""
+    assert not any(use_text for *_, use_text in route_pages(pages, min_chars=10_000))
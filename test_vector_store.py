@@ -0,0 +1,146 @@
+import logging
+import tempfile
+import numpy as np
+from ann_index import _hamming
+from vector_store import LocalVectorStore
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def test_local_vector_store():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 768)).astype(np.float32)
+    rows = [{"id": str(i), "content": f"chunk {i}", "embedding": vectors[i]} for i in range(50)]
+
+    with tempfile.TemporaryDirectory() as path:
+        # Capacidade inicial pequena para forçar o crescimento do arquivo mapeado
+        store = LocalVectorStore(path, initial_capacity=8)
+        store.add(rows[:30])
+        store.add(rows[30:])
+        assert store.count() == 50
+
+        results = store.search(vectors[17], k=5)
+        assert len(results) == 5
+        assert results[0]["id"] == "17"
+        assert "embedding" not in results[0]
+        logger.info(f"Busca local: {[r['id'] for r in results]}")
+
+        # Reabrir do disco deve recuperar vetores e metadados
+        reopened = LocalVectorStore(path)
+        assert reopened.count() == 50
+        assert reopened.search(vectors[42], k=1)[0]["content"] == "chunk 42"
+
+def test_local_vector_store_ivf():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(2000, 768)).astype(np.float32)
+    rows = [{"id": str(i), "content": f"chunk {i}", "embedding": vectors[i]} for i in range(2000)]
+
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(path, index_type="ivf", index_params={"nlist": 16, "nprobe": 16}, min_index_size=1000)
+        store.add(rows[:1500])
+        store.rebuild_index()  # espera a construção disparada em segundo plano pelo add
+        assert store._index is not None
+        # Com nprobe == nlist o IVF varre todas as listas e deve igualar a busca exata
+        assert store.search(vectors[7], k=1)[0]["id"] == "7"
+
+        # Inserções posteriores entram no índice já construído
+        store.add(rows[1500:])
+        assert store.search(vectors[1900], k=1)[0]["id"] == "1900"
+        store.persist_index()
+
+        reopened = LocalVectorStore(path, index_type="ivf", min_index_size=1000)
+        assert reopened.search(vectors[1234], k=1)[0]["id"] == "1234"
+
+def test_local_vector_store_quantized():
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(1500, 768)).astype(np.float32)
+    rows = [{"id": str(i), "content": f"chunk {i}", "embedding": vectors[i]} for i in range(1500)]
+
+    with tempfile.TemporaryDirectory() as path:
+        params = {"dtype": "int8", "rescore": 4, "binary": True}
+        store = LocalVectorStore(path, index_type="sq", index_params=params, min_index_size=1000)
+        store.add(rows[:1200])
+        store.rebuild_index()
+        results = store.search(vectors[3], k=5)
+        assert results[0]["id"] == "3"
+        # O rescoring devolve a similaridade exata em float32
+        assert abs(results[0]["score"] - 1.0) < 1e-4
+
+        store.add(rows[1200:])
+        assert store.search(vectors[1400], k=1)[0]["id"] == "1400"
+        # int8 + bits ocupam bem menos que a matriz float32
+        assert store._index.nbytes < 1500 * 768 * 4 / 3
+        store.persist_index()
+
+        reopened = LocalVectorStore(path, index_type="sq", min_index_size=1000)
+        assert reopened.search(vectors[999], k=1)[0]["id"] == "999"
+
+def test_local_vector_store_searches_while_index_builds():
+    rng = np.random.default_rng(4)
+    vectors = rng.normal(size=(600, 768)).astype(np.float32)
+    rows = [{"id": str(i), "content": f"chunk {i}", "embedding": vectors[i]} for i in range(600)]
+
+    with tempfile.TemporaryDirectory() as path:
+        store = LocalVectorStore(path, index_type="ivf", index_params={"nlist": 8, "nprobe": 8}, min_index_size=500)
+        with store._build_lock:
+            # Construção travada: a busca não espera por ela e segue por força bruta
+            store.add(rows)
+            assert store._build_thread.is_alive()
+            assert store.search(vectors[123], k=1)[0]["id"] == "123"
+            assert store._index is None
+        store.rebuild_index()
+        assert store._index.ntotal == 600
+        assert store.search(vectors[321], k=1)[0]["id"] == "321"
+
+def test_local_vector_store_compacts_tombstones():
+    rng = np.random.default_rng(5)
+    vectors = rng.normal(size=(1100, 768)).astype(np.float32)
+    rows = [{"id": str(i), "content": f"chunk {i}", "embedding": vectors[i]} for i in range(1100)]
+
+    with tempfile.TemporaryDirectory() as path:
+        params = {"nlist": 8, "nprobe": 8}
+        store = LocalVectorStore(path, index_type="ivf", index_params=params, min_index_size=500)
+        store.add(rows[:1000])
+        store.rebuild_index()
+        assert store._index.ntotal == 1000
+
+        # Poucos tombstones: o índice continua o mesmo e a busca os descarta
+        store.delete([str(i) for i in range(50)])
+        store.rebuild_index()
+        assert store._index.ntotal == 1000 and store._index_deleted == 50
+        assert store.search(vectors[10], k=1)[0]["id"] != "10"
+
+        # Passou de 10% do índice: reconstrução sem as linhas removidas
+        store.delete([str(i) for i in range(50, 150)])
+        store.rebuild_index()
+        assert store._index.ntotal == 850 and store._index_deleted == 0
+        assert store.search(vectors[100], k=1)[0]["id"] != "100"
+        assert store.search(vectors[700], k=1)[0]["id"] == "700"
+
+        # Inserções depois da compactação entram no índice com as linhas certas
+        store.add(rows[1000:])
+        assert store._index.ntotal == 950
+        assert store.search(vectors[1050], k=1)[0]["id"] == "1050"
+        store.persist_index()
+
+        reopened = LocalVectorStore(path, index_type="ivf", min_index_size=500)
+        assert reopened._index.ntotal == 950 and reopened._index_deleted == 0
+        assert reopened.search(vectors[1080], k=1)[0]["id"] == "1080"
+        assert reopened.search(vectors[20], k=1)[0]["id"] != "20"
+        assert reopened.count() == 950
+
+def test_hamming_matches_bit_count():
+    rng = np.random.default_rng(3)
+    bits = np.packbits(rng.normal(size=(50, 768)) > 0, axis=1)
+    query_bits = np.packbits(rng.normal(size=768) > 0)
+    expected = np.unpackbits(np.bitwise_xor(bits, query_bits), axis=1).sum(axis=1)
+    assert np.array_equal(_hamming(bits, query_bits), expected)
+
+if __name__ == "__main__":
+    test_local_vector_store()
+    test_local_vector_store_ivf()
+    test_local_vector_store_quantized()
+    test_local_vector_store_searches_while_index_builds()
+    test_local_vector_store_compacts_tombstones()
+    test_hamming_matches_bit_count()
@@ -0,0 +1,67 @@
+import re
+import logging
+import unicodedata
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Glifos sem mapeamento para Unicode que o PyPDF2 emite como "(cid:123)"
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+# Categorias Unicode que não aparecem em texto legível: controle, uso privado, não atribuído, surrogate
+GARBAGE_CATEGORIES = {"Cc", "Co", "Cn", "Cs"}
+
+
+def text_quality(text):
+    """Métricas da camada de texto de uma página: caracteres, fração de lixo e tamanho médio das palavras.
+
+    Lixo são glifos "(cid:N)", o caractere de substituição U+FFFD e
+    caracteres de controle, de uso privado ou não atribuídos, típicos de
+    fontes sem tabela ToUnicode.
+    """
+    text = text or ""
+    cid_chars = sum(len(match) for match in CID_PATTERN.findall(text))
+    text = CID_PATTERN.sub("", text)
+    chars = garbage = 0
+    for char in text:
+        if char.isspace():
+            continue
+        chars += 1
+        if char == "\ufffd" or unicodedata.category(char) in GARBAGE_CATEGORIES:
+            garbage += 1
+    total = chars + cid_chars
+    words = len(text.split())
+    return {
+        "chars": chars - garbage,
+        "garbage_ratio": round((garbage + cid_chars) / total, 4) if total else 0.0,
+        "mean_word_length": round(chars / words, 2) if words else 0.0,
+    }
+
+
+def is_text_page(quality, min_chars=200, max_garbage_ratio=0.05, word_length=(2.0, 25.0)):
+    """A camada de texto basta (não precisa de OCR)?
+
+    Páginas escaneadas têm pouco ou nenhum texto; extrações quebradas têm
+    muito lixo, ou letras soltas ("t e x t o") ou palavras coladas, que
+    aparecem no tamanho médio das palavras.
+    """
+    return (
+        quality["chars"] >= min_chars
+        and quality["garbage_ratio"] <= max_garbage_ratio
+        and word_length[0] <= quality["mean_word_length"] <= word_length[1]
+    )
+
+
+def route_pages(pages, min_chars=200, max_garbage_ratio=0.05):
+    """Classifica as páginas do PyPDF2 uma a uma, produzindo (número, texto, qualidade, usar o texto?).
+
+    `pages` é qualquer iterável de páginas (e.g. `PdfReader(path).pages`);
+    o texto é extraído de uma página por vez.
+    """
+    for page_number, page in enumerate(pages, 1):
+        try:
+            text = page.extract_text() or ""
+        except Exception as e:
+            logger.debug(f"Página {page_number}: falha ao extrair o texto ({e}), vai para o OCR")
+            text = ""
+        quality = text_quality(text)
+        yield page_number, text, quality, is_text_page(quality, min_chars, max_garbage_ratio)
@@ -0,0 +1,511 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+import numpy as np
+from ann_index import create_index, load_index
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Dimensão dos embeddings do all-mpnet-base-v2
+EMBEDDING_DIM = 768
+
+SUPABASE_URL = os.getenv("SUPABASE_URL", "https://hgpjrzouqfzqgkcxrbhv.supabase.co")
+
+
+class VectorStore:
+    """Interface comum dos backends de armazenamento vetorial dos chunks de PDF.
+
+    Cada linha é um dicionário com 'id', 'content', 'embedding' e metadados
+    opcionais. A busca devolve as linhas mais próximas (sem o embedding).
+    Os ids são derivados do conteúdo (ver dedup.py), então `add` ignora linhas
+    cujo id já existe nos backends que conseguem verificar isso.
+    """
+
+    name = "base"
+
+    def add(self, rows):
+        """Insere uma lista de linhas no armazenamento."""
+        raise NotImplementedError
+
+    def search(self, query_embedding, k=5):
+        """Retorna as k linhas mais similares ao vetor de consulta."""
+        raise NotImplementedError
+
+    async def asearch(self, query_embedding, k=5):
+        """Versão assíncrona de `search`; por padrão roda a busca numa thread."""
+        return await asyncio.to_thread(self.search, query_embedding, k)
+
+    def count(self):
+        """Número de vetores armazenados (None se o backend não souber informar)."""
+        return None
+
+    def existing_ids(self, ids):
+        """Subconjunto de `ids` que já está armazenado (vazio se o backend não souber informar)."""
+        return set()
+
+    def delete(self, ids):
+        """Remove as linhas com esses ids; devolve quantas foram removidas."""
+        raise NotImplementedError
+
+    def persist_index(self):
+        """Grava no disco o índice de busca mantido em memória (só o backend local tem um)."""
+
+    async def aclose(self):
+        """Libera conexões abertas pelo caminho assíncrono."""
+
+
+class _RowView:
+    """Linhas `rows` da matriz vistas como uma matriz contígua (posição no índice -> linha).
+
+    Os índices de ann_index.py numeram os vetores na ordem em que foram
+    adicionados; depois de uma reconstrução sem as linhas removidas essa
+    numeração deixa de coincidir com a da matriz do armazenamento.
+    """
+
+    def __init__(self, vectors, rows):
+        self.vectors = vectors
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, ids):
+        # `rows` é crescente: ids ordenados continuam lendo a matriz em sequência
+        return self.vectors[self.rows[ids]]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.vectors[self.rows], dtype=dtype)
+
+
+class LocalVectorStore(VectorStore):
+    """Armazenamento embutido: matriz float32 memory-mapped + sidecar de metadados.
+
+    Arquivos em `path`:
+      - vectors.f32     matriz (capacidade x dim) em float32, mapeada com np.memmap
+      - metadata.jsonl  uma linha JSON por vetor, na mesma ordem da matriz
+      - store.json      cabeçalho com dim, métrica e número de linhas válidas
+      - deleted.json    linhas removidas (tombstones), ignoradas na busca
+      - index/          índice aproximado opcional (ivf, hnsw ou sq), ver ann_index.py
+
+    O cabeçalho é gravado por último, então uma escrita interrompida deixa no
+    máximo linhas órfãs no fim dos arquivos, que são ignoradas na abertura.
+
+    Com `index_type` diferente de "flat", um índice aproximado é construído numa
+    thread em segundo plano assim que houver pelo menos `min_index_size` vetores
+    (abaixo disso a força bruta já é rápida o bastante); até ele ficar pronto, a
+    busca continua por força bruta. O índice é reconstruído, sem as linhas
+    removidas, quando mais de `rebuild_deleted_ratio` dos seus vetores são
+    tombstones. Vetores inseridos depois do último `persist_index` são
+    adicionados ao índice na próxima abertura. O índice "sq" mantém uma
+    cópia int8 dos vetores e só lê a matriz float32 para recalcular
+    os melhores candidatos.
+    """
+
+    name = "local"
+
+    def __init__(self, path, dim=EMBEDDING_DIM, metric="cosine", initial_capacity=1024,
+                 index_type="flat", index_params=None, min_index_size=10000, rebuild_deleted_ratio=0.1):
+        if metric not in ("cosine", "l2", "dot"):
+            raise ValueError(f"Métrica não suportada: {metric}")
+        self.path = path
+        self.dim = dim
+        self.metric = metric
+        self._lock = threading.RLock()
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._metadata_path = os.path.join(path, "metadata.jsonl")
+        self._header_path = os.path.join(path, "store.json")
+        self._deleted_path = os.path.join(path, "deleted.json")
+        self._index_path = os.path.join(path, "index")
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.min_index_size = min_index_size
+        self.rebuild_deleted_ratio = rebuild_deleted_ratio
+        # Serializa construções e gravações do índice; sempre adquirido antes de _lock
+        self._build_lock = threading.Lock()
+        self._build_thread = None
+        os.makedirs(path, exist_ok=True)
+
+        self._count = 0
+        if os.path.exists(self._header_path):
+            with open(self._header_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            self.dim = header["dim"]
+            self.metric = header["metric"]
+            self._count = header["count"]
+
+        self._metadata = self._load_metadata()
+        self._deleted = set()
+        if os.path.exists(self._deleted_path):
+            with open(self._deleted_path, "r", encoding="utf-8") as f:
+                self._deleted = set(json.load(f))
+        # id -> linha, só das linhas vivas
+        self._ids = {meta.get("id"): row for row, meta in enumerate(self._metadata) if row not in self._deleted}
+        if not os.path.exists(self._vectors_path):
+            self._resize_file(max(initial_capacity, 1))
+        self._open_memmap()
+
+        self._index = None
+        self._index_rows = None  # posição no índice -> linha da matriz
+        self._index_covered = 0  # linhas da matriz já consideradas pelo índice
+        self._index_deleted = 0  # tombstones ainda presentes no índice
+        if index_type != "flat" and os.path.exists(self._index_path):
+            self._load_index()
+        self._maybe_rebuild()
+        logger.debug(f"LocalVectorStore aberto em {path} com {self._count} vetores (índice {index_type})")
+
+    def _load_metadata(self):
+        metadata = []
+        orphaned = False
+        if os.path.exists(self._metadata_path):
+            with open(self._metadata_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if len(metadata) >= self._count:
+                        orphaned = True
+                        break
+                    metadata.append(json.loads(line))
+        if orphaned:
+            # Descartar linhas órfãs de uma escrita interrompida
+            with open(self._metadata_path, "w", encoding="utf-8") as f:
+                for meta in metadata:
+                    f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+        return metadata
+
+    def _resize_file(self, capacity):
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+
+    def _open_memmap(self):
+        capacity = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _write_header(self):
+        tmp_path = self._header_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "metric": self.metric, "count": self._count}, f)
+        os.replace(tmp_path, self._header_path)
+
+    def _prepare(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.metric == "cosine":
+            norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors
+
+    def add(self, rows):
+        with self._lock:
+            # Linhas com id já armazenado (ou repetido no próprio lote) são ignoradas
+            new_rows, seen = [], set()
+            for row in rows:
+                row_id = row.get("id")
+                if row_id is None or (row_id not in self._ids and row_id not in seen):
+                    new_rows.append(row)
+                    seen.add(row_id)
+            rows = new_rows
+            if not rows:
+                return 0
+            vectors = self._prepare([row["embedding"] for row in rows])
+            if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+                raise ValueError(f"Embeddings devem ter dimensão {self.dim}, recebido {vectors.shape}")
+            start, end = self._count, self._count + len(rows)
+            if end > self._vectors.shape[0]:
+                self._vectors.flush()
+                del self._vectors
+                self._resize_file(max(end, 2 * self._count))
+                self._open_memmap()
+            self._vectors[start:end] = vectors
+            self._vectors.flush()
+            metadata = [{key: value for key, value in row.items() if key != "embedding"} for row in rows]
+            with open(self._metadata_path, "a", encoding="utf-8") as f:
+                for meta in metadata:
+                    f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+            self._metadata.extend(metadata)
+            self._ids.update((meta.get("id"), row) for row, meta in enumerate(metadata, start))
+            self._count = end
+            self._write_header()
+            if self._index is not None:
+                self._sync_index()
+            self._maybe_rebuild()
+        return len(rows)
+
+    def _deleted_rows(self):
+        return np.fromiter(self._deleted, dtype=np.int64, count=len(self._deleted))
+
+    def _load_index(self):
+        index = load_index(self.index_type, self._index_path, self.dim, self.metric)
+        rows_path = os.path.join(self._index_path, "rows.npy")
+        # Índices gravados antes da compactação cobrem todas as linhas, na ordem
+        rows = np.load(rows_path) if os.path.exists(rows_path) else np.arange(index.ntotal, dtype=np.int64)
+        if len(rows) != index.ntotal or (len(rows) and rows[-1] >= self._count):
+            logger.warning(f"Índice em {self._index_path} inconsistente com o armazenamento; será reconstruído")
+            return
+        self._index, self._index_rows = index, rows
+        self._index_covered = int(rows[-1]) + 1 if len(rows) else 0
+        self._index_deleted = int(np.isin(rows, self._deleted_rows()).sum())
+        self._sync_index()
+
+    def _save_index(self, index, rows):
+        index.save(self._index_path)
+        np.save(os.path.join(self._index_path, "rows.npy"), rows)
+
+    def _sync_index(self):
+        # Adiciona ao índice os vetores que ele ainda não conhece
+        if self._index_covered < self._count:
+            new_rows = np.arange(self._index_covered, self._count, dtype=np.int64)
+            self._index.add(self._vectors[self._index_covered:self._count])
+            self._index_rows = np.concatenate([self._index_rows, new_rows])
+            self._index_deleted += sum(1 for row in range(self._index_covered, self._count) if row in self._deleted)
+            self._index_covered = self._count
+
+    def _needs_rebuild(self):
+        if self.index_type == "flat" or self._count - len(self._deleted) < self.min_index_size:
+            return False
+        if self._index is None:
+            return True
+        return self._index_deleted > self.rebuild_deleted_ratio * max(self._index.ntotal, 1)
+
+    def _maybe_rebuild(self):
+        # Chamado com _lock adquirido (ou na abertura): a construção roda fora dele
+        if self._needs_rebuild() and (self._build_thread is None or not self._build_thread.is_alive()):
+            self._build_thread = threading.Thread(target=self.rebuild_index, name="ann-index-build", daemon=True)
+            self._build_thread.start()
+
+    def rebuild_index(self, force=False):
+        """Constrói o índice aproximado só com as linhas vivas, sem bloquear as buscas.
+
+        Roda sozinho numa thread quando o armazenamento atinge `min_index_size`
+        ou acumula tombstones demais; chamado diretamente, espera uma construção
+        em andamento e só refaz o índice se ainda for preciso (ou com `force`).
+        """
+        with self._build_lock:
+            with self._lock:
+                if not force and not self._needs_rebuild():
+                    return
+                covered = self._count
+                rows = np.setdiff1d(np.arange(covered, dtype=np.int64), self._deleted_rows())
+                vectors = self._vectors
+            logger.info(f"Construindo índice {self.index_type} sobre {len(rows)} vetores "
+                        f"({covered - len(rows)} tombstones descartados)")
+            index = create_index(self.index_type, self.dim, self.metric, **self.index_params)
+            # As linhas abaixo de `covered` não mudam mais: leitura sem o lock
+            index.add(_RowView(vectors, rows))
+            self._save_index(index, rows)
+            with self._lock:
+                # Inserções e remoções feitas durante a construção
+                self._index, self._index_rows, self._index_covered = index, rows, covered
+                self._index_deleted = int(np.isin(rows, self._deleted_rows()).sum())
+                self._sync_index()
+        logger.info(f"Índice {self.index_type} pronto com {index.ntotal} vetores")
+
+    def persist_index(self):
+        """Grava o índice aproximado no disco (se houver um construído)."""
+        with self._build_lock, self._lock:
+            if self._index is not None:
+                self._save_index(self._index, self._index_rows)
+
+    def _scores(self, query):
+        matrix = self._vectors[:self._count]
+        if self.metric == "l2":
+            # Distância negativa para que "maior" continue significando "mais próximo"
+            return -np.sum((matrix - query) ** 2, axis=1)
+        return matrix @ query
+
+    def search(self, query_embedding, k=5):
+        query = self._prepare(query_embedding).reshape(-1)
+        with self._lock:
+            if self._count == len(self._deleted):
+                return []
+            if self._index is not None:
+                # Pedir a mais o suficiente para descartar as linhas removidas depois da construção
+                top, top_scores = self._index.search(query, k + self._index_deleted,
+                                                     _RowView(self._vectors, self._index_rows))
+                hits = [(int(row), score) for row, score in zip(self._index_rows[top], top_scores)
+                        if int(row) not in self._deleted][:k]
+                return [dict(self._metadata[i], score=float(score)) for i, score in hits]
+            scores = self._scores(query)
+            if self._deleted:
+                scores[list(self._deleted)] = -np.inf
+            k = min(k, self._count - len(self._deleted))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [dict(self._metadata[i], score=float(scores[i])) for i in top]
+
+    def delete(self, ids):
+        with self._lock:
+            rows = [self._ids.pop(i) for i in ids if i in self._ids]
+            if not rows:
+                return 0
+            self._deleted.update(rows)
+            tmp_path = self._deleted_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(sorted(self._deleted), f)
+            os.replace(tmp_path, self._deleted_path)
+            if self._index is not None:
+                # Todas as linhas vivas estão no índice (as novas entram em `add`)
+                self._index_deleted += len(rows)
+                self._maybe_rebuild()
+        return len(rows)
+
+    def count(self):
+        return self._count - len(self._deleted)
+
+    def existing_ids(self, ids):
+        with self._lock:
+            return {i for i in ids if i in self._ids}
+
+
+class SupabaseVectorStore(VectorStore):
+    """Backend Supabase: tabela `pdf_chunks` e a função RPC `search_pdf_chunks`.
+
+    A busca assíncrona chama o endpoint REST da RPC com um httpx.AsyncClient
+    compartilhado, reaproveitando conexões entre consultas concorrentes.
+    """
+
+    name = "supabase"
+    # Ids por filtro `in`: o filtro vai na URL, que o PostgREST/proxy limita a alguns KB
+    id_batch_size = 200
+
+    def __init__(self, client, table="pdf_chunks", search_function="search_pdf_chunks",
+                 url=None, key=None, max_connections=20, columns=("id", "content", "embedding")):
+        self.client = client
+        self.columns = columns  # colunas existentes na tabela; os demais metadados são descartados
+        self.table = table
+        self.search_function = search_function
+        self.url = url
+        self.key = key
+        self.max_connections = max_connections
+        self._async_client = None
+
+    def add(self, rows):
+        if not rows:
+            return 0
+        # O JSON do PostgREST precisa de listas; float32 evita serializar ruído de float64
+        rows = [
+            dict(
+                {key: value for key, value in row.items() if key in self.columns},
+                embedding=np.asarray(row["embedding"], dtype=np.float32).tolist()
+            )
+            for row in rows
+        ]
+        # Ids determinísticos: um chunk já gravado por outro upload é ignorado
+        self.client.table(self.table).upsert(rows, on_conflict="id", ignore_duplicates=True).execute()
+        return len(rows)
+
+    def _id_batches(self, ids):
+        ids = list(ids)
+        for start in range(0, len(ids), self.id_batch_size):
+            yield ids[start:start + self.id_batch_size]
+
+    def delete(self, ids):
+        deleted = 0
+        for batch in self._id_batches(ids):
+            response = self.client.table(self.table).delete().in_("id", batch).execute()
+            deleted += len(response.data or [])
+        return deleted
+
+    def existing_ids(self, ids):
+        found = set()
+        for batch in self._id_batches(ids):
+            response = self.client.table(self.table).select("id").in_("id", batch).execute()
+            found.update(row["id"] for row in response.data or [])
+        return found
+
+    def search(self, query_embedding, k=5):
+        response = self.client.rpc(self.search_function, {
+            "query_vector": np.asarray(query_embedding, dtype=np.float32).tolist(),
+            "limit_val": k
+        }).execute()
+        return response.data or []
+
+    def _get_async_client(self):
+        if self._async_client is None:
+            import httpx
+            self._async_client = httpx.AsyncClient(
+                base_url=f"{self.url}/rest/v1",
+                headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=30.0
+            )
+        return self._async_client
+
+    async def asearch(self, query_embedding, k=5):
+        if not self.url or not self.key:
+            return await super().asearch(query_embedding, k)
+        response = await self._get_async_client().post(f"/rpc/{self.search_function}", json={
+            "query_vector": np.asarray(query_embedding, dtype=np.float32).tolist(),
+            "limit_val": k
+        })
+        response.raise_for_status()
+        return response.json() or []
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+class KDBAIVectorStore(VectorStore):
+    """Backend KDB.AI: colunas 'vectors' (embedding) e 'text' (conteúdo)."""
+
+    name = "kdbai"
+
+    def __init__(self, table, vector_column="vectors", text_column="text"):
+        self.table = table
+        self.vector_column = vector_column
+        self.text_column = text_column
+
+    def add(self, rows):
+        if not rows:
+            return 0
+        import pandas as pd
+        frame = pd.DataFrame([
+            {
+                "id": row["id"],
+                self.text_column: row["content"],
+                self.vector_column: np.asarray(row["embedding"], dtype=np.float32).tolist(),
+            }
+            for row in rows
+        ])
+        self.table.insert(frame)
+        return len(rows)
+
+    def search(self, query_embedding, k=5):
+        result = self.table.search(
+            vectors={self.vector_column: [np.asarray(query_embedding, dtype=np.float32).tolist()]},
+            n=k
+        )
+        if not result or result[0] is None or len(result[0]) == 0:
+            return []
+        frame = result[0].rename(columns={self.text_column: "content"})
+        columns = [c for c in frame.columns if c != self.vector_column]
+        return frame[columns].to_dict("records")
+
+
+def create_vector_store(backend=None):
+    """Cria o backend configurado em VECTOR_STORE_BACKEND (supabase, local ou kdbai)."""
+    backend = (backend or os.getenv("VECTOR_STORE_BACKEND", "supabase")).lower()
+    logger.debug(f"Inicializando backend vetorial: {backend}")
+    if backend == "local":
+        return LocalVectorStore(
+            os.getenv("LOCAL_STORE_PATH", "data/vector_store"),
+            metric=os.getenv("LOCAL_STORE_METRIC", "cosine"),
+            index_type=os.getenv("LOCAL_INDEX_TYPE", "flat"),  # flat, ivf, hnsw ou sq
+            index_params=json.loads(os.getenv("LOCAL_INDEX_PARAMS", "{}")),  # e.g. {"nlist": 1024, "nprobe": 16}
+            min_index_size=int(os.getenv("LOCAL_INDEX_MIN_SIZE", "10000")),
+            # Fração de tombstones no índice que dispara a reconstrução sem eles
+            rebuild_deleted_ratio=float(os.getenv("LOCAL_INDEX_REBUILD_RATIO", "0.1"))
+        )
+    if backend == "supabase":
+        from supabase import create_client
+        supabase_key = os.getenv("SUPABASE_KEY")
+        client = create_client(SUPABASE_URL, supabase_key)
+        # Para guardar page_start/page_end, crie as colunas e inclua-as em SUPABASE_COLUMNS
+        columns = tuple(os.getenv("SUPABASE_COLUMNS", "id,content,embedding").split(","))
+        return SupabaseVectorStore(client, url=SUPABASE_URL, key=supabase_key, columns=columns)
+    if backend == "kdbai":
+        import kdbai_client as kdbai
+        session = kdbai.Session(endpoint=os.getenv("KDBAI_ENDPOINT"), api_key=os.getenv("KDBAI_API_KEY"))
+        return KDBAIVectorStore(session.database("default").table("pdf_chunks"))
+    raise ValueError(f"Backend vetorial desconhecido: {backend}")